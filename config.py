@@ -18,6 +18,9 @@ class Config:
     
     # CLIP Service Configuration
     CLIP_SERVICE_URL = os.getenv("CLIP_SERVICE_URL", "https://your-clip-service.railway.app")
+    # Mixed into embedding cache keys - bump when the CLIP server's model changes
+    CLIP_MODEL_VERSION = os.getenv("CLIP_MODEL_VERSION", "clip-vit-b32")
+    CLIP_BATCH_WINDOW_MS = float(os.getenv("CLIP_BATCH_WINDOW_MS", 5))  # how long text requests wait to be batched
     
     # Weaviate Configuration
     WEAVIATE_URL = os.getenv("WEAVIATE_URL", "https://weaviate-wdke-production.up.railway.app/")
@@ -44,7 +47,7 @@ class Config:
     )
     
     # Processing Configuration
-    BATCH_SIZE = int(os.getenv("BATCH_SIZE", 25))  # Increased from 10 to 25 for better speed
+    BATCH_SIZE = int(os.getenv("BATCH_SIZE", 25))  # Files in flight per processing pipeline stage
     
     # Optimization Configuration
     USE_THUMBNAILS = os.getenv("USE_THUMBNAILS", "true").lower() == "true"
@@ -70,6 +73,12 @@ class Config:
     # Performance Optimization
     SKIP_SHARED_LINKS = os.getenv("SKIP_SHARED_LINKS", "true").lower() == "true"  # Skip Dropbox permission issues
     MAX_CONCURRENT_API_CALLS = int(os.getenv("MAX_CONCURRENT_API_CALLS", 25))  # Limit concurrent API calls
+    # Per-service limits on in-flight calls during processing, so each backend runs at its own ceiling
+    DROPBOX_CONCURRENCY = int(os.getenv("DROPBOX_CONCURRENCY", 8))  # downloads and thumbnails (API rate-limited)
+    DROPBOX_RPS = float(os.getenv("DROPBOX_RPS", 10))  # Dropbox requests per second, ~90% of the 600/min limit; 0 disables
+    REPLICATE_CONCURRENCY = int(os.getenv("REPLICATE_CONCURRENCY", 4))  # initial caption predictions; adapts to rate limiting
+    CLIP_CONCURRENCY = int(os.getenv("CLIP_CONCURRENCY", 8))  # embedding requests (GPU-bound)
+    WEAVIATE_CONCURRENCY = int(os.getenv("WEAVIATE_CONCURRENCY", 8))  # lookups and writes (connection pool)
     ENABLE_FAST_MODE = os.getenv("ENABLE_FAST_MODE", "true").lower() == "true"  # Skip unnecessary operations
 
 config = Config() 
\ No newline at end of file
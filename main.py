@@ -8,10 +8,10 @@ from apscheduler.triggers.cron import CronTrigger
 import logging
 import asyncio
 from datetime import datetime, timedelta
+from itertools import islice
 from typing import Optional, List
 import os
 import sys
-import dropbox
 
 # Add the current directory to Python path so we can import our modules
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
@@ -19,6 +19,7 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from config import config
 from models import SearchRequest, SearchResponse, ProcessingStatus
 from services.processing_service import ProcessingService
+from services._httpclient import close_client
 
 # Setup logging
 logging.basicConfig(
@@ -31,6 +32,9 @@ logger = logging.getLogger(__name__)
 processing_service = None
 scheduler = None
 
+# Processing tasks started from API endpoints, cancelled on shutdown
+background_tasks_inflight = set()
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Modern FastAPI lifespan event handler"""
@@ -84,6 +88,16 @@ async def lifespan(app: FastAPI):
                     replace_existing=True
                 )
                 
+                # Compact the local cache database every 6 hours, offset from
+                # the temp cleanup
+                scheduler.add_job(
+                    cache_maintenance_job,
+                    CronTrigger(hour="*/6", minute=30),
+                    id="cache_maintenance",
+                    name="Cache Database Maintenance",
+                    replace_existing=True
+                )
+                
                 logger.info(f"✅ Scheduled daily processing at {config.CRON_HOUR:02d}:{config.CRON_MINUTE:02d}")
             else:
                 logger.warning("⚠️ Skipping scheduled jobs - ProcessingService not available")
@@ -123,8 +137,17 @@ async def lifespan(app: FastAPI):
         if scheduler:
             scheduler.shutdown()
         
+        # Cancel in-flight processing so its HTTP connections close cleanly
+        if background_tasks_inflight:
+            logger.info(f"Cancelling {len(background_tasks_inflight)} in-flight background tasks")
+            for task in list(background_tasks_inflight):
+                task.cancel()
+            await asyncio.gather(*background_tasks_inflight, return_exceptions=True)
+        
         if processing_service:
             await processing_service.cleanup()
+        
+        await close_client()
             
         logger.info("Shutdown completed")
         
@@ -171,20 +194,29 @@ async def cleanup_temp_files_job():
         logger.info("Starting temp files cleanup job...")
         
         if processing_service and processing_service.dropbox_service:
-            processing_service.dropbox_service.cleanup_temp_files(max_age_hours=24)
+            await asyncio.to_thread(processing_service.dropbox_service.cleanup_temp_files, max_age_hours=24)
             
         logger.info("Temp files cleanup completed")
         
     except Exception as e:
         logger.error(f"Error in temp files cleanup job: {e}")
 
+async def cache_maintenance_job():
+    """Job to reclaim free pages and truncate the WAL of the local cache"""
+    try:
+        if processing_service and processing_service.dropbox_service:
+            await asyncio.to_thread(processing_service.dropbox_service.cache.maintenance)
+            
+    except Exception as e:
+        logger.error(f"Error in cache maintenance job: {e}")
+
 # API Endpoints
 
 @app.get("/", response_class=HTMLResponse)
 async def root(request: Request):
     """Main dashboard page"""
     try:
-        stats = processing_service.get_stats() if processing_service else {}
+        stats = await asyncio.to_thread(processing_service.get_stats) if processing_service else {}
         status = processing_service.get_processing_status() if processing_service else ProcessingStatus(status="unknown", files_processed=0, files_total=0)
         
         return templates.TemplateResponse("dashboard.html", {
@@ -274,7 +306,7 @@ async def diagnostics():
             try:
                 if hasattr(processing_service, 'weaviate_service') and processing_service.weaviate_service:
                     # Test connection
-                    is_ready = processing_service.weaviate_service.client.is_ready()
+                    is_ready = await asyncio.to_thread(processing_service.weaviate_service.client.is_ready)
                     diagnostics["services"]["weaviate"] = f"initialized_ready_{is_ready}"
                 else:
                     diagnostics["services"]["weaviate"] = "not_initialized"
@@ -307,7 +339,7 @@ async def get_stats():
     if not processing_service:
         raise HTTPException(status_code=503, detail="Processing service not initialized")
     
-    return processing_service.get_stats()
+    return await asyncio.to_thread(processing_service.get_stats)
 
 @app.get("/api/debug/stats")
 async def debug_stats():
@@ -315,7 +347,7 @@ async def debug_stats():
     if not processing_service:
         raise HTTPException(status_code=503, detail="Processing service not initialized")
     
-    stats = processing_service.get_stats()
+    stats = await asyncio.to_thread(processing_service.get_stats)
     
     # Add detailed breakdown for debugging
     debug_info = {
@@ -377,7 +409,7 @@ async def get_image_from_dropbox(file_id: str):
         logger.info(f"Getting image for file ID: {file_id}")
         
         # Get file info from Weaviate using file ID
-        file_data = processing_service.weaviate_service.get_file_by_id(file_id)
+        file_data = await asyncio.to_thread(processing_service.weaviate_service.get_file_by_id, file_id)
         if not file_data:
             logger.error(f"File not found in Weaviate: {file_id}")
             raise HTTPException(status_code=404, detail="File not found in database")
@@ -390,9 +422,12 @@ async def get_image_from_dropbox(file_id: str):
         logger.info(f"Downloading file from Dropbox: {dropbox_path}")
         
         # Download file content directly from Dropbox
+        downloaded = await processing_service.dropbox_service.download_async(dropbox_path)
+        if downloaded is None:
+            raise HTTPException(status_code=404, detail="File not found in Dropbox")
+        metadata, content = downloaded
+        
         try:
-            metadata, response = processing_service.dropbox_service.dbx.files_download(dropbox_path)
-            
             # Determine content type based on file extension
             content_type = "image/jpeg"  # Default
             if dropbox_path.lower().endswith(('.png',)):
@@ -404,20 +439,17 @@ async def get_image_from_dropbox(file_id: str):
             elif dropbox_path.lower().endswith(('.bmp',)):
                 content_type = "image/bmp"
             
-            logger.info(f"Successfully downloaded file: {dropbox_path}, size: {len(response.content)} bytes")
+            logger.info(f"Successfully downloaded file: {dropbox_path}, size: {len(content)} bytes")
             
             return Response(
-                content=response.content,
+                content=content,
                 media_type=content_type,
                 headers={
                     "Cache-Control": "public, max-age=3600",
-                    "Content-Disposition": f'inline; filename="{metadata.name}"'
+                    "Content-Disposition": f'inline; filename="{metadata.get("name", "")}"'
                 }
             )
             
-        except dropbox.exceptions.ApiError as e:
-            logger.error(f"Dropbox API error for {dropbox_path}: {e}")
-            raise HTTPException(status_code=404, detail="File not found in Dropbox")
         except Exception as e:
             logger.error(f"Unexpected error downloading {dropbox_path}: {e}")
             raise HTTPException(status_code=500, detail=f"Error downloading file: {str(e)}")
@@ -451,7 +483,7 @@ async def get_thumbnail_from_dropbox(file_id: str, size: str = "medium"):
         logger.info(f"Getting thumbnail for file ID: {file_id}, size: {size}")
         
         # Get file info from Weaviate using file ID
-        file_data = processing_service.weaviate_service.get_file_by_id(file_id)
+        file_data = await asyncio.to_thread(processing_service.weaviate_service.get_file_by_id, file_id)
         if not file_data:
             logger.error(f"File not found in Weaviate: {file_id}")
             raise HTTPException(status_code=404, detail="File not found in database")
@@ -467,42 +499,29 @@ async def get_thumbnail_from_dropbox(file_id: str, size: str = "medium"):
         
         # For videos, try to get thumbnail or return placeholder
         if file_type == "video":
-            try:
-                # Try to get video thumbnail from Dropbox
-                metadata, thumbnail_content = processing_service.dropbox_service.dbx.files_get_thumbnail(
-                    dropbox_path,
-                    format=dropbox.files.ThumbnailFormat.jpeg,
-                    size=dropbox.files.ThumbnailSize.w640h480
-                )
-                logger.info(f"Successfully got video thumbnail: {dropbox_path}")
-                return Response(
-                    content=thumbnail_content,
-                    media_type="image/jpeg",
-                    headers={"Cache-Control": "public, max-age=3600"}
-                )
-            except Exception as e:
+            # Try to get video thumbnail from Dropbox
+            thumbnail = await processing_service.dropbox_service.get_thumbnail_async(dropbox_path, "medium")
+            if thumbnail is None:
                 # Video thumbnail not available, fall back to full image endpoint
-                logger.warning(f"No thumbnail available for video {dropbox_path}: {e}")
+                logger.warning(f"No thumbnail available for video {dropbox_path}")
                 return await get_image_from_dropbox(file_id)
+            
+            metadata, thumbnail_content = thumbnail
+            logger.info(f"Successfully got video thumbnail: {dropbox_path}")
+            return Response(
+                content=thumbnail_content,
+                media_type="image/jpeg",
+                headers={"Cache-Control": "public, max-age=3600"}
+            )
         
         # For images, get thumbnail from Dropbox
         try:
-            # Map size parameter to Dropbox thumbnail sizes
-            size_mapping = {
-                "small": dropbox.files.ThumbnailSize.w128h128,
-                "medium": dropbox.files.ThumbnailSize.w640h480,
-                "large": dropbox.files.ThumbnailSize.w1024h768
-            }
-            
-            thumbnail_size = size_mapping.get(size, dropbox.files.ThumbnailSize.w640h480)
-            
-            # Get thumbnail from Dropbox
-            metadata, thumbnail_content = processing_service.dropbox_service.dbx.files_get_thumbnail(
-                dropbox_path,
-                format=dropbox.files.ThumbnailFormat.jpeg,
-                size=thumbnail_size
-            )
+            thumbnail = await processing_service.dropbox_service.get_thumbnail_async(dropbox_path, size)
+            if thumbnail is None:
+                # Fallback to full image if thumbnail fails
+                return await get_image_from_dropbox(file_id)
             
+            metadata, thumbnail_content = thumbnail
             logger.info(f"Successfully got thumbnail: {dropbox_path}, size: {len(thumbnail_content)} bytes")
             
             return Response(
@@ -510,14 +529,12 @@ async def get_thumbnail_from_dropbox(file_id: str, size: str = "medium"):
                 media_type="image/jpeg",
                 headers={
                     "Cache-Control": "public, max-age=3600",
-                    "Content-Disposition": f'inline; filename="thumb_{metadata.name}.jpg"'
+                    "Content-Disposition": f'inline; filename="thumb_{metadata.get("name", "")}.jpg"'
                 }
             )
             
-        except dropbox.exceptions.ApiError as e:
-            logger.warning(f"Thumbnail not available for {dropbox_path}: {e}, falling back to full image")
-            # Fallback to full image if thumbnail fails
-            return await get_image_from_dropbox(file_id)
+        except HTTPException:
+            raise
         except Exception as e:
             logger.error(f"Error getting thumbnail for {dropbox_path}: {e}")
             # Fallback to full image if thumbnail fails
@@ -537,7 +554,7 @@ async def get_file_from_dropbox(file_id: str):
             raise HTTPException(status_code=503, detail="Processing service not initialized")
         
         # Get file info from Weaviate using file ID
-        file_data = processing_service.weaviate_service.get_file_by_id(file_id)
+        file_data = await asyncio.to_thread(processing_service.weaviate_service.get_file_by_id, file_id)
         if not file_data:
             raise HTTPException(status_code=404, detail="File not found in database")
         
@@ -548,49 +565,47 @@ async def get_file_from_dropbox(file_id: str):
             raise HTTPException(status_code=404, detail="File path not found")
         
         # Download file content directly from Dropbox
-        try:
-            metadata, response = processing_service.dropbox_service.dbx.files_download(dropbox_path)
-            
-            # Determine content type based on file type and extension
-            content_type = "application/octet-stream"  # Default
-            
-            if file_type == "image":
-                if dropbox_path.lower().endswith(('.jpg', '.jpeg')):
-                    content_type = "image/jpeg"
-                elif dropbox_path.lower().endswith(('.png',)):
-                    content_type = "image/png"
-                elif dropbox_path.lower().endswith(('.gif',)):
-                    content_type = "image/gif"
-                elif dropbox_path.lower().endswith(('.webp',)):
-                    content_type = "image/webp"
-                elif dropbox_path.lower().endswith(('.bmp',)):
-                    content_type = "image/bmp"
-            elif file_type == "video":
-                if dropbox_path.lower().endswith(('.mp4',)):
-                    content_type = "video/mp4"
-                elif dropbox_path.lower().endswith(('.avi',)):
-                    content_type = "video/x-msvideo"
-                elif dropbox_path.lower().endswith(('.mov',)):
-                    content_type = "video/quicktime"
-                elif dropbox_path.lower().endswith(('.mkv',)):
-                    content_type = "video/x-matroska"
-                elif dropbox_path.lower().endswith(('.wmv',)):
-                    content_type = "video/x-ms-wmv"
-                elif dropbox_path.lower().endswith(('.flv',)):
-                    content_type = "video/x-flv"
-            
-            return Response(
-                content=response.content,
-                media_type=content_type,
-                headers={
-                    "Cache-Control": "public, max-age=3600",
-                    "Content-Disposition": f'inline; filename="{metadata.name}"'
-                }
-            )
-            
-        except dropbox.exceptions.ApiError as e:
-            logger.error(f"Dropbox API error for {dropbox_path}: {e}")
+        downloaded = await processing_service.dropbox_service.download_async(dropbox_path)
+        if downloaded is None:
             raise HTTPException(status_code=404, detail="File not found in Dropbox")
+        metadata, content = downloaded
+        
+        # Determine content type based on file type and extension
+        content_type = "application/octet-stream"  # Default
+        
+        if file_type == "image":
+            if dropbox_path.lower().endswith(('.jpg', '.jpeg')):
+                content_type = "image/jpeg"
+            elif dropbox_path.lower().endswith(('.png',)):
+                content_type = "image/png"
+            elif dropbox_path.lower().endswith(('.gif',)):
+                content_type = "image/gif"
+            elif dropbox_path.lower().endswith(('.webp',)):
+                content_type = "image/webp"
+            elif dropbox_path.lower().endswith(('.bmp',)):
+                content_type = "image/bmp"
+        elif file_type == "video":
+            if dropbox_path.lower().endswith(('.mp4',)):
+                content_type = "video/mp4"
+            elif dropbox_path.lower().endswith(('.avi',)):
+                content_type = "video/x-msvideo"
+            elif dropbox_path.lower().endswith(('.mov',)):
+                content_type = "video/quicktime"
+            elif dropbox_path.lower().endswith(('.mkv',)):
+                content_type = "video/x-matroska"
+            elif dropbox_path.lower().endswith(('.wmv',)):
+                content_type = "video/x-ms-wmv"
+            elif dropbox_path.lower().endswith(('.flv',)):
+                content_type = "video/x-flv"
+        
+        return Response(
+            content=content,
+            media_type=content_type,
+            headers={
+                "Cache-Control": "public, max-age=3600",
+                "Content-Disposition": f'inline; filename="{metadata.get("name", "")}"'
+            }
+        )
             
     except HTTPException:
         raise
@@ -634,6 +649,19 @@ async def get_cache_stats():
         logger.error(f"Error getting cache stats: {e}")
         raise HTTPException(status_code=500, detail=f"Error getting cache stats: {e}")
 
+@app.get("/api/embeddings/cache/stats")
+async def get_embedding_cache_stats():
+    """Get CLIP embedding cache hit/miss statistics"""
+    if not processing_service:
+        raise HTTPException(status_code=503, detail="Processing service not initialized")
+    
+    try:
+        stats = processing_service.clip_service.embedding_cache.get_stats()
+        return {"status": "success", "embedding_cache_stats": stats}
+    except Exception as e:
+        logger.error(f"Error getting embedding cache stats: {e}")
+        raise HTTPException(status_code=500, detail=f"Error getting embedding cache stats: {e}")
+
 @app.get("/api/debug/cache")
 async def debug_cache():
     """Debug endpoint to check raw cache data"""
@@ -645,7 +673,7 @@ async def debug_cache():
         cache_stats = processing_service.dropbox_service.cache.get_cache_stats()
         
         # Get some sample files to check their file_type
-        sample_files = processing_service.dropbox_service.cache.get_files()[:10]
+        sample_files = list(islice(processing_service.dropbox_service.cache.iter_files(), 10))
         sample_data = []
         for file in sample_files:
             sample_data.append({
@@ -670,7 +698,7 @@ async def clear_cache():
         raise HTTPException(status_code=503, detail="Processing service not initialized")
     
     try:
-        success = processing_service.dropbox_service.cache.clear_cache()
+        success = processing_service.dropbox_service.clear_cache()
         if success:
             return {"message": "Cache cleared successfully", "status": "success"}
         else:
@@ -991,7 +1019,7 @@ async def download_file_from_dropbox(file_id: str):
             raise HTTPException(status_code=503, detail="Processing service not initialized")
         
         # Get file info from Weaviate using file ID
-        file_data = processing_service.weaviate_service.get_file_by_id(file_id)
+        file_data = await asyncio.to_thread(processing_service.weaviate_service.get_file_by_id, file_id)
         if not file_data:
             raise HTTPException(status_code=404, detail="File not found in database")
         
@@ -1002,21 +1030,19 @@ async def download_file_from_dropbox(file_id: str):
             raise HTTPException(status_code=404, detail="File path not found")
         
         # Download file content directly from Dropbox
-        try:
-            metadata, response = processing_service.dropbox_service.dbx.files_download(dropbox_path)
-            
-            return Response(
-                content=response.content,
-                media_type="application/octet-stream",
-                headers={
-                    "Content-Disposition": f'attachment; filename="{file_name}"',
-                    "Content-Length": str(len(response.content))
-                }
-            )
-            
-        except dropbox.exceptions.ApiError as e:
-            logger.error(f"Dropbox API error for download {dropbox_path}: {e}")
+        downloaded = await processing_service.dropbox_service.download_async(dropbox_path)
+        if downloaded is None:
             raise HTTPException(status_code=404, detail="File not found in Dropbox")
+        metadata, content = downloaded
+        
+        return Response(
+            content=content,
+            media_type="application/octet-stream",
+            headers={
+                "Content-Disposition": f'attachment; filename="{file_name}"',
+                "Content-Length": str(len(content))
+            }
+        )
             
     except HTTPException:
         raise
@@ -1042,13 +1068,13 @@ async def debug_file_by_id(file_id: str):
             return {"error": "Weaviate service not initialized"}
         
         # Get file info from Weaviate using file ID
-        file_data = processing_service.weaviate_service.get_file_by_id(file_id)
+        file_data = await asyncio.to_thread(processing_service.weaviate_service.get_file_by_id, file_id)
         
         if not file_data:
             return {
                 "error": "File not found in Weaviate",
                 "file_id": file_id,
-                "weaviate_connected": processing_service.weaviate_service.client.is_ready()
+                "weaviate_connected": await asyncio.to_thread(processing_service.weaviate_service.client.is_ready)
             }
         
         return {
@@ -1072,7 +1098,7 @@ async def init_cache_background():
     """Background task for initializing cache with full Dropbox sync"""
     try:
         logger.info("Starting cache initialization background task")
-        changed_files, cursor = processing_service.dropbox_service.get_incremental_changes()
+        changed_files, cursor = await asyncio.to_thread(processing_service.dropbox_service.get_incremental_changes)
         logger.info(f"Cache initialization completed: {len(changed_files)} files cached")
     except Exception as e:
         logger.error(f"Error in cache initialization background task: {e}")
@@ -1081,95 +1107,62 @@ async def sync_cache_background():
     """Background task for syncing local cache with Dropbox"""
     try:
         logger.info("Starting cache sync background task")
-        changed_files, cursor = processing_service.dropbox_service.get_incremental_changes()
+        changed_files, cursor = await asyncio.to_thread(processing_service.dropbox_service.get_incremental_changes)
         logger.info(f"Cache sync completed: {len(changed_files)} files updated")
     except Exception as e:
         logger.error(f"Error in cache sync background task: {e}")
 
-async def smart_process_background():
-    """Background task for smart incremental processing"""
+def _update_failed_status(e: Exception):
+    """Record a background task failure on the processing status"""
+    if processing_service:
+        processing_service.mark_failed(f"Background task error: {str(e)}")
+
+async def _run_guarded(name: str, coro):
+    """
+    Run a processing coroutine as a tracked task
+    
+    The task is registered in background_tasks_inflight so shutdown can
+    cancel it instead of orphaning its Dropbox/Azure connections, and any
+    failure is recorded on the processing status.
+    """
+    task = asyncio.create_task(coro, name=name)
+    background_tasks_inflight.add(task)
+    task.add_done_callback(background_tasks_inflight.discard)
     try:
-        logger.info("Starting smart processing background task")
-        await processing_service.smart_process()
-        logger.info("Smart processing background task completed")
+        logger.info(f"Starting {name} background task")
+        await task
+        logger.info(f"{name} background task completed")
+    except asyncio.CancelledError:
+        logger.warning(f"{name} background task cancelled")
+        raise
     except Exception as e:
-        logger.error(f"Error in smart processing background task: {e}", exc_info=True)
-        # Ensure status is updated on error
-        if processing_service:
-            processing_service.current_status.status = "failed"
-            processing_service.current_status.end_time = datetime.now()
-            processing_service.current_status.errors.append(f"Background task error: {str(e)}")
+        logger.error(f"Error in {name} background task: {e}", exc_info=True)
+        _update_failed_status(e)
+
+async def smart_process_background():
+    """Background task for smart incremental processing"""
+    await _run_guarded("smart processing", processing_service.smart_process())
 
 async def process_all_background():
     """Background task for full processing"""
-    try:
-        logger.info("Starting process all background task")
-        await processing_service.process_all_files()
-        logger.info("Process all background task completed")
-    except Exception as e:
-        logger.error(f"Error in processing background task: {e}", exc_info=True)
-        # Ensure status is updated on error
-        if processing_service:
-            processing_service.current_status.status = "failed"
-            processing_service.current_status.end_time = datetime.now()
-            processing_service.current_status.errors.append(f"Background task error: {str(e)}")
+    await _run_guarded("process all", processing_service.process_all_files())
 
 async def process_new_background(hours_back: int):
     """Background task for processing new files"""
-    try:
-        logger.info(f"Starting process new files background task (last {hours_back} hours)")
-        yesterday = datetime.now() - timedelta(hours=hours_back)
-        await processing_service.process_new_files(yesterday)
-        logger.info("Process new files background task completed")
-    except Exception as e:
-        logger.error(f"Error in new file processing background task: {e}", exc_info=True)
-        # Ensure status is updated on error
-        if processing_service:
-            processing_service.current_status.status = "failed"
-            processing_service.current_status.end_time = datetime.now()
-            processing_service.current_status.errors.append(f"Background task error: {str(e)}")
+    yesterday = datetime.now() - timedelta(hours=hours_back)
+    await _run_guarded(f"process new files (last {hours_back} hours)", processing_service.process_new_files(yesterday))
 
 async def initial_process_background():
     """Background task for initial processing of all cached files"""
-    try:
-        logger.info("Starting initial processing background task")
-        await processing_service.process_all_files()
-        logger.info("Initial processing background task completed")
-    except Exception as e:
-        logger.error(f"Error in initial processing background task: {e}", exc_info=True)
-        # Ensure status is updated on error
-        if processing_service:
-            processing_service.current_status.status = "failed"
-            processing_service.current_status.end_time = datetime.now()
-            processing_service.current_status.errors.append(f"Background task error: {str(e)}")
+    await _run_guarded("initial processing", processing_service.process_all_files())
 
 async def initial_process_images_background():
     """Background task for initial processing of cached images only"""
-    try:
-        logger.info("Starting initial image processing background task")
-        await processing_service.process_images_only()
-        logger.info("Initial image processing background task completed")
-    except Exception as e:
-        logger.error(f"Error in initial image processing background task: {e}", exc_info=True)
-        # Ensure status is updated on error
-        if processing_service:
-            processing_service.current_status.status = "failed"
-            processing_service.current_status.end_time = datetime.now()
-            processing_service.current_status.errors.append(f"Background task error: {str(e)}")
+    await _run_guarded("initial image processing", processing_service.process_images_only())
 
 async def initial_process_videos_background():
     """Background task for initial processing of cached videos only"""
-    try:
-        logger.info("Starting initial video processing background task")
-        await processing_service.process_videos_only()
-        logger.info("Initial video processing background task completed")
-    except Exception as e:
-        logger.error(f"Error in initial video processing background task: {e}", exc_info=True)
-        # Ensure status is updated on error
-        if processing_service:
-            processing_service.current_status.status = "failed"
-            processing_service.current_status.end_time = datetime.now()
-            processing_service.current_status.errors.append(f"Background task error: {str(e)}")
+    await _run_guarded("initial video processing", processing_service.process_videos_only())
 
 # Error handlers
 
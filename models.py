@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 
@@ -13,6 +13,25 @@ class DropboxFile(BaseModel):
     is_downloadable: bool = True
     file_type: str
     extension: str
+    # When the file last changed on Dropbox's side (upload, copy, move in);
+    # `modified` is the client's own time, which can predate that
+    server_modified: Optional[datetime] = None
+    
+    @classmethod
+    def from_entry(cls, entry, file_type: str, extension: str) -> "DropboxFile":
+        """Build from an SDK FileMetadata, skipping validation of its already-typed fields"""
+        return cls.model_construct(
+            id=entry.id,
+            name=entry.name,
+            path_lower=entry.path_lower,
+            path_display=entry.path_display,
+            size=entry.size,
+            modified=entry.client_modified,
+            content_hash=entry.content_hash,
+            file_type=file_type,
+            extension=extension,
+            server_modified=entry.server_modified
+        )
 
 class EmbeddingRequest(BaseModel):
     text: Optional[str] = None
@@ -70,6 +89,9 @@ class SearchResponse(BaseModel):
     processing_time: float
 
 class ProcessingStatus(BaseModel):
+    # Immutable snapshot - ProcessingService builds a new instance when its run state changes
+    model_config = ConfigDict(frozen=True)
+    
     status: str  # "running", "completed", "failed", "idle"
     files_processed: int
     files_total: int
@@ -0,0 +1,90 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+class AdaptiveSemaphore:
+    """
+    Concurrency limit that adapts to a service's rate limiting (AIMD)
+    
+    The limit is halved whenever a request comes back 429 and raised by one
+    after every run of successful responses, so throughput settles just
+    under the account's rate limit without manual tuning.
+    """
+    
+    def __init__(self, name: str, initial: int, maximum: int, successes_per_increase: int):
+        self._name = name
+        self._limit = initial
+        self._max = maximum
+        self._successes_per_increase = successes_per_increase
+        self._in_use = 0
+        self._successes = 0
+        self._condition = asyncio.Condition()
+    
+    @property
+    def limit(self) -> int:
+        return self._limit
+    
+    async def acquire(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._in_use < self._limit)
+            self._in_use += 1
+    
+    async def release(self, status_code: Optional[int] = None):
+        async with self._condition:
+            self._in_use -= 1
+            if status_code == 429:
+                self._limit = max(1, self._limit // 2)
+                self._successes = 0
+                logger.warning(f"{self._name} rate limited, concurrency reduced to {self._limit}")
+            elif status_code is not None and status_code < 400:
+                self._successes += 1
+                if self._successes >= self._successes_per_increase and self._limit < self._max:
+                    self._limit += 1
+                    self._successes = 0
+            self._condition.notify_all()
+
+
+class TokenBucket:
+    """
+    Request-rate limit shared by async callers and worker threads
+    
+    Holds up to one second's worth of tokens, refilled at rate per second;
+    each request takes one. When the bucket is empty the token is borrowed
+    against the refill and the caller waits until it is due, so queued
+    callers are spaced out evenly rather than released in bursts. A rate
+    of 0 disables the limit.
+    """
+    
+    def __init__(self, rate: float):
+        self._rate = rate
+        self._capacity = max(rate, 1.0)
+        self._tokens = self._capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def _reserve(self) -> float:
+        """Take a token, returning how long the caller must wait for it"""
+        if self._rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+            self._updated = now
+            self._tokens -= 1
+            return -self._tokens / self._rate if self._tokens < 0 else 0.0
+    
+    async def acquire(self):
+        """Wait for a token on the event loop"""
+        delay = self._reserve()
+        if delay:
+            await asyncio.sleep(delay)
+    
+    def acquire_sync(self):
+        """Wait for a token from a worker thread"""
+        delay = self._reserve()
+        if delay:
+            time.sleep(delay)
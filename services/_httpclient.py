@@ -0,0 +1,31 @@
+import httpx
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+_client: Optional[httpx.AsyncClient] = None
+
+def get_client() -> httpx.AsyncClient:
+    """
+    Get the process-wide HTTP client shared by the CLIP, Azure and Dropbox services
+    
+    One pooled client keeps TCP/TLS connections alive across services instead
+    of each service paying its own handshakes. It is closed by close_client()
+    during application shutdown.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(60.0),
+            limits=httpx.Limits(max_keepalive_connections=32, max_connections=100)
+        )
+    return _client
+
+async def close_client():
+    """Close the shared HTTP client"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+        logger.info("Shared HTTP client closed")
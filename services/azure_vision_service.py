@@ -1,12 +1,36 @@
 import httpx
+import orjson
 import logging
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, AsyncIterator, Union
 import asyncio
+import os
 
 from config import config
+from services._httpclient import get_client
+from services._concurrency import AdaptiveSemaphore
 
 logger = logging.getLogger(__name__)
 
+# Number of frame captioning requests kept in flight per video
+FRAME_CAPTION_WORKERS = 8
+
+# Bounds for the adaptive limit on concurrent Azure requests
+AZURE_INITIAL_CONCURRENCY = 8
+AZURE_MAX_CONCURRENCY = 64
+AZURE_SUCCESSES_PER_INCREASE = 50
+
+
+def _dedupe(items) -> List[str]:
+    """Remove duplicates while preserving first-seen order"""
+    seen = set()
+    unique = []
+    for item in items:
+        if item not in seen:
+            seen.add(item)
+            unique.append(item)
+    return unique
+
+
 class AzureVisionService:
     def __init__(self):
         if not config.AZURE_VISION_API_KEY:
@@ -14,10 +38,34 @@ class AzureVisionService:
         
         self.endpoint = config.AZURE_VISION_ENDPOINT.rstrip('/')
         self.api_key = config.AZURE_VISION_API_KEY
-        self.client = httpx.AsyncClient(timeout=60.0)
+        self.client = get_client()
+        self._limiter = AdaptiveSemaphore(
+            "Azure", AZURE_INITIAL_CONCURRENCY, AZURE_MAX_CONCURRENCY, AZURE_SUCCESSES_PER_INCREASE
+        )
+        
+        # Request pieces are identical for every call, so resolve them once
+        self._analyze_url = f"{self.endpoint}/vision/v3.2/analyze"
+        self._headers_json = {
+            "Ocp-Apim-Subscription-Key": self.api_key,
+            "Content-Type": "application/json"
+        }
+        self._params_description = {
+            "visualFeatures": "Description"
+        }
         
         logger.info("Azure Computer Vision service initialized successfully")
     
+    async def _post(self, url: str, **kwargs) -> httpx.Response:
+        """POST to Azure under the adaptive concurrency limit"""
+        await self._limiter.acquire()
+        status_code = None
+        try:
+            response = await self.client.post(url, **kwargs)
+            status_code = response.status_code
+            return response
+        finally:
+            await self._limiter.release(status_code)
+    
     async def generate_caption_async(self, image_url: str) -> Optional[str]:
         """
         Generate caption for an image using Azure Computer Vision API
@@ -31,26 +79,19 @@ class AzureVisionService:
         try:
             logger.info(f"Generating caption for image: {image_url}")
             
-            # Azure Computer Vision API endpoint
-            url = f"{self.endpoint}/vision/v3.2/analyze"
-            
-            headers = {
-                "Ocp-Apim-Subscription-Key": self.api_key,
-                "Content-Type": "application/json"
-            }
-            
-            params = {
-                "visualFeatures": "Description"
-            }
-            
             payload = {
                 "url": image_url
             }
             
-            response = await self.client.post(url, headers=headers, params=params, json=payload)
+            response = await self._post(
+                self._analyze_url,
+                headers=self._headers_json,
+                params=self._params_description,
+                content=orjson.dumps(payload)
+            )
             response.raise_for_status()
             
-            result = response.json()
+            result = orjson.loads(response.content)
             
             # Extract the best caption
             description = result.get("description", {})
@@ -85,25 +126,19 @@ class AzureVisionService:
         try:
             logger.info(f"Analyzing image: {image_url}")
             
-            url = f"{self.endpoint}/vision/v3.2/analyze"
-            
-            headers = {
-                "Ocp-Apim-Subscription-Key": self.api_key,
-                "Content-Type": "application/json"
-            }
-            
-            params = {
-                "visualFeatures": "Description"
-            }
-            
             payload = {
                 "url": image_url
             }
             
-            response = await self.client.post(url, headers=headers, params=params, json=payload)
+            response = await self._post(
+                self._analyze_url,
+                headers=self._headers_json,
+                params=self._params_description,
+                content=orjson.dumps(payload)
+            )
             response.raise_for_status()
             
-            result = response.json()
+            result = orjson.loads(response.content)
             logger.info(f"Full analysis completed for image")
             return result
             
@@ -144,7 +179,7 @@ class AzureVisionService:
         tags = [word for word in words if word not in stop_words and len(word) > 2]
         
         # Remove duplicates and limit to reasonable number
-        tags = list(dict.fromkeys(tags))[:10]
+        tags = _dedupe(tags)[:10]
         
         logger.info(f"Extracted tags from caption: {tags}")
         return tags
@@ -174,12 +209,15 @@ class AzureVisionService:
             logger.error(f"Error extracting Azure tags: {e}")
             return []
     
-    async def generate_caption_with_tags(self, image_url: str) -> tuple[Optional[str], List[str]]:
+    async def generate_caption_with_tags(self, image_url: str, include_caption_tags: bool = False) -> tuple[Optional[str], List[str]]:
         """
         Generate both caption and tags in one call for efficiency
         
         Args:
             image_url: Public URL of the image
+            include_caption_tags: Also mine the caption text for extra tags.
+                Azure's description tags usually cover these already, so the
+                regex pass is opt-in.
             
         Returns:
             Tuple of (caption, tags)
@@ -201,11 +239,14 @@ class AzureVisionService:
             # Extract tags (Azure provides them in description.tags)
             azure_tags = description.get("tags", [])
             
-            # Also extract tags from caption for comprehensive tagging
-            caption_tags = self.extract_tags_from_caption(caption) if caption else []
-            
-            # Combine and deduplicate tags
-            all_tags = list(dict.fromkeys(azure_tags + caption_tags))
+            if not include_caption_tags:
+                all_tags = azure_tags
+            else:
+                # Also extract tags from caption for comprehensive tagging
+                caption_tags = self.extract_tags_from_caption(caption) if caption else []
+                
+                # Combine and deduplicate tags
+                all_tags = _dedupe(azure_tags + caption_tags)
             
             logger.info(f"Generated caption with tags: {caption}, tags: {all_tags}")
             return caption, all_tags
@@ -215,59 +256,100 @@ class AzureVisionService:
             return None, []
     
     # Video processing methods to maintain interface compatibility
-    async def analyze_video_frames(self, frame_paths: List[str]) -> Optional[str]:
+    async def analyze_video_frames(self, frame_paths: Union[List[str], AsyncIterator[str]]) -> Optional[str]:
         """
         Analyze extracted video frames and generate a comprehensive video description
         Uses Azure Computer Vision for each frame
         
         Args:
-            frame_paths: List of paths to extracted frame images
+            frame_paths: List or async iterator of paths to extracted frame images
             
         Returns:
             Combined video description or None if failed
         """
+        video_description, _ = await self.analyze_video_frames_with_captions(frame_paths)
+        return video_description
+    
+    async def analyze_video_frames_with_captions(self, frame_paths: Union[List[str], AsyncIterator[str]]) -> tuple[Optional[str], List[str]]:
+        """
+        Like analyze_video_frames, but also return the per-frame captions
+        
+        Frames are fed through a queue to a pool of captioning workers, so
+        Azure requests overlap with each other and with frame extraction when
+        an async iterator is passed in. Caption order follows frame order.
+        Callers that tag the video reuse the frame captions instead of
+        captioning every frame a second time.
+        
+        Args:
+            frame_paths: List or async iterator of paths to extracted frame images
+            
+        Returns:
+            Tuple of (combined video description, frame captions in frame order)
+        """
         try:
-            if not frame_paths:
-                logger.warning("No frames provided for video analysis")
-                return "Video file - no frames extracted for analysis"
-            
-            logger.info(f"Analyzing {len(frame_paths)} video frames with Azure Computer Vision")
-            
-            frame_captions = []
-            
-            # Analyze each frame using Azure Computer Vision
-            for i, frame_path in enumerate(frame_paths):
-                try:
-                    # Convert local path to URL for Azure API
-                    frame_filename = os.path.basename(frame_path)
-                    frame_url = f"{config.SERVER_URL}/files/{frame_filename}"
-                    
-                    # Generate caption for this frame
-                    caption = await self.generate_caption_async(frame_url)
-                    
-                    if caption:
-                        frame_captions.append(caption)
-                        logger.info(f"Frame {i+1} caption: {caption}")
-                    else:
-                        logger.warning(f"Failed to generate caption for frame {i+1}")
+            queue: asyncio.Queue = asyncio.Queue()
+            results: Dict[int, str] = {}
+            
+            async def caption_worker():
+                while True:
+                    item = await queue.get()
+                    if item is None:
+                        return
+                    i, frame_path = item
+                    try:
+                        # Convert local path to URL for Azure API
+                        frame_filename = os.path.basename(frame_path)
+                        frame_url = f"{config.SERVER_URL}/files/{frame_filename}"
                         
-                except Exception as frame_error:
-                    logger.error(f"Error analyzing frame {i+1}: {frame_error}")
-                    continue
+                        caption = await self.generate_caption_async(frame_url)
+                        
+                        if caption:
+                            results[i] = caption
+                            logger.info(f"Frame {i+1} caption: {caption}")
+                        else:
+                            logger.warning(f"Failed to generate caption for frame {i+1}")
+                            
+                    except Exception as frame_error:
+                        logger.error(f"Error analyzing frame {i+1}: {frame_error}")
+            
+            workers = [asyncio.create_task(caption_worker()) for _ in range(FRAME_CAPTION_WORKERS)]
+            
+            frame_count = 0
+            try:
+                if isinstance(frame_paths, list):
+                    for frame_path in frame_paths:
+                        await queue.put((frame_count, frame_path))
+                        frame_count += 1
+                else:
+                    async for frame_path in frame_paths:
+                        await queue.put((frame_count, frame_path))
+                        frame_count += 1
+            finally:
+                for _ in workers:
+                    await queue.put(None)
+                await asyncio.gather(*workers)
+            
+            if not frame_count:
+                logger.warning("No frames provided for video analysis")
+                return "Video file - no frames extracted for analysis", []
+            
+            logger.info(f"Analyzed {frame_count} video frames with Azure Computer Vision")
+            
+            frame_captions = [results[i] for i in sorted(results)]
             
             if not frame_captions:
                 logger.error("No frame captions generated")
-                return "Video file - frame analysis failed"
+                return "Video file - frame analysis failed", []
             
             # Combine frame captions into video description
             video_description = self._combine_frame_captions(frame_captions)
             
             logger.info(f"Generated video description: {video_description}")
-            return video_description
+            return video_description, frame_captions
             
         except Exception as e:
             logger.error(f"Error analyzing video frames: {e}")
-            return "Video file - analysis error"
+            return "Video file - analysis error", []
     
     def _combine_frame_captions(self, frame_captions: List[str]) -> str:
         """
@@ -280,40 +362,25 @@ class AzureVisionService:
             Combined video description
         """
         try:
-            if not frame_captions:
-                return "Video content"
-            
-            if len(frame_captions) == 1:
-                return f"Video showing {frame_captions[0].lower()}"
-            
-            # Remove duplicates while preserving order
-            unique_captions = []
+            # Lower each caption once; the lowered form doubles as the dedup key
+            lowered = []
             seen = set()
             for caption in frame_captions:
                 caption_lower = caption.lower().strip()
                 if caption_lower not in seen:
-                    unique_captions.append(caption)
                     seen.add(caption_lower)
+                    lowered.append(caption_lower)
             
-            if len(unique_captions) == 1:
-                return f"Video showing {unique_captions[0].lower()}"
+            if not lowered:
+                return "Video content"
             
-            # Create a narrative flow
-            if len(unique_captions) == 2:
-                return f"Video showing {unique_captions[0].lower()}, then {unique_captions[1].lower()}"
-            elif len(unique_captions) == 3:
-                return f"Video beginning with {unique_captions[0].lower()}, showing {unique_captions[1].lower()}, and ending with {unique_captions[2].lower()}"
-            else:
-                # For longer videos, create a more structured description
-                beginning = unique_captions[0].lower()
-                middle_parts = unique_captions[1:-1]
-                ending = unique_captions[-1].lower()
-                
-                if middle_parts:
-                    middle_text = ", ".join([part.lower() for part in middle_parts])
-                    return f"Video beginning with {beginning}, showing {middle_text}, and ending with {ending}"
-                else:
-                    return f"Video beginning with {beginning} and ending with {ending}"
+            if len(lowered) == 1:
+                return f"Video showing {lowered[0]}"
+            
+            if len(lowered) == 2:
+                return f"Video showing {lowered[0]}, then {lowered[1]}"
+            
+            return f"Video beginning with {lowered[0]}, showing {', '.join(lowered[1:-1])}, and ending with {lowered[-1]}"
             
         except Exception as e:
             logger.error(f"Error combining frame captions: {e}")
@@ -357,12 +424,11 @@ class AzureVisionService:
             return ["video"]
     
     async def close(self):
-        """Close the HTTP client"""
-        await self.client.aclose()
+        """Release service resources (the shared HTTP client is closed at shutdown)"""
     
-    def __del__(self):
-        """Cleanup when object is destroyed"""
-        try:
-            asyncio.create_task(self.close())
-        except Exception:
-            pass 
\ No newline at end of file
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+ 
\ No newline at end of file
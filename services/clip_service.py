@@ -1,17 +1,173 @@
 import httpx
+import orjson
+import msgpack
 import logging
-from typing import List, Optional
+from typing import List, Optional, Union, Dict, Any, Callable, Awaitable
 import asyncio
+import tempfile
+import numpy as np
 
 from config import config
 from models import EmbeddingRequest, EmbeddingResponse
+from services.embedding_cache_service import EmbeddingCacheService
+from services._httpclient import get_client
 
 logger = logging.getLogger(__name__)
 
+# Maximum number of texts sent in one /embed/text/batch request
+MAX_TEXT_BATCH = 64
+
+# Maximum number of images sent in one /embed/image/batch request
+MAX_IMAGE_BATCH = 16
+
+# Downloaded images larger than this spill from memory to a temp file
+IMAGE_SPOOL_SIZE = 1024 * 1024
+
+# Prefer binary msgpack responses (raw float32 vectors) when the CLIP server supports them
+EMBEDDING_ACCEPT = "application/msgpack, application/json;q=0.9"
+
+
+def _decode_embedding_response(response: httpx.Response) -> Dict[str, Any]:
+    """
+    Decode a CLIP response body, msgpack or JSON depending on its content type
+    
+    msgpack responses may carry vectors as raw little-endian float32 bytes,
+    which are unpacked without any float parsing.
+    """
+    if response.headers.get("content-type", "").startswith("application/msgpack"):
+        result = msgpack.unpackb(response.content, raw=False)
+        for field in ("embedding", "embeddings"):
+            value = result.get(field)
+            if isinstance(value, bytes):
+                result[field] = np.frombuffer(value, dtype="<f4").tolist()
+            elif isinstance(value, list) and value and isinstance(value[0], bytes):
+                result[field] = [np.frombuffer(v, dtype="<f4").tolist() for v in value]
+        return result
+    return orjson.loads(response.content)
+
+
+def normalize_embeddings(embeddings: List[List[float]], dtype=np.float32) -> np.ndarray:
+    """
+    Pack embeddings into a contiguous (N, D) matrix of unit rows
+    
+    Normalizing once up front reduces cosine similarity to a dot product, so
+    callers ranking repeatedly against the same targets should keep the
+    returned matrix and pass it straight to calculate_similarity. Pass
+    dtype=np.float16 to halve the matrix's memory and bandwidth.
+    """
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    if matrix.ndim != 2:
+        return matrix.reshape(0, 0)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix = matrix / norms
+    return matrix.astype(dtype, copy=False)
+
+
+class _EmbeddingBatcher:
+    """
+    Coalesces concurrent embedding requests into batch calls
+    
+    Requests arriving within batch_window_ms of each other are sent as one
+    call to embed_batch. If the CLIP server has no batch endpoint
+    (embed_batch returns None), the batcher falls back to individual
+    embed_single calls for good.
+    """
+    
+    def __init__(self, embed_batch: Callable[[list], Awaitable[Optional[List[List[float]]]]],
+                 embed_single: Callable[[Any], Awaitable[Optional[List[float]]]],
+                 batch_window_ms: float, max_batch: int):
+        self.embed_batch = embed_batch
+        self.embed_single = embed_single
+        self.batch_window = batch_window_ms / 1000
+        self.max_batch = max_batch
+        self.batch_supported = True
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._worker: Optional[asyncio.Task] = None
+        self._dispatches: set = set()
+    
+    async def embed(self, item) -> Optional[List[float]]:
+        """Queue an input for the next batch and wait for its embedding"""
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+        
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return await future
+    
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.batch_window
+            
+            while len(batch) < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            
+            # Dispatch without blocking collection of the next batch
+            task = asyncio.create_task(self._dispatch(batch))
+            self._dispatches.add(task)
+            task.add_done_callback(self._dispatches.discard)
+    
+    async def _dispatch(self, batch):
+        items = [item for item, _ in batch]
+        try:
+            embeddings = None
+            if self.batch_supported and len(batch) > 1:
+                embeddings = await self.embed_batch(items)
+                if embeddings is None:
+                    self.batch_supported = False
+            if embeddings is None:
+                # Each call carries its caller's future, so callers are
+                # resolved as their own call finishes instead of after the
+                # slowest one in the batch
+                for done in asyncio.as_completed([self._embed_into(item, future) for item, future in batch]):
+                    await done
+                return
+            
+            for (_, future), embedding in zip(batch, embeddings):
+                if not future.done():
+                    future.set_result(embedding)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+    
+    async def _embed_into(self, item, future: asyncio.Future):
+        """Embed one input on its own and resolve its caller's future"""
+        try:
+            embedding = await self.embed_single(item)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            return
+        if not future.done():
+            future.set_result(embedding)
+    
+    async def close(self):
+        """Stop the batching worker"""
+        if self._worker:
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+
+
 class ClipService:
     def __init__(self):
         self.base_url = config.CLIP_SERVICE_URL.rstrip('/')
-        self.client = httpx.AsyncClient(timeout=60.0)
+        self.client = get_client()
+        self.embedding_cache = EmbeddingCacheService(config.CLIP_MODEL_VERSION)
+        self._text_batcher = _EmbeddingBatcher(
+            self._embed_text_batch, self._embed_text_single, config.CLIP_BATCH_WINDOW_MS, MAX_TEXT_BATCH
+        )
+        self._image_batcher = _EmbeddingBatcher(
+            self._embed_image_batch, self._embed_image_single, config.CLIP_BATCH_WINDOW_MS, MAX_IMAGE_BATCH
+        )
         
         logger.info(f"CLIP service initialized with URL: {self.base_url}")
     
@@ -28,35 +184,77 @@ class ClipService:
         try:
             logger.info(f"Getting image embedding for: {image_url}")
             
-            # Download the image first
-            image_response = await self.client.get(image_url)
-            image_response.raise_for_status()
-            
-            # Send to CLIP service
-            files = {
-                "file": ("image", image_response.content, "image/jpeg")
-            }
-            
-            response = await self.client.post(
-                f"{self.base_url}/embed/image",
-                files=files
-            )
-            response.raise_for_status()
-            
-            result = response.json()
-            embedding = result.get("embedding")
-            
-            if embedding:
-                logger.info(f"Successfully generated embedding with {len(embedding)} dimensions")
-                return embedding
-            else:
-                logger.error("No embedding returned from CLIP service")
-                return None
+            # Stream the download into a spool while hashing it for the cache
+            # key, so the image is never held as one bytes object plus a
+            # second copy inside the multipart body
+            hasher = self.embedding_cache.new_hasher("image")
+            with tempfile.SpooledTemporaryFile(max_size=IMAGE_SPOOL_SIZE) as spool:
+                async with self.client.stream("GET", image_url) as image_response:
+                    image_response.raise_for_status()
+                    async for chunk in image_response.aiter_bytes():
+                        hasher.update(chunk)
+                        spool.write(chunk)
+                spool.seek(0)
+                
+                # Identical image bytes map to the same cached embedding
+                return await self.embedding_cache.get_or_compute_by_key(
+                    hasher.digest(), "image", lambda: self._embed_image(spool)
+                )
                 
         except Exception as e:
             logger.error(f"Error getting image embedding: {e}")
             return None
     
+    async def _embed_image(self, image) -> Optional[List[float]]:
+        """Embed image bytes or a file object through the batching queue"""
+        return await self._image_batcher.embed(image)
+    
+    async def _embed_image_batch(self, images: list) -> Optional[List[List[float]]]:
+        """Send images to /embed/image/batch in one multipart request, or return None if it is unavailable"""
+        response = await self.client.post(
+            f"{self.base_url}/embed/image/batch",
+            headers={"Accept": EMBEDDING_ACCEPT},
+            files=[("files", ("image", image, "image/jpeg")) for image in images]
+        )
+        if response.status_code == 404:
+            logger.warning("CLIP service has no /embed/image/batch endpoint, falling back to single requests")
+            return None
+        response.raise_for_status()
+        
+        embeddings = _decode_embedding_response(response).get("embeddings")
+        if not embeddings or len(embeddings) != len(images):
+            raise ValueError(f"Batch embedding returned {len(embeddings or [])} results for {len(images)} images")
+        
+        logger.info(f"Generated {len(embeddings)} image embeddings in one batch")
+        return embeddings
+    
+    async def _embed_image_single(self, image) -> Optional[List[float]]:
+        """Send image bytes or a file object to the CLIP service's /embed/image endpoint"""
+        # A file object may already have been read by a batch attempt
+        if hasattr(image, "seek"):
+            image.seek(0)
+        
+        files = {
+            "file": ("image", image, "image/jpeg")
+        }
+        
+        response = await self.client.post(
+            f"{self.base_url}/embed/image",
+            headers={"Accept": EMBEDDING_ACCEPT},
+            files=files
+        )
+        response.raise_for_status()
+        
+        result = _decode_embedding_response(response)
+        embedding = result.get("embedding")
+        
+        if embedding:
+            logger.info(f"Successfully generated embedding with {len(embedding)} dimensions")
+            return embedding
+        else:
+            logger.error("No embedding returned from CLIP service")
+            return None
+    
     async def get_text_embedding(self, text: str) -> Optional[List[float]]:
         """
         Get embedding for text using the CLIP service
@@ -70,107 +268,127 @@ class ClipService:
         try:
             logger.info(f"Getting text embedding for: {text[:50]}...")
             
-            response = await self.client.post(
-                f"{self.base_url}/embed/text",
-                params={"text": text}
+            return await self.embedding_cache.get_or_compute(
+                "text", text.encode("utf-8"), lambda: self._embed_text(text)
             )
-            response.raise_for_status()
-            
-            result = response.json()
-            embedding = result.get("embedding")
-            
-            if embedding:
-                logger.info(f"Successfully generated text embedding with {len(embedding)} dimensions")
-                return embedding
-            else:
-                logger.error("No embedding returned from CLIP service")
-                return None
                 
         except Exception as e:
             logger.error(f"Error getting text embedding: {e}")
             return None
     
-    async def calculate_similarity(self, query_embedding: List[float], target_embeddings: List[List[float]]) -> Optional[List[float]]:
+    async def _embed_text(self, text: str) -> Optional[List[float]]:
+        """Embed text through the batching queue"""
+        return await self._text_batcher.embed(text)
+    
+    async def _embed_text_batch(self, texts: List[str]) -> Optional[List[List[float]]]:
+        """Send texts to /embed/text/batch, or return None if it is unavailable"""
+        response = await self.client.post(
+            f"{self.base_url}/embed/text/batch",
+            headers={"Content-Type": "application/json", "Accept": EMBEDDING_ACCEPT},
+            content=orjson.dumps({"texts": texts})
+        )
+        if response.status_code == 404:
+            logger.warning("CLIP service has no /embed/text/batch endpoint, falling back to single requests")
+            return None
+        response.raise_for_status()
+        
+        embeddings = _decode_embedding_response(response).get("embeddings")
+        if not embeddings or len(embeddings) != len(texts):
+            raise ValueError(f"Batch embedding returned {len(embeddings or [])} results for {len(texts)} texts")
+        
+        logger.info(f"Generated {len(embeddings)} text embeddings in one batch")
+        return embeddings
+    
+    async def _embed_text_single(self, text: str) -> Optional[List[float]]:
+        """Send text to the CLIP service's /embed/text endpoint"""
+        response = await self.client.post(
+            f"{self.base_url}/embed/text",
+            headers={"Accept": EMBEDDING_ACCEPT},
+            params={"text": text}
+        )
+        response.raise_for_status()
+        
+        result = _decode_embedding_response(response)
+        embedding = result.get("embedding")
+        
+        if embedding:
+            logger.info(f"Successfully generated text embedding with {len(embedding)} dimensions")
+            return embedding
+        else:
+            logger.error("No embedding returned from CLIP service")
+            return None
+    
+    async def calculate_similarity(self, query_embedding: List[float], target_embeddings: Union[List[List[float]], np.ndarray]) -> Optional[List[float]]:
         """
-        Calculate similarity scores between query embedding and target embeddings
+        Calculate cosine similarity scores between query embedding and target embeddings
+        
+        Scores are computed locally as one matrix-vector product over
+        L2-normalized float32 vectors instead of shipping every target
+        embedding to the CLIP service as JSON.
         
         Args:
             query_embedding: Query embedding vector
-            target_embeddings: List of target embedding vectors
+            target_embeddings: List of target embedding vectors, or an (N, D)
+                float32/float16 array whose rows are already L2-normalized
             
         Returns:
             List of similarity scores or None if failed
         """
         try:
-            payload = {
-                "query_embedding": query_embedding,
-                "target_embeddings": target_embeddings
-            }
+            query = np.asarray(query_embedding, dtype=np.float32)
+            query_norm = np.linalg.norm(query)
+            if query_norm == 0:
+                logger.error("Cannot calculate similarity for a zero query embedding")
+                return None
+            query = query / query_norm
             
-            response = await self.client.post(
-                f"{self.base_url}/similarity/search",
-                json=payload
-            )
-            response.raise_for_status()
+            if isinstance(target_embeddings, np.ndarray):
+                targets = target_embeddings
+            else:
+                targets = normalize_embeddings(target_embeddings)
             
-            result = response.json()
-            scores = result.get("similarity_scores")
+            if targets.shape[0] == 0:
+                return []
             
-            if scores:
-                logger.info(f"Calculated similarity for {len(scores)} targets")
-                return scores
-            else:
-                logger.error("No similarity scores returned")
-                return None
+            # Half-precision targets are widened so the dot products accumulate in float32
+            scores = targets.astype(np.float32, copy=False) @ query
+            logger.info(f"Calculated similarity for {len(scores)} targets")
+            return scores.tolist()
                 
         except Exception as e:
             logger.error(f"Error calculating similarity: {e}")
             return None
     
-    async def get_embedding_for_file(self, file_path: str, file_type: str, caption: Optional[str] = None) -> Optional[List[float]]:
+    async def get_image_embedding_for_content(self, content_hash: Optional[str], image_url: str) -> Optional[List[float]]:
         """
-        Get embedding for a file, combining image and text embeddings if available
+        Get an image embedding keyed on Dropbox's content_hash
+        
+        Dropbox already hashes file contents, so a file whose bytes are
+        unchanged - even if it was moved or renamed - is answered from the
+        embedding cache without downloading or re-embedding the image.
         
         Args:
-            file_path: Path to the file (used to get public URL)
-            file_type: Type of file ('image' or 'video')
-            caption: Optional caption text
+            content_hash: Dropbox content_hash of the file, if known
+            image_url: URL to embed on a cache miss
             
         Returns:
-            Combined embedding or None if failed
+            List of embedding values or None if failed
         """
+        if not content_hash:
+            return await self.get_image_embedding(image_url)
+        
         try:
-            embeddings = []
-            
-            # For images, get image embedding
-            if file_type == "image":
-                # This would need the public URL - we'll get it from the calling function
-                pass
-            
-            # If we have a caption, get text embedding
-            if caption:
-                text_embedding = await self.get_text_embedding(caption)
-                if text_embedding:
-                    embeddings.append(text_embedding)
-            
-            # For now, return the text embedding if available
-            # In a more sophisticated setup, you might combine image and text embeddings
-            if embeddings:
-                return embeddings[0]  # Return first available embedding
-            
-            return None
-            
+            # The processed rendition (thumbnail or full image) changes the embedding
+            rendition = config.THUMBNAIL_SIZE if config.USE_THUMBNAILS else "full"
+            return await self.embedding_cache.get_or_compute(
+                "dropbox-content", f"{rendition}:{content_hash}".encode("utf-8"),
+                lambda: self.get_image_embedding(image_url)
+            )
         except Exception as e:
-            logger.error(f"Error getting embedding for file {file_path}: {e}")
+            logger.error(f"Error getting image embedding for content {content_hash}: {e}")
             return None
     
     async def close(self):
-        """Close the HTTP client"""
-        await self.client.aclose()
-    
-    def __del__(self):
-        """Cleanup when object is destroyed"""
-        try:
-            asyncio.create_task(self.close())
-        except Exception:
-            pass 
\ No newline at end of file
+        """Stop the batchers (the shared HTTP client is closed at shutdown)"""
+        await self._text_batcher.close()
+        await self._image_batcher.close() 
\ No newline at end of file
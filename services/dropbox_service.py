@@ -1,28 +1,172 @@
-import dropbox
-import requests
-from typing import List, Optional, Dict, Any
-from datetime import datetime
+import httpx
+import orjson
+from typing import List, Optional, Dict, Any, Iterator, AsyncIterator, Callable, Awaitable
+from datetime import datetime, timedelta
 import os
 from urllib.parse import urlparse
 import logging
 import tempfile
+import shutil
 import hashlib
+import functools
 import json
+import asyncio
+import random
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 from config import config
 from models import DropboxFile
 from services.local_cache_service import LocalCacheService
+from services._httpclient import get_client
+from services._concurrency import TokenBucket
 
 logger = logging.getLogger(__name__)
 
+_dropbox_module = None
+
+def _dropbox():
+    """
+    Import the Dropbox SDK on first use
+    
+    The SDK pulls in dozens of generated submodules, so deferring it keeps
+    it off the import path of every worker until a sync actually needs it.
+    """
+    global _dropbox_module
+    if _dropbox_module is None:
+        import dropbox
+        _dropbox_module = dropbox
+    return _dropbox_module
+
+# Extension lookups resolved once at import instead of per entry
+_IMAGE_EXT_SET = frozenset(ext.lower() for ext in config.SUPPORTED_IMAGE_TYPES)
+_VIDEO_EXT_SET = frozenset(ext.lower() for ext in config.SUPPORTED_VIDEO_TYPES)
+
+# One lookup per entry instead of two membership tests; an extension listed
+# as both image and video counts as image, as before
+_EXT_TO_TYPE = {
+    **{ext: "video" for ext in _VIDEO_EXT_SET},
+    **{ext: "image" for ext in _IMAGE_EXT_SET}
+}
+
+def _file_extension(name: str) -> str:
+    """Lowercased extension including the dot, or '' if the name has none"""
+    _, dot, ext = name.rpartition('.')
+    return f".{ext.lower()}" if dot else ""
+
+@functools.lru_cache(maxsize=8192)
+def _path_key(path: str) -> str:
+    """Short, filesystem-safe token for a Dropbox path, used in temp file names"""
+    return hashlib.blake2b(path.encode(), digest_size=8).hexdigest()
+
+DROPBOX_API_URL = "https://api.dropboxapi.com/2"
+DROPBOX_CONTENT_URL = "https://content.dropboxapi.com/2"
+DROPBOX_TOKEN_URL = "https://api.dropboxapi.com/oauth2/token"
+
+# Largest page Dropbox allows for list_folder, to minimise continue round trips
+LIST_FOLDER_PAGE_SIZE = 2000
+
+# Leave out metadata we never read; continue calls inherit these from the
+# cursor. Mounted folders stay in, since shared folders hold real files
+LIST_FOLDER_OPTIONS = {
+    "include_media_info": False,
+    "include_deleted": False,
+    "include_has_explicit_shared_members": False,
+    "include_non_downloadable_files": False,
+    "limit": LIST_FOLDER_PAGE_SIZE
+}
+
+# Files buffered before a cache write during a sync, to keep transactions bounded
+CACHE_WRITE_BATCH = 1000
+
+# Shared links are stable per path, so they are persisted in the cache
+# database for a week
+SHARED_LINK_PERSIST_TTL = 7 * 24 * 3600
+
+# Refresh the access token this many seconds before Dropbox says it expires
+TOKEN_REFRESH_MARGIN = 60
+
+# Access token persisted across restarts
+TOKEN_CACHE_FILE = ".dbx_token_cache.json"
+
+# Where the sync cursor lived before it moved into the cache database
+LEGACY_CURSOR_FILE = "dropbox_cursor.json"
+
+# Downloaded files and thumbnails are reused for an hour
+TEMP_FILE_TTL = 3600
+
+# Copy buffer for streamed downloads; large videos would otherwise be
+# pulled through the SDK's small default chunks
+DOWNLOAD_CHUNK_SIZE = 1 << 20
+
+# Concurrent SDK downloads, kept well under Dropbox's per-app rate limit
+MAX_CONCURRENT_DOWNLOADS = 12
+
+# Retries of a rate-limited (429) HTTP API call, and the longest backoff
+# used when Dropbox sends no Retry-After. SDK calls retry on their own
+RATE_LIMIT_RETRIES = 5
+RATE_LIMIT_MAX_BACKOFF = 60
+
+def _retry_after(response: httpx.Response, attempt: int) -> float:
+    """Seconds to wait before retrying a 429, preferring Dropbox's Retry-After"""
+    try:
+        return float(response.headers["Retry-After"])
+    except (KeyError, ValueError):
+        return min(2 ** attempt, RATE_LIMIT_MAX_BACKOFF) + random.uniform(0, 1)
+
+THUMBNAIL_SIZES = {
+    "small": "w128h128",
+    "medium": "w640h480",
+    "large": "w1024h768"
+}
+
+def _sdk_thumbnail_size(size: str):
+    """SDK ThumbnailSize for a size name, defaulting to medium"""
+    return getattr(_dropbox().files.ThumbnailSize, THUMBNAIL_SIZES.get(size, "w640h480"))
+
 class DropboxService:
     def __init__(self):
         self.client_id = config.DROPBOX_CLIENT_ID
         self.client_secret = config.DROPBOX_CLIENT_SECRET
         self.refresh_token = config.DROPBOX_REFRESH_TOKEN
         self.access_token = None
+        self._token_expiry = 0.0
+        self._token_lock = asyncio.Lock()
+        self._token_file_lock = threading.Lock()
         self.dbx = None
-        self.cursor_file = "dropbox_cursor.json"
+        
+        # Native async client for calls made from request handlers, so they
+        # don't block the event loop the way the SDK does
+        self.async_client = get_client()
+        
+        # Requests currently in flight, so concurrent callers for the same
+        # path share one Dropbox call instead of each making their own
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+        
+        # SDK downloads are blocking; the pool lets many run at once on the
+        # client's pooled keep-alive session, and the semaphore caps them
+        # globally however they are called
+        self._download_pool = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_DOWNLOADS, thread_name_prefix="dropbox-download")
+        self._download_semaphore = threading.Semaphore(MAX_CONCURRENT_DOWNLOADS)
+        
+        # Caps the request rate across the HTTP client, the SDK threads and
+        # every caller, so bursts don't trigger Dropbox's 429 storms. SDK
+        # calls take a token in _sdk and HTTP API calls in _post_async
+        self._rate_limiter = TokenBucket(config.DROPBOX_RPS)
+        
+        # Downloads and thumbnails served under /files; resolved once here
+        # instead of a getcwd + makedirs on every request
+        self._temp_dir = os.path.join(os.getcwd(), "temp_files")
+        os.makedirs(self._temp_dir, exist_ok=True)
+        
+        # temp file name -> time it was written, loaded from the directory on
+        # first use so freshness checks don't stat the file every request
+        self._temp_manifest: Optional[Dict[str, float]] = None
+        self._temp_manifest_lock = threading.Lock()
+        
+        # Fetches the next list_folder page while the current one is processed
+        self._page_prefetch = ThreadPoolExecutor(max_workers=1, thread_name_prefix="dropbox-list")
         
         # Initialize local cache
         self.cache = LocalCacheService()
@@ -33,53 +177,257 @@ class DropboxService:
         """Initialize Dropbox client with access token"""
         try:
             self.access_token = self._get_access_token()
-            self.dbx = dropbox.Dropbox(self.access_token)
             logger.info("Dropbox client initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize Dropbox client: {e}")
             raise
     
-    def _get_access_token(self) -> str:
-        """Get access token using refresh token"""
-        url = "https://api.dropboxapi.com/oauth2/token"
-        data = {
+    def _token_request_data(self) -> Dict[str, str]:
+        return {
             'grant_type': 'refresh_token',
             'refresh_token': self.refresh_token,
             'client_id': self.client_id,
             'client_secret': self.client_secret
         }
+    
+    def _apply_token(self, token_data: Dict[str, Any]) -> str:
+        """Store a token response, tracking its expiry, and rebuild the SDK client"""
+        expires_in = token_data.get('expires_in', 14400)
+        self.access_token = token_data['access_token']
+        self._token_expiry = time.monotonic() + expires_in - TOKEN_REFRESH_MARGIN
+        
+        # Handing the SDK the refresh token and expiry lets it refresh on its
+        # own, so long-running sync jobs don't fail after the token expires
+        self.dbx = _dropbox().Dropbox(
+            oauth2_access_token=self.access_token,
+            oauth2_access_token_expiration=datetime.utcnow() + timedelta(seconds=expires_in - TOKEN_REFRESH_MARGIN),
+            oauth2_refresh_token=self.refresh_token,
+            app_key=self.client_id,
+            app_secret=self.client_secret
+        )
+        return self.access_token
+    
+    def _sdk(self, method, *args, **kwargs):
+        """Call an SDK method once a request token is available"""
+        self._rate_limiter.acquire_sync()
+        return method(*args, **kwargs)
+    
+    def _load_cached_token(self) -> Optional[Dict[str, Any]]:
+        """Read the persisted token, or None if missing, unreadable or about to expire"""
+        try:
+            with open(TOKEN_CACHE_FILE, 'rb') as f:
+                cached = orjson.loads(f.read())
+            expires_in = cached["expires_at"] - time.time()
+            if expires_in > TOKEN_REFRESH_MARGIN:
+                return {"access_token": cached["access_token"], "expires_in": expires_in}
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable token cache: {e}")
+        return None
+    
+    def _save_cached_token(self, token_data: Dict[str, Any]):
+        """Persist a token response with its wall-clock expiry, readable only by this user"""
+        try:
+            payload = orjson.dumps({
+                "access_token": token_data["access_token"],
+                "expires_at": time.time() + token_data.get("expires_in", 14400)
+            })
+            # Write a sibling file and rename it over the old one, so a crash
+            # mid-write never leaves a truncated cache behind
+            tmp_path = f"{TOKEN_CACHE_FILE}.tmp"
+            fd = os.open(tmp_path, os.O_CREAT | os.O_WRONLY | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'wb') as f:
+                os.fchmod(f.fileno(), 0o600)
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, TOKEN_CACHE_FILE)
+        except Exception as e:
+            logger.warning(f"Could not persist Dropbox token: {e}")
+    
+    def _get_access_token(self) -> str:
+        """Get access token, reusing the persisted one until shortly before it expires"""
+        # The lock keeps parallel workers in this process from both
+        # exchanging the refresh token when the cache is cold
+        with self._token_file_lock:
+            token_data = self._load_cached_token()
+            if token_data is not None:
+                logger.info("Reusing cached Dropbox access token")
+            else:
+                response = httpx.post(DROPBOX_TOKEN_URL, data=self._token_request_data())
+                response.raise_for_status()
+                token_data = orjson.loads(response.content)
+                self._save_cached_token(token_data)
+        
+        return self._apply_token(token_data)
+    
+    async def _refresh_access_token_async(self):
+        """Refresh the access token without blocking the event loop"""
+        response = await self.async_client.post(DROPBOX_TOKEN_URL, data=self._token_request_data())
+        response.raise_for_status()
+        
+        token_data = orjson.loads(response.content)
+        self._apply_token(token_data)
+        await asyncio.to_thread(self._save_cached_token, token_data)
+        logger.info("Refreshed Dropbox access token")
+    
+    async def _ensure_token_async(self):
+        """Refresh the access token shortly before it expires, once across concurrent callers"""
+        if time.monotonic() < self._token_expiry:
+            return
+        async with self._token_lock:
+            if time.monotonic() >= self._token_expiry:
+                await self._refresh_access_token_async()
+    
+    async def _post_async(self, url: str, headers: Dict[str, str] = None, **kwargs) -> httpx.Response:
+        """
+        POST to the Dropbox API within the request rate limit
         
-        response = requests.post(url, data=data)
+        The access token is refreshed once on 401, and 429 responses are
+        retried up to RATE_LIMIT_RETRIES times after Retry-After, or an
+        exponential backoff with jitter when Dropbox sends none.
+        """
+        await self._ensure_token_async()
+        headers = headers or {}
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            await self._rate_limiter.acquire()
+            response = await self.async_client.post(
+                url, headers={**headers, "Authorization": f"Bearer {self.access_token}"}, **kwargs
+            )
+            if response.status_code == 401:
+                await self._refresh_access_token_async()
+                await self._rate_limiter.acquire()
+                response = await self.async_client.post(
+                    url, headers={**headers, "Authorization": f"Bearer {self.access_token}"}, **kwargs
+                )
+            if response.status_code != 429 or attempt == RATE_LIMIT_RETRIES:
+                break
+            delay = _retry_after(response, attempt)
+            logger.warning(f"Dropbox rate limited, retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
         response.raise_for_status()
+        return response
+    
+    async def _rpc_async(self, endpoint: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Call a Dropbox RPC endpoint and return the decoded JSON result"""
+        response = await self._post_async(
+            f"{DROPBOX_API_URL}/{endpoint}",
+            headers={"Content-Type": "application/json"},
+            content=orjson.dumps(payload)
+        )
+        return orjson.loads(response.content)
+    
+    async def _content_async(self, endpoint: str, arg: Dict[str, Any]) -> tuple[Dict[str, Any], bytes]:
+        """Call a Dropbox content-download endpoint, returning (metadata, bytes)"""
+        response = await self._post_async(
+            f"{DROPBOX_CONTENT_URL}/{endpoint}",
+            # Header values must be ASCII, so non-ASCII paths are escaped
+            headers={"Dropbox-API-Arg": json.dumps(arg)}
+        )
+        metadata = orjson.loads(response.headers.get("Dropbox-API-Result", "{}"))
+        return metadata, response.content
+    
+    def _entry_to_dropbox_file(self, entry: Dict[str, Any]) -> Optional[DropboxFile]:
+        """Convert a list_folder JSON entry to a DropboxFile, or None if unsupported"""
+        if entry.get(".tag") != "file":
+            return None
+        
+        file_extension = _file_extension(entry["name"])
+        file_type = _EXT_TO_TYPE.get(file_extension)
+        if file_type is None:
+            return None
         
-        token_data = response.json()
-        return token_data['access_token']
+        # Fields come typed from the API, so validation is skipped
+        return DropboxFile.model_construct(
+            id=entry["id"],
+            name=entry["name"],
+            path_lower=entry["path_lower"],
+            path_display=entry["path_display"],
+            size=entry["size"],
+            modified=datetime.strptime(entry["client_modified"], "%Y-%m-%dT%H:%M:%SZ"),
+            content_hash=entry.get("content_hash"),
+            file_type=file_type,
+            extension=file_extension,
+            server_modified=datetime.strptime(entry["server_modified"], "%Y-%m-%dT%H:%M:%SZ")
+        )
+    
+    def _iter_pages(self, result) -> Iterator[tuple[List[DropboxFile], List[str], str]]:
+        """
+        Walk a list_folder result page by page, following has_more
+        
+        Args:
+            result: First ListFolderResult, from files_list_folder or _continue
+            
+        Yields:
+            (supported files, deleted paths, cursor) for each page; the cursor
+            of the last page is the one to resume from
+        """
+        # Globals and attributes used per entry are bound to locals once;
+        # this loop runs for every file in the Dropbox on a full resync
+        file_metadata = _dropbox().files.FileMetadata
+        deleted_metadata = _dropbox().files.DeletedMetadata
+        ext_to_type = _EXT_TO_TYPE
+        extension_of = _file_extension
+        to_dropbox_file = DropboxFile.from_entry
+        
+        while True:
+            # Start the next request now so it overlaps converting this page
+            # and the caller's cache writes
+            next_page = None
+            if result.has_more:
+                next_page = self._page_prefetch.submit(self._sdk, self.dbx.files_list_folder_continue, result.cursor)
+            
+            files = []
+            deleted_paths = []
+            for entry in result.entries:
+                if isinstance(entry, file_metadata):
+                    file_extension = extension_of(entry.name)
+                    file_type = ext_to_type.get(file_extension)
+                    if file_type is not None:
+                        files.append(to_dropbox_file(entry, file_type, file_extension))
+                elif isinstance(entry, deleted_metadata):
+                    deleted_paths.append(entry.path_display)
+            
+            yield files, deleted_paths, result.cursor
+            
+            if next_page is None:
+                break
+            result = next_page.result()
     
     def _save_cursor(self, cursor: str, last_sync: datetime = None):
         """Save cursor state for incremental sync"""
-        try:
-            cursor_data = {
-                "cursor": cursor,
-                "last_sync": last_sync.isoformat() if last_sync else datetime.now().isoformat(),
-                "created_at": datetime.now().isoformat()
-            }
-            with open(self.cursor_file, 'w') as f:
-                json.dump(cursor_data, f)
+        if self.cache.set_cursor(cursor, last_sync):
             logger.info(f"Saved cursor state: {cursor[:20]}...")
-        except Exception as e:
-            logger.error(f"Error saving cursor: {e}")
     
     def _load_cursor(self) -> Optional[Dict]:
         """Load cursor state for incremental sync"""
+        cursor_data = self.cache.get_cursor()
+        if cursor_data is None:
+            cursor_data = self._migrate_legacy_cursor()
+        if cursor_data:
+            logger.info(f"Loaded cursor state from {cursor_data.get('last_sync', 'unknown')}")
+        return cursor_data
+    
+    def _migrate_legacy_cursor(self) -> Optional[Dict]:
+        """Move a cursor left in the old JSON file into the cache database"""
         try:
-            if os.path.exists(self.cursor_file):
-                with open(self.cursor_file, 'r') as f:
-                    cursor_data = json.load(f)
-                logger.info(f"Loaded cursor state from {cursor_data.get('last_sync', 'unknown')}")
-                return cursor_data
+            if not os.path.exists(LEGACY_CURSOR_FILE):
+                return None
+            with open(LEGACY_CURSOR_FILE, 'rb') as f:
+                cursor_data = orjson.loads(f.read())
+            last_sync = cursor_data.get("last_sync")
+            if self.cache.set_cursor(cursor_data["cursor"], datetime.fromisoformat(last_sync) if last_sync else None):
+                os.remove(LEGACY_CURSOR_FILE)
+                logger.info(f"Migrated cursor from {LEGACY_CURSOR_FILE} into the cache database")
+            return cursor_data
         except Exception as e:
-            logger.error(f"Error loading cursor: {e}")
-        return None
+            logger.error(f"Error migrating legacy cursor: {e}")
+            return None
+    
+    def clear_cache(self) -> bool:
+        """Clear the local cache"""
+        return self.cache.clear_cache()
     
     def get_incremental_changes(self) -> tuple[List[DropboxFile], str]:
         """
@@ -101,8 +449,8 @@ class DropboxService:
                 logger.info(f"Getting incremental changes since {cursor_data.get('last_sync', 'unknown')}")
                 
                 try:
-                    result = self.dbx.files_list_folder_continue(cursor)
-                except dropbox.exceptions.ApiError as e:
+                    result = self._sdk(self.dbx.files_list_folder_continue, cursor)
+                except _dropbox().exceptions.ApiError as e:
                     if "reset" in str(e).lower():
                         logger.warning("Cursor expired, doing full resync")
                         return self._do_full_resync()
@@ -114,45 +462,25 @@ class DropboxService:
             
             # Process incremental changes
             changed_files = []
-            while True:
-                for entry in result.entries:
-                    if isinstance(entry, dropbox.files.FileMetadata):
-                        file_extension = os.path.splitext(entry.name)[1].lower()
-                        
-                        # Filter for supported file types
-                        if (file_extension in config.SUPPORTED_IMAGE_TYPES or 
-                            file_extension in config.SUPPORTED_VIDEO_TYPES):
-                            
-                            file_type = "image" if file_extension in config.SUPPORTED_IMAGE_TYPES else "video"
-                            
-                            dropbox_file = DropboxFile(
-                                id=entry.id,
-                                name=entry.name,
-                                path_lower=entry.path_lower,
-                                path_display=entry.path_display,
-                                size=entry.size,
-                                modified=entry.client_modified,
-                                content_hash=entry.content_hash,
-                                file_type=file_type,
-                                extension=file_extension
-                            )
-                            changed_files.append(dropbox_file)
-                    elif isinstance(entry, dropbox.files.DeletedMetadata):
-                        # Handle deletions - remove from cache
-                        self.cache.remove_file(entry.path_display)
-                        logger.info(f"File deleted from cache: {entry.path_display}")
+            batch = []
+            for page_files, deleted_paths, new_cursor in self._iter_pages(result):
+                if deleted_paths:
+                    # Flush earlier pages first so a later deletion wins
+                    if batch:
+                        self.cache.store_files(batch, is_full_sync=False)
+                        batch = []
+                    self.cache.remove_trees(deleted_paths)
                 
-                if not result.has_more:
-                    new_cursor = result.cursor
-                    break
-                result = self.dbx.files_list_folder_continue(result.cursor)
+                changed_files.extend(page_files)
+                batch.extend(page_files)
+                if len(batch) >= CACHE_WRITE_BATCH:
+                    self.cache.store_files(batch, is_full_sync=False)
+                    batch = []
             
-            # Store changed files in cache
-            if changed_files:
-                self.cache.store_files(changed_files, is_full_sync=False)
-            
-            # Save new cursor
-            self._save_cursor(new_cursor)
+            # Store the remaining changed files together with the new cursor;
+            # an idle pass with an unchanged cursor has nothing to write
+            if batch or new_cursor != cursor:
+                self.cache.store_files(batch, is_full_sync=False, sync_cursor=new_cursor)
             
             logger.info(f"Found {len(changed_files)} changed files since last sync")
             return changed_files, new_cursor
@@ -162,52 +490,55 @@ class DropboxService:
             # Fallback to full sync on error
             return self._do_full_resync()
     
+    def sync_changes(self) -> List[DropboxFile]:
+        """
+        Pull only the files changed since the saved cursor into the cache
+        
+        The first run walks the folder tree once; after that each call is
+        O(changes), usually a single list_folder/continue round trip.
+        
+        Returns:
+            Files added or modified since the last sync
+        """
+        changed_files, _ = self.get_incremental_changes()
+        return changed_files
+    
     def _do_full_resync(self) -> tuple[List[DropboxFile], str]:
         """Do a full resync when cursor is invalid or missing"""
         logger.info("Performing full resync...")
         
         files = []
-        result = self.dbx.files_list_folder("", recursive=True)
-        
-        while True:
-            for entry in result.entries:
-                if isinstance(entry, dropbox.files.FileMetadata):
-                    file_extension = os.path.splitext(entry.name)[1].lower()
-                    
-                    # Filter for supported file types
-                    if (file_extension in config.SUPPORTED_IMAGE_TYPES or 
-                        file_extension in config.SUPPORTED_VIDEO_TYPES):
-                        
-                        file_type = "image" if file_extension in config.SUPPORTED_IMAGE_TYPES else "video"
-                        
-                        dropbox_file = DropboxFile(
-                            id=entry.id,
-                            name=entry.name,
-                            path_lower=entry.path_lower,
-                            path_display=entry.path_display,
-                            size=entry.size,
-                            modified=entry.client_modified,
-                            content_hash=entry.content_hash,
-                            file_type=file_type,
-                            extension=file_extension
-                        )
-                        files.append(dropbox_file)
-            
-            if not result.has_more:
-                cursor = result.cursor
-                break
-            result = self.dbx.files_list_folder_continue(result.cursor)
+        result = self._sdk(self.dbx.files_list_folder, "", recursive=True, **LIST_FOLDER_OPTIONS)
+        self.cache.begin_full_sync()
         
-        # Store all files in cache (full sync)
-        if files:
-            self.cache.store_files(files, is_full_sync=True)
+        batch = []
+        complete = True
+        for page_files, _, cursor in self._iter_pages(result):
+            files.extend(page_files)
+            batch.extend(page_files)
+            if len(batch) >= CACHE_WRITE_BATCH:
+                complete &= self.cache.store_files(batch, is_full_sync=True) == len(batch)
+                batch = []
         
-        # Save cursor for future incremental syncs
-        self._save_cursor(cursor)
+        # Store the last batch (full sync), with the cursor for future
+        # incremental syncs committed in the same transaction. Files deleted
+        # since the cache was filled are pruned too, unless a batch failed
+        # and the cache can't tell them from files it never stored
+        self.cache.store_files(batch, is_full_sync=True, sync_cursor=cursor, prune_unseen=complete)
         
         logger.info(f"Full resync completed: {len(files)} files")
         return files, cursor
     
+    def _iter_files(self, folder_path: str = "", recursive: bool = True) -> Iterator[DropboxFile]:
+        """Stream supported files straight from the Dropbox API, one page in memory at a time"""
+        if recursive:
+            result = self._sdk(self.dbx.files_list_folder, folder_path, recursive=True, **LIST_FOLDER_OPTIONS)
+        else:
+            result = self._sdk(self.dbx.files_list_folder, folder_path, **LIST_FOLDER_OPTIONS)
+        
+        for page_files, _, _ in self._iter_pages(result):
+            yield from page_files
+    
     def list_files(self, folder_path: str = "", recursive: bool = True, use_cache: bool = True) -> List[DropboxFile]:
         """
         List files - now cache-first with fallback to Dropbox API
@@ -230,40 +561,7 @@ class DropboxService:
         # Fallback to original API method
         logger.warning("Using Dropbox API for file listing (slow) - consider syncing cache first")
         try:
-            files = []
-            
-            if recursive:
-                result = self.dbx.files_list_folder(folder_path, recursive=True)
-            else:
-                result = self.dbx.files_list_folder(folder_path)
-            
-            while True:
-                for entry in result.entries:
-                    if isinstance(entry, dropbox.files.FileMetadata):
-                        file_extension = os.path.splitext(entry.name)[1].lower()
-                        
-                        # Filter for supported file types
-                        if (file_extension in config.SUPPORTED_IMAGE_TYPES or 
-                            file_extension in config.SUPPORTED_VIDEO_TYPES):
-                            
-                            file_type = "image" if file_extension in config.SUPPORTED_IMAGE_TYPES else "video"
-                            
-                            dropbox_file = DropboxFile(
-                                id=entry.id,
-                                name=entry.name,
-                                path_lower=entry.path_lower,
-                                path_display=entry.path_display,
-                                size=entry.size,
-                                modified=entry.client_modified,
-                                content_hash=entry.content_hash,
-                                file_type=file_type,
-                                extension=file_extension
-                            )
-                            files.append(dropbox_file)
-                
-                if not result.has_more:
-                    break
-                result = self.dbx.files_list_folder_continue(result.cursor)
+            files = list(self._iter_files(folder_path, recursive))
             
             logger.info(f"Found {len(files)} supported files in Dropbox")
             return files
@@ -275,10 +573,10 @@ class DropboxService:
     def get_file_info(self, path: str) -> Optional[DropboxFile]:
         """Get detailed information about a specific file"""
         try:
-            metadata = self.dbx.files_get_metadata(path)
-            if isinstance(metadata, dropbox.files.FileMetadata):
-                file_extension = os.path.splitext(metadata.name)[1].lower()
-                file_type = "image" if file_extension in config.SUPPORTED_IMAGE_TYPES else "video"
+            metadata = self._sdk(self.dbx.files_get_metadata, path)
+            if isinstance(metadata, _dropbox().files.FileMetadata):
+                file_extension = _file_extension(metadata.name)
+                file_type = _EXT_TO_TYPE.get(file_extension, "video")
                 
                 return DropboxFile(
                     id=metadata.id,
@@ -289,35 +587,50 @@ class DropboxService:
                     modified=metadata.client_modified,
                     content_hash=metadata.content_hash,
                     file_type=file_type,
-                    extension=file_extension
+                    extension=file_extension,
+                    server_modified=metadata.server_modified
                 )
         except Exception as e:
             logger.error(f"Error getting file info for {path}: {e}")
             return None
     
+    def _get_cached_link(self, path: str) -> Optional[str]:
+        """Return the shared link persisted for a path if it hasn't expired"""
+        return self.cache.get_shared_link(path, max_age=SHARED_LINK_PERSIST_TTL)
+    
+    def _cache_link(self, path: str, link: Optional[str]) -> Optional[str]:
+        """Persist a shared link for a path in the cache database, and return it"""
+        if link:
+            self.cache.set_shared_link(path, link)
+        return link
+    
     def create_shared_link(self, path: str) -> Optional[str]:
         """Create a public shared link for a file"""
+        cached_link = self._get_cached_link(path)
+        if cached_link:
+            return cached_link
+        
         try:
             # Check if shared link already exists
-            existing_links = self.dbx.sharing_list_shared_links(path=path)
+            existing_links = self._sdk(self.dbx.sharing_list_shared_links, path=path)
             if existing_links.links:
                 link = existing_links.links[0].url
                 # Convert to direct download link
-                return link.replace('?dl=0', '?dl=1')
+                return self._cache_link(path, link.replace('?dl=0', '?dl=1'))
             
             # Create new shared link
-            shared_link = self.dbx.sharing_create_shared_link_with_settings(path)
+            shared_link = self._sdk(self.dbx.sharing_create_shared_link_with_settings, path)
             link = shared_link.url
             # Convert to direct download link
-            return link.replace('?dl=0', '?dl=1')
+            return self._cache_link(path, link.replace('?dl=0', '?dl=1'))
             
-        except dropbox.exceptions.ApiError as e:
+        except _dropbox().exceptions.ApiError as e:
             if 'shared_link_already_exists' in str(e):
                 # Get existing link
-                existing_links = self.dbx.sharing_list_shared_links(path=path)
+                existing_links = self._sdk(self.dbx.sharing_list_shared_links, path=path)
                 if existing_links.links:
                     link = existing_links.links[0].url
-                    return link.replace('?dl=0', '?dl=1')
+                    return self._cache_link(path, link.replace('?dl=0', '?dl=1'))
             logger.error(f"Error creating shared link for {path}: {e}")
             return None
         except Exception as e:
@@ -327,22 +640,23 @@ class DropboxService:
     def get_thumbnail_link(self, path: str, size: str = "medium") -> Optional[str]:
         """Get thumbnail URL for an image file"""
         try:
-            if not path.lower().endswith(tuple(config.SUPPORTED_IMAGE_TYPES)):
+            if _file_extension(path) not in _IMAGE_EXT_SET:
                 return None
             
             # Map size parameter to Dropbox thumbnail sizes
-            size_mapping = {
-                "small": dropbox.files.ThumbnailSize.w128h128,
-                "medium": dropbox.files.ThumbnailSize.w640h480,
-                "large": dropbox.files.ThumbnailSize.w1024h768
-            }
+            thumbnail_size = _sdk_thumbnail_size(size)
             
-            thumbnail_size = size_mapping.get(size, dropbox.files.ThumbnailSize.w640h480)
+            cached_link = self._get_cached_link(path)
+            if cached_link:
+                return f"{cached_link}&thumbnail=1&size={size}"
             
-            # Get thumbnail data
-            metadata, thumbnail_content = self.dbx.files_get_thumbnail(
+            # Get thumbnail data on the pool while the shared link is resolved
+            # here; the two API calls are independent
+            thumbnail = self._download_pool.submit(
+                self._sdk,
+                self.dbx.files_get_thumbnail,
                 path, 
-                format=dropbox.files.ThumbnailFormat.jpeg, 
+                format=_dropbox().files.ThumbnailFormat.jpeg, 
                 size=thumbnail_size
             )
             
@@ -350,6 +664,7 @@ class DropboxService:
             # Note: This is a simplified approach. In production, you might want to
             # store thumbnails in a CDN or object storage for better performance
             shared_link = self.create_shared_link(path)
+            metadata, thumbnail_content = thumbnail.result()
             
             # For now, we'll return the shared link with a size parameter
             # In a full implementation, you'd upload the thumbnail_response.content 
@@ -366,37 +681,65 @@ class DropboxService:
     def get_video_preview_link(self, path: str) -> Optional[str]:
         """Get a preview/thumbnail for a video file"""
         try:
-            if not path.lower().endswith(tuple(config.SUPPORTED_VIDEO_TYPES)):
+            if _file_extension(path) not in _VIDEO_EXT_SET:
                 return None
             
-            # Try to get video thumbnail
+            cached_link = self._get_cached_link(path)
+            if cached_link:
+                return f"{cached_link}&preview=1&type=video"
+            
+            # Try to get video thumbnail, concurrently with the shared link
+            thumbnail = self._download_pool.submit(
+                self._sdk,
+                self.dbx.files_get_thumbnail,
+                path,
+                format=_dropbox().files.ThumbnailFormat.jpeg,
+                size=_dropbox().files.ThumbnailSize.w640h480
+            )
+            shared_link = self.create_shared_link(path)
+            
             try:
-                metadata, thumbnail_content = self.dbx.files_get_thumbnail(
-                    path,
-                    format=dropbox.files.ThumbnailFormat.jpeg,
-                    size=dropbox.files.ThumbnailSize.w640h480
-                )
+                metadata, thumbnail_content = thumbnail.result()
                 
-                # Create shared link for the video thumbnail
-                shared_link = self.create_shared_link(path)
+                # Use the shared link for the video thumbnail
                 if shared_link:
                     return f"{shared_link}&preview=1&type=video"
                     
-            except dropbox.exceptions.ApiError:
+            except _dropbox().exceptions.ApiError:
                 # If thumbnail fails, return regular shared link
                 logger.info(f"No thumbnail available for video {path}, using regular link")
-                return self.create_shared_link(path)
+                return shared_link
             
-            return self.create_shared_link(path)
+            return shared_link
             
         except Exception as e:
             logger.error(f"Error getting video preview for {path}: {e}")
             return self.create_shared_link(path)  # Fallback to full video
     
+    def _stream_to_file(self, path: str, local_path: str):
+        """
+        Stream a Dropbox file to local_path in 1MB chunks
+        
+        The body goes to a .part file that is renamed into place only once
+        complete, so a failed download never leaves a truncated file that
+        later looks like a fresh cached copy.
+        """
+        part_path = f"{local_path}.part"
+        try:
+            _, response = self._sdk(self.dbx.files_download, path)
+            with response, open(part_path, 'wb') as f:
+                response.raw.decode_content = True
+                shutil.copyfileobj(response.raw, f, length=DOWNLOAD_CHUNK_SIZE)
+            os.replace(part_path, local_path)
+        except Exception:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            raise
+    
     def download_file(self, path: str, local_path: str) -> bool:
         """Download a file from Dropbox"""
         try:
-            self.dbx.files_download_to_file(local_path, path)
+            self._stream_to_file(path, local_path)
             return True
         except Exception as e:
             logger.error(f"Error downloading file {path}: {e}")
@@ -404,46 +747,93 @@ class DropboxService:
     
     def get_files_modified_after(self, after_date: datetime, use_cache: bool = True) -> List[DropboxFile]:
         """Get files modified after a specific date - cache-first approach"""
-        if use_cache and not self.cache.is_cache_empty():
+        if use_cache:
+            if self.cache.is_cache_empty():
+                # Seed the cache (and the saved cursor) once, so later calls
+                # only pull deltas instead of re-listing the whole tree
+                logger.info("Cache is empty, syncing before filtering by modified date")
+                self.sync_changes()
             logger.info("Getting modified files from local cache")
             return self.cache.get_files_modified_after(after_date)
         
-        # Fallback to old method (inefficient)
-        logger.warning("Using inefficient method - fetching all files then filtering")
-        all_files = self.list_files(use_cache=False)
-        return [f for f in all_files if f.modified > after_date]
+        # Fallback to listing the API (inefficient); filter while streaming
+        # so only the matches are kept, not the whole tree
+        logger.warning("Using inefficient method - listing all files from the API and filtering")
+        return [f for f in self._iter_files() if f.modified > after_date]
+    
+    def get_files_changed_after(self, after: datetime, use_cache: bool = True) -> Optional[List[DropboxFile]]:
+        """
+        Get files that changed on Dropbox after a point in time - cache-first approach
+        
+        Unlike get_files_modified_after this compares server_modified, so a
+        file uploaded or copied in with an older client time is still
+        picked up. Returns None if the cache could not be read.
+        """
+        if use_cache:
+            if self.cache.is_cache_empty():
+                logger.info("Cache is empty, syncing before filtering by change time")
+                self.sync_changes()
+            return self.cache.get_files_changed_after(after)
+        
+        logger.warning("Using inefficient method - listing all files from the API and filtering")
+        return [f for f in self._iter_files() if f.server_modified and f.server_modified > after]
 
+    def _temp_manifest_entries(self) -> Dict[str, float]:
+        """The temp file manifest, scanning the temp directory on first use"""
+        if self._temp_manifest is None:
+            with self._temp_manifest_lock:
+                if self._temp_manifest is None:
+                    manifest = {}
+                    with os.scandir(self._temp_dir) as entries:
+                        for entry in entries:
+                            if entry.is_file(follow_symlinks=False):
+                                manifest[entry.name] = entry.stat(follow_symlinks=False).st_mtime
+                    self._temp_manifest = manifest
+        return self._temp_manifest
+    
+    def _is_temp_fresh(self, filename: str) -> bool:
+        """Whether a temp file was written less than TEMP_FILE_TTL seconds ago and is still on disk"""
+        manifest = self._temp_manifest_entries()
+        if time.time() - manifest.get(filename, 0.0) >= TEMP_FILE_TTL:
+            return False
+        
+        # Video cleanup or an outside tmp sweep can remove the file behind
+        # the manifest's back, so confirm a hit before serving it
+        if not os.path.exists(os.path.join(self._temp_dir, filename)):
+            manifest.pop(filename, None)
+            return False
+        return True
+    
+    def _mark_temp_written(self, filename: str):
+        """Record that a temp file was just (re)written"""
+        self._temp_manifest_entries()[filename] = time.time()
+    
     def download_file_to_temp(self, path: str) -> Optional[str]:
         """Download a file to temporary directory and return local path"""
         try:
             # Create a safe filename based on the path hash
-            path_hash = hashlib.md5(path.encode()).hexdigest()
+            path_hash = _path_key(path)
             file_extension = os.path.splitext(path)[1]
             temp_filename = f"{path_hash}{file_extension}"
             
-            # Create temp directory if it doesn't exist
-            temp_dir = os.path.join(os.getcwd(), "temp_files")
-            os.makedirs(temp_dir, exist_ok=True)
-            
-            local_path = os.path.join(temp_dir, temp_filename)
+            local_path = os.path.join(self._temp_dir, temp_filename)
             
-            # Check if file already exists and is recent
-            if os.path.exists(local_path):
-                # File exists, check if it's still fresh (less than 1 hour old)
-                file_age = datetime.now().timestamp() - os.path.getmtime(local_path)
-                if file_age < 3600:  # 1 hour
-                    logger.info(f"Using cached file: {local_path}")
-                    return local_path
+            # Reuse the file if it was downloaded within the last hour
+            if self._is_temp_fresh(temp_filename):
+                logger.info(f"Using cached file: {local_path}")
+                return local_path
             
             # Download the file
-            self.dbx.files_download_to_file(local_path, path)
+            with self._download_semaphore:
+                self._stream_to_file(path, local_path)
+            self._mark_temp_written(temp_filename)
             logger.info(f"Downloaded {path} to {local_path}")
             return local_path
             
         except Exception as e:
             logger.error(f"Error downloading file {path} to temp: {e}")
             return None
-
+    
     def get_local_file_url(self, path: str, base_url: str = None) -> Optional[str]:
         """Download file and return a local server URL"""
         try:
@@ -455,10 +845,6 @@ class DropboxService:
             if base_url is None:
                 base_url = config.SERVER_URL
                 
-            # Convert absolute path to relative path for URL
-            temp_dir = os.path.join(os.getcwd(), "temp_files")
-            relative_path = os.path.relpath(local_path, os.getcwd())
-            
             # Return URL that our FastAPI server can serve
             file_url = f"{base_url}/files/{os.path.basename(local_path)}"
             return file_url
@@ -470,7 +856,7 @@ class DropboxService:
     def get_local_thumbnail(self, path: str, size: str = "medium", base_url: str = None) -> Optional[str]:
         """Get local thumbnail for an image file"""
         try:
-            if not path.lower().endswith(tuple(config.SUPPORTED_IMAGE_TYPES)):
+            if _file_extension(path) not in _IMAGE_EXT_SET:
                 return None
             
             # Use config server URL if base_url not provided
@@ -478,33 +864,24 @@ class DropboxService:
                 base_url = config.SERVER_URL
             
             # Map size parameter to Dropbox thumbnail sizes
-            size_mapping = {
-                "small": dropbox.files.ThumbnailSize.w128h128,
-                "medium": dropbox.files.ThumbnailSize.w640h480,
-                "large": dropbox.files.ThumbnailSize.w1024h768
-            }
-            
-            thumbnail_size = size_mapping.get(size, dropbox.files.ThumbnailSize.w640h480)
+            thumbnail_size = _sdk_thumbnail_size(size)
             
             # Create thumbnail filename
-            path_hash = hashlib.md5(path.encode()).hexdigest()
+            path_hash = _path_key(path)
             thumb_filename = f"{path_hash}_thumb_{size}.jpg"
             
-            temp_dir = os.path.join(os.getcwd(), "temp_files")
-            os.makedirs(temp_dir, exist_ok=True)
-            thumb_path = os.path.join(temp_dir, thumb_filename)
+            thumb_path = os.path.join(self._temp_dir, thumb_filename)
             
-            # Check if thumbnail already exists
-            if os.path.exists(thumb_path):
-                file_age = datetime.now().timestamp() - os.path.getmtime(thumb_path)
-                if file_age < 3600:  # 1 hour cache
-                    return f"{base_url}/files/{thumb_filename}"
+            # Reuse the thumbnail if it was written within the last hour
+            if self._is_temp_fresh(thumb_filename):
+                return f"{base_url}/files/{thumb_filename}"
             
             # Get thumbnail from Dropbox
             try:
-                metadata, response = self.dbx.files_get_thumbnail(
+                metadata, response = self._sdk(
+                    self.dbx.files_get_thumbnail,
                     path, 
-                    format=dropbox.files.ThumbnailFormat.jpeg, 
+                    format=_dropbox().files.ThumbnailFormat.jpeg, 
                     size=thumbnail_size
                 )
                 
@@ -520,6 +897,7 @@ class DropboxService:
                 # Save thumbnail to local file
                 with open(thumb_path, 'wb') as f:
                     f.write(thumbnail_content)
+                self._mark_temp_written(thumb_filename)
                 
                 logger.info(f"Created thumbnail for {path} at {thumb_path}")
                 return f"{base_url}/files/{thumb_filename}"
@@ -537,19 +915,20 @@ class DropboxService:
     def cleanup_temp_files(self, max_age_hours: int = 24):
         """Clean up old temporary files"""
         try:
-            temp_dir = os.path.join(os.getcwd(), "temp_files")
-            if not os.path.exists(temp_dir):
+            if not os.path.exists(self._temp_dir):
                 return
                 
-            current_time = datetime.now().timestamp()
+            cutoff = time.time() - max_age_hours * 3600
             cleaned_count = 0
             
-            for filename in os.listdir(temp_dir):
-                file_path = os.path.join(temp_dir, filename)
-                if os.path.isfile(file_path):
-                    file_age = current_time - os.path.getmtime(file_path)
-                    if file_age > (max_age_hours * 3600):
-                        os.remove(file_path)
+            # DirEntry caches the stat from the directory scan, so each file
+            # costs one stat instead of one per isfile/getmtime call
+            with os.scandir(self._temp_dir) as entries:
+                for entry in entries:
+                    if entry.is_file(follow_symlinks=False) and entry.stat(follow_symlinks=False).st_mtime < cutoff:
+                        os.unlink(entry.path)
+                        if self._temp_manifest is not None:
+                            self._temp_manifest.pop(entry.name, None)
                         cleaned_count += 1
             
             if cleaned_count > 0:
@@ -560,4 +939,138 @@ class DropboxService:
 
     def get_file_by_path_cached(self, path: str) -> Optional[DropboxFile]:
         """Get file by path from cache (instant lookup)"""
-        return self.cache.get_file_by_path(path) 
\ No newline at end of file
+        return self.cache.get_file_by_path(path)
+    
+    async def iter_file_pages(self, folder_path: str = "", recursive: bool = True, use_cache: bool = True) -> AsyncIterator[List[DropboxFile]]:
+        """
+        Stream files page by page - cache-first with fallback to the Dropbox HTTP API
+        
+        Callers can start on the first page while later ones are still
+        being fetched, and on the API path only the pages in flight are
+        held in memory.
+        
+        Args:
+            folder_path: Folder to list
+            recursive: Include subfolders
+            use_cache: Whether to use cache first (default: True)
+        """
+        if use_cache and not self.cache.is_cache_empty():
+            cached_files = await asyncio.to_thread(self.cache.get_files, folder_path)
+            if cached_files:
+                logger.info(f"Retrieved {len(cached_files)} files from cache")
+                for start in range(0, len(cached_files), LIST_FOLDER_PAGE_SIZE):
+                    yield cached_files[start:start + LIST_FOLDER_PAGE_SIZE]
+                return
+        
+        logger.warning("Using Dropbox API for file listing (slow) - consider syncing cache first")
+        async for page in self._iter_api_pages_async(folder_path, recursive):
+            yield page
+    
+    async def _iter_api_pages_async(self, folder_path: str, recursive: bool) -> AsyncIterator[List[DropboxFile]]:
+        """Yield the supported files of each list_folder page from the Dropbox HTTP API"""
+        pages: asyncio.Queue = asyncio.Queue(maxsize=2)
+        
+        # Fetch pages in a separate task so the next continue call is in
+        # flight while the current page is being parsed
+        async def fetch_pages():
+            try:
+                result = await self._rpc_async("files/list_folder", {
+                    "path": folder_path,
+                    "recursive": recursive,
+                    **LIST_FOLDER_OPTIONS
+                })
+                await pages.put(result)
+                while result["has_more"]:
+                    result = await self._rpc_async("files/list_folder/continue", {"cursor": result["cursor"]})
+                    await pages.put(result)
+            except Exception as e:
+                await pages.put(e)
+                return
+            await pages.put(None)
+        
+        to_dropbox_file = self._entry_to_dropbox_file
+        fetcher = asyncio.create_task(fetch_pages())
+        try:
+            while True:
+                page = await pages.get()
+                if page is None:
+                    break
+                if isinstance(page, Exception):
+                    raise page
+                
+                page_files = []
+                for entry in page["entries"]:
+                    dropbox_file = to_dropbox_file(entry)
+                    if dropbox_file:
+                        page_files.append(dropbox_file)
+                yield page_files
+        finally:
+            fetcher.cancel()
+            await asyncio.gather(fetcher, return_exceptions=True)
+    
+    async def _single_flight(self, key: tuple, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run fetch, or join the identical call already in flight for key
+        
+        The shared call is shielded, so a cancelled caller does not cancel
+        it for the others waiting on it.
+        """
+        pending = self._inflight.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(fetch())
+            self._inflight[key] = pending
+            pending.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(pending)
+    
+    async def get_thumbnail_async(self, path: str, size: str = "medium") -> Optional[tuple[Dict[str, Any], bytes]]:
+        """
+        Fetch a JPEG thumbnail from Dropbox
+        
+        Args:
+            path: Dropbox file path
+            size: small, medium or large
+            
+        Returns:
+            Tuple of (metadata, thumbnail bytes) or None if unavailable
+        """
+        return await self._single_flight(("thumbnail", path.lower(), size), lambda: self._fetch_thumbnail_async(path, size))
+    
+    async def _fetch_thumbnail_async(self, path: str, size: str) -> Optional[tuple[Dict[str, Any], bytes]]:
+        """Download a thumbnail from the Dropbox API"""
+        try:
+            return await self._content_async("files/get_thumbnail", {
+                "path": path,
+                "format": "jpeg",
+                "size": THUMBNAIL_SIZES.get(size, "w640h480")
+            })
+        except Exception as e:
+            logger.warning(f"Thumbnail not available for {path}: {e}")
+            return None
+    
+    async def download_async(self, path: str) -> Optional[tuple[Dict[str, Any], bytes]]:
+        """
+        Download a file's content from Dropbox
+        
+        Args:
+            path: Dropbox file path
+            
+        Returns:
+            Tuple of (metadata, file bytes) or None if the download failed
+        """
+        try:
+            return await self._content_async("files/download", {"path": path})
+        except Exception as e:
+            logger.error(f"Error downloading file {path}: {e}")
+            return None
+    
+    async def close(self):
+        """Release service resources (the shared HTTP client is closed at shutdown)"""
+        self._download_pool.shutdown(wait=False, cancel_futures=True)
+        self._page_prefetch.shutdown(wait=False, cancel_futures=True)
+        self.cache.close()
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
@@ -0,0 +1,227 @@
+# Prefer the pysqlite3 wheel, which bundles a current, optimized SQLite
+# build independent of the OS one; fall back to the stdlib module
+try:
+    import pysqlite3 as sqlite3
+except ImportError:
+    import sqlite3
+import hashlib
+import logging
+import asyncio
+import os
+import numpy as np
+from collections import OrderedDict
+from typing import List, Optional, Callable, Awaitable, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+# Same durability trade-off as the Dropbox cache: losing the last few cached
+# vectors on a crash only costs a recompute. WAL persists in the file, so
+# it is set once at init
+_DATABASE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+)
+
+_CONNECTION_PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+)
+
+# Entries kept in the in-process LRU in front of SQLite
+MEMORY_CACHE_SIZE = 10_000
+
+# Vectors are stored half precision on disk and in memory; the cosine error
+# this introduces for CLIP embeddings is well under 0.1%
+STORAGE_DTYPE = np.float16
+
+class EmbeddingCacheService:
+    """
+    Content-addressed on-disk cache for CLIP embeddings
+    
+    Keys are a blake2b digest of (model version, storage dtype, input kind,
+    input bytes), so identical images or query strings hit the cache
+    regardless of where they came from, and bumping the model version or the
+    storage format invalidates every entry.
+    
+    Hot entries are also held in an in-process LRU, so repeated queries
+    never touch SQLite. The LRU is only used from the event loop, which
+    keeps it free of locking. Concurrent misses on the same key share one
+    lookup and one compute rather than each calling the CLIP service.
+    """
+    
+    def __init__(self, model_version: str, db_path: str = None, memory_size: int = MEMORY_CACHE_SIZE):
+        if db_path is None:
+            data_dir = os.environ.get('CACHE_DATA_DIR', '.')
+            self.db_path = os.path.join(data_dir, "embedding_cache.db")
+        else:
+            self.db_path = db_path
+        
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir, exist_ok=True)
+        
+        self.model_version = model_version.encode("utf-8")
+        self.memory_size = memory_size
+        self._memory: OrderedDict = OrderedDict()
+        self._inflight: Dict[bytes, asyncio.Future] = {}
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        
+        self.init_database()
+        logger.info(f"Embedding cache initialized with database: {self.db_path}")
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection to the embedding cache database"""
+        conn = sqlite3.connect(self.db_path)
+        for pragma in _CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+    
+    def init_database(self):
+        """Create the embeddings table if needed"""
+        try:
+            with self._connect() as conn:
+                for pragma in _DATABASE_PRAGMAS:
+                    conn.execute(pragma)
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS embeddings (
+                        key BLOB PRIMARY KEY,
+                        vector BLOB NOT NULL
+                    ) WITHOUT ROWID
+                """)
+                conn.commit()
+        except Exception as e:
+            logger.error(f"Error initializing embedding cache: {e}")
+    
+    def new_hasher(self, kind: str):
+        """
+        Start a key hash for an input, for callers that feed it incrementally
+        
+        Args:
+            kind: Input kind ('text' or 'image')
+        
+        Returns:
+            blake2b hasher whose digest() is the cache key once fed the input
+        """
+        h = hashlib.blake2b(digest_size=16)
+        h.update(self.model_version)
+        h.update(b"\0")
+        h.update(np.dtype(STORAGE_DTYPE).name.encode("utf-8"))
+        h.update(b"\0")
+        h.update(kind.encode("utf-8"))
+        h.update(b"\0")
+        return h
+    
+    def make_key(self, kind: str, data: bytes) -> bytes:
+        """
+        Build the content-addressed key for an input
+        
+        Args:
+            kind: Input kind ('text' or 'image')
+            data: Raw input bytes
+        
+        Returns:
+            16-byte digest
+        """
+        h = self.new_hasher(kind)
+        h.update(data)
+        return h.digest()
+    
+    def get(self, key: bytes) -> Optional[np.ndarray]:
+        """Return the cached vector for a key, or None on a miss"""
+        try:
+            with self._connect() as conn:
+                row = conn.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            return np.frombuffer(row[0], dtype=STORAGE_DTYPE)
+        except Exception as e:
+            logger.error(f"Error reading embedding cache: {e}")
+            return None
+    
+    def put(self, key: bytes, vector: np.ndarray):
+        """Store a vector as packed STORAGE_DTYPE"""
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                    (key, vector.tobytes())
+                )
+                conn.commit()
+        except Exception as e:
+            logger.error(f"Error writing embedding cache: {e}")
+    
+    async def get_or_compute(self, kind: str, data: bytes,
+                             compute: Callable[[], Awaitable[Optional[List[float]]]]) -> Optional[List[float]]:
+        """
+        Return a cached embedding, computing and storing it on a miss
+        
+        Args:
+            kind: Input kind ('text' or 'image')
+            data: Raw input bytes used for the key
+            compute: Coroutine function producing the embedding
+        
+        Returns:
+            Embedding or None if computing it failed
+        """
+        return await self.get_or_compute_by_key(self.make_key(kind, data), kind, compute)
+    
+    async def get_or_compute_by_key(self, key: bytes, kind: str,
+                                    compute: Callable[[], Awaitable[Optional[List[float]]]]) -> Optional[List[float]]:
+        """Same as get_or_compute, for a key already built with new_hasher"""
+        cached = self._memory.get(key)
+        if cached is not None:
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+            return cached.astype(np.float32).tolist()
+        
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending)
+        
+        # Shielded so a cancelled caller does not cancel the lookup for the
+        # others waiting on it
+        task = asyncio.ensure_future(self._load_or_compute(key, kind, compute))
+        self._inflight[key] = task
+        task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+    
+    async def _load_or_compute(self, key: bytes, kind: str,
+                               compute: Callable[[], Awaitable[Optional[List[float]]]]) -> Optional[List[float]]:
+        """Read a key through to SQLite, computing and storing it on a miss"""
+        cached = await asyncio.to_thread(self.get, key)
+        if cached is not None:
+            logger.info(f"Embedding cache hit for {kind} input")
+            self.disk_hits += 1
+            self._remember(key, cached)
+            return cached.astype(np.float32).tolist()
+        
+        self.misses += 1
+        embedding = await compute()
+        if embedding:
+            vector = np.asarray(embedding, dtype=STORAGE_DTYPE)
+            self._remember(key, vector)
+            await asyncio.to_thread(self.put, key, vector)
+        return embedding
+    
+    def _remember(self, key: bytes, vector: np.ndarray):
+        """Insert into the in-process LRU, evicting the oldest entry when full"""
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        if len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters for tuning the cache sizes"""
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_entries": len(self._memory),
+            "memory_size": self.memory_size,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0
+        }
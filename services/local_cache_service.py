@@ -1,16 +1,228 @@
-import sqlite3
+# Prefer the pysqlite3 wheel, which bundles a current, optimized SQLite
+# build independent of the OS one; fall back to the stdlib module
+try:
+    import pysqlite3 as sqlite3
+except ImportError:
+    import sqlite3
 import logging
 import json
-from typing import List, Optional, Dict, Any
-from datetime import datetime
+from typing import List, Optional, Dict, Any, Iterator
+from datetime import datetime, timedelta, timezone
 import os
-from pathlib import Path
+import time
+import queue
+import threading
+from contextlib import contextmanager
 
 from models import DropboxFile
 from config import config
 
 logger = logging.getLogger(__name__)
 
+# WAL is recorded in the database file itself, so it is set once at init
+# rather than re-negotiated on every connection
+_DATABASE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+)
+
+# Applied to every connection: under WAL, NORMAL drops the per-commit fsync;
+# the larger page cache and mmap keep hot index pages in memory during syncs
+_CONNECTION_PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=1073741824",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA journal_size_limit=67108864",
+)
+
+# Free pages returned to the filesystem per maintenance() call
+VACUUM_PAGES = 128000
+
+# Sorts after any character, closing a prefix range in BINARY collation
+_MAX_CHAR = "\U0010ffff"
+
+# Read connections kept open; each holds its own warm page cache
+READ_POOL_SIZE = 4
+
+# Rows materialized at a time when streaming query results
+FETCH_BATCH = 1000
+
+# Secondary indexes on files by name. The composite ones serve get_files, so
+# folder and type listings come back from an index range already ordered by
+# path. They are dropped while an empty cache is bulk-filled and built once
+# at the end, in a single sorted pass instead of per-row B-tree inserts
+_SECONDARY_INDEXES = {
+    "idx_modified_ts": "modified_ts",
+    "idx_server_modified_ts": "server_modified_ts",
+    "idx_parent_pathdisp": "parent_path, path_display",
+    "idx_type_pathdisp": "file_type_id, path_display",
+}
+
+# Columns selected for DropboxFile rows, in the order _row_to_file reads them.
+# File types and extensions are stored as ids into small lookup tables; the
+# names are resolved with a primary key seek each
+_FILE_COLUMNS = (
+    "id, name, path_lower, path_display, size, modified_ts, "
+    "content_hash, is_downloadable, "
+    "(SELECT name FROM file_types WHERE file_types.id = file_type_id), "
+    "(SELECT name FROM extensions WHERE extensions.id = extension_id), "
+    "server_modified_ts"
+)
+
+# Statements run on every sync or lookup. Keeping each one a single module
+# constant means every call passes the same string object, whose hash is
+# computed once, to the sqlite3 statement cache of the pooled connections
+
+# Upsert keyed on path_lower: unchanged rows are left untouched (no index or
+# WAL writes), and changed ones are updated in place instead of the
+# delete-and-reinsert of INSERT OR REPLACE. parent_path is path_display minus
+# the trailing name, NULL at the root
+_SQL_UPSERT_FILE = """
+    INSERT INTO files (
+        id, path_lower, path_display, name, parent_path,
+        file_type_id, extension_id, size, 
+        modified_ts, content_hash, is_downloadable, last_synced,
+        server_modified_ts
+    ) VALUES (
+        ?1, ?2, ?3, ?4,
+        NULLIF(rtrim(substr(?3, 1, length(?3) - length(?4)), '/'), ''),
+        ?5, ?6, ?7, ?8, ?9, ?10, ?11, ?12
+    )
+    ON CONFLICT(path_lower) DO UPDATE SET
+        id = excluded.id,
+        path_display = excluded.path_display,
+        name = excluded.name,
+        parent_path = excluded.parent_path,
+        file_type_id = excluded.file_type_id,
+        extension_id = excluded.extension_id,
+        size = excluded.size,
+        modified_ts = excluded.modified_ts,
+        content_hash = excluded.content_hash,
+        is_downloadable = excluded.is_downloadable,
+        last_synced = excluded.last_synced,
+        server_modified_ts = excluded.server_modified_ts
+    WHERE excluded.content_hash IS NOT files.content_hash
+        OR excluded.modified_ts IS NOT files.modified_ts
+        OR excluded.size IS NOT files.size
+        OR excluded.id IS NOT files.id
+        OR excluded.path_display IS NOT files.path_display
+        OR excluded.file_type_id IS NOT files.file_type_id
+        OR excluded.extension_id IS NOT files.extension_id
+        OR excluded.is_downloadable IS NOT files.is_downloadable
+        OR excluded.server_modified_ts IS NOT files.server_modified_ts
+"""
+
+# A file moved since it was cached keeps its id under a new path; its old row
+# would make the upsert fail on the id key, so it is removed first
+_SQL_DELETE_MOVED = "DELETE FROM files WHERE id = ? AND path_lower <> ?"
+
+# Paths listed by the running full sync, on the write connection only; rows
+# missing from it when the sync ends were deleted on the Dropbox side
+_SQL_CREATE_SEEN = """
+    CREATE TEMP TABLE IF NOT EXISTS full_sync_seen (
+        path_lower TEXT PRIMARY KEY
+    ) WITHOUT ROWID
+"""
+
+_SQL_MARK_SEEN = "INSERT OR IGNORE INTO temp.full_sync_seen (path_lower) VALUES (?)"
+
+_SQL_PRUNE_UNSEEN = """
+    DELETE FROM files
+    WHERE path_lower NOT IN (SELECT path_lower FROM temp.full_sync_seen)
+"""
+
+_SQL_PRUNE_LINKS = """
+    DELETE FROM shared_links
+    WHERE path NOT IN (SELECT path_lower FROM files)
+"""
+
+_SQL_SET_METADATA = """
+    INSERT OR REPLACE INTO sync_metadata (key, value, updated_at)
+    VALUES (?, ?, ?)
+"""
+
+_SQL_GET_METADATA = "SELECT value FROM sync_metadata WHERE key = ?"
+
+_SQL_SELECT_FILES = f"SELECT {_FILE_COLUMNS} FROM files"
+
+# Paths are matched on path_lower only, a single seek on its UNIQUE index;
+# callers' paths are lowercased first, which also covers display paths
+_SQL_GET_BY_PATH = f"""
+    SELECT {_FILE_COLUMNS} FROM files 
+    WHERE path_lower = ?
+"""
+
+_SQL_MODIFIED_AFTER = f"""
+    SELECT {_FILE_COLUMNS} FROM files 
+    WHERE modified_ts > ?
+    ORDER BY modified_ts DESC
+"""
+
+_SQL_CHANGED_AFTER = f"""
+    SELECT {_FILE_COLUMNS} FROM files 
+    WHERE server_modified_ts > ?
+"""
+
+_SQL_DELETE_FILE = "DELETE FROM files WHERE path_lower = ?"
+
+_SQL_DELETE_LINK = "DELETE FROM shared_links WHERE path = ?"
+
+# Rows under "p/" sort between "p/" and "p0" ('0' follows '/')
+_SQL_DELETE_TREE = """
+    DELETE FROM files 
+    WHERE path_lower = ?1 OR (path_lower >= ?2 AND path_lower < ?3)
+"""
+
+_SQL_DELETE_LINK_TREE = """
+    DELETE FROM shared_links 
+    WHERE path = ?1 OR (path >= ?2 AND path < ?3)
+"""
+
+_SQL_GET_LINK = "SELECT url, created_at FROM shared_links WHERE path = ?"
+
+_SQL_SET_LINK = """
+    INSERT OR REPLACE INTO shared_links (path, url, created_at)
+    VALUES (?, ?, ?)
+"""
+
+_SQL_SET_CURSOR = """
+    INSERT OR REPLACE INTO sync_state (id, cursor, last_sync)
+    VALUES (1, ?, ?)
+"""
+
+_SQL_GET_CURSOR = "SELECT cursor, last_sync FROM sync_state WHERE id = 1"
+
+# Modification times are stored as integer microseconds since the epoch.
+# Dropbox reports naive UTC datetimes, and they are read back the same way
+_EPOCH = datetime(1970, 1, 1)
+
+def _to_micros(dt: datetime) -> int:
+    """Microseconds since the epoch for a naive-UTC or aware datetime"""
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return (dt - _EPOCH) // timedelta(microseconds=1)
+
+def _from_micros(micros: int) -> datetime:
+    """Naive UTC datetime for a stored microsecond timestamp"""
+    return _EPOCH + timedelta(microseconds=micros)
+
+def _row_to_file(cursor: sqlite3.Cursor, row: tuple) -> DropboxFile:
+    """Row factory building a DropboxFile straight from a _FILE_COLUMNS row"""
+    return DropboxFile.model_construct(
+        id=row[0],
+        name=row[1],
+        path_lower=row[2],
+        path_display=row[3],
+        size=row[4],
+        modified=_from_micros(row[5]),
+        content_hash=row[6],
+        is_downloadable=bool(row[7]),
+        file_type=row[8],
+        extension=row[9],
+        server_modified=_from_micros(row[10]) if row[10] is not None else None
+    )
+
 class LocalCacheService:
     def __init__(self, db_path: str = None):
         # Use environment variable or default path
@@ -27,13 +239,80 @@ class LocalCacheService:
             os.makedirs(db_dir, exist_ok=True)
             logger.info(f"Created cache directory: {db_dir}")
         
+        # One writer serialized by a lock, plus a pool of readers; under WAL
+        # readers never wait on the writer
+        self._write_conn = self._connect()
+        self._write_lock = threading.Lock()
+        self._readers: queue.LifoQueue = queue.LifoQueue(maxsize=READ_POOL_SIZE)
+        
+        # name -> id for the lookup tables, only touched under the write lock
+        self._type_ids: Dict[str, int] = {}
+        self._extension_ids: Dict[str, int] = {}
+        
         self.init_database()
+        for _ in range(READ_POOL_SIZE):
+            self._readers.put(self._connect())
         logger.info(f"Local cache service initialized with database: {self.db_path}")
     
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection to the cache database with tuned PRAGMAs"""
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        for pragma in _CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+    
+    @contextmanager
+    def _checkout(self):
+        """Borrow a pooled read connection for the duration of a query"""
+        conn = self._readers.get()
+        try:
+            with conn:
+                yield conn
+        finally:
+            self._readers.put(conn)
+    
+    @contextmanager
+    def _writer(self):
+        """Use the shared write connection, one thread at a time"""
+        with self._write_lock:
+            with self._write_conn:
+                yield self._write_conn
+    
+    def close(self):
+        """Close the pooled connections"""
+        with self._write_lock:
+            self._write_conn.close()
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+    
     def init_database(self):
         """Initialize SQLite database with required tables"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._writer() as conn:
+                # Before the WAL switch, which materializes a new database
+                self._enable_incremental_vacuum(conn)
+                
+                for pragma in _DATABASE_PRAGMAS:
+                    conn.execute(pragma)
+                
+                # Dictionary tables for the low-cardinality file columns; ids
+                # are never reused, so they can be cached for the process life
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS file_types (
+                        id INTEGER PRIMARY KEY,
+                        name TEXT UNIQUE NOT NULL
+                    )
+                """)
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS extensions (
+                        id INTEGER PRIMARY KEY,
+                        name TEXT UNIQUE NOT NULL
+                    )
+                """)
+                
                 conn.execute("""
                     CREATE TABLE IF NOT EXISTS files (
                         id TEXT PRIMARY KEY,
@@ -41,23 +320,34 @@ class LocalCacheService:
                         path_display TEXT NOT NULL,
                         name TEXT NOT NULL,
                         parent_path TEXT,
-                        is_folder BOOLEAN NOT NULL DEFAULT 0,
-                        file_type TEXT,
-                        file_extension TEXT,
+                        file_type_id INTEGER REFERENCES file_types(id),
+                        extension_id INTEGER REFERENCES extensions(id),
                         size INTEGER DEFAULT 0,
-                        modified_date TEXT,
+                        modified_ts INTEGER NOT NULL,
                         content_hash TEXT,
                         is_downloadable BOOLEAN DEFAULT 1,
                         last_synced TEXT NOT NULL,
-                        created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+                        created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                        server_modified_ts INTEGER
                     )
                 """)
                 
+                self._drop_is_folder(conn)
+                self._migrate_modified_date(conn)
+                self._encode_file_types(conn)
+                self._add_server_modified(conn)
+                
+                # path_lower is already indexed by its UNIQUE constraint, and
+                # the single-column parent/type indexes are prefixes of the
+                # composite ones
+                conn.execute("DROP INDEX IF EXISTS idx_path_lower")
+                conn.execute("DROP INDEX IF EXISTS idx_parent_path")
+                conn.execute("DROP INDEX IF EXISTS idx_file_type")
+                
                 # Create indexes for faster queries
-                conn.execute("CREATE INDEX IF NOT EXISTS idx_path_lower ON files(path_lower)")
-                conn.execute("CREATE INDEX IF NOT EXISTS idx_parent_path ON files(parent_path)")
-                conn.execute("CREATE INDEX IF NOT EXISTS idx_file_type ON files(file_type)")
-                conn.execute("CREATE INDEX IF NOT EXISTS idx_modified_date ON files(modified_date)")
+                self._create_indexes(conn)
+                
+                self._create_type_counts(conn)
                 
                 # Metadata table for tracking sync state
                 conn.execute("""
@@ -68,6 +358,26 @@ class LocalCacheService:
                     )
                 """)
                 
+                # Direct shared links by path_lower; a link is stable for the
+                # life of the file, so it outlives process restarts
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS shared_links (
+                        path TEXT PRIMARY KEY,
+                        url TEXT NOT NULL,
+                        created_at REAL NOT NULL
+                    ) WITHOUT ROWID
+                """)
+                
+                # Single-row table holding the list_folder cursor, so it is
+                # committed together with the files it describes
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS sync_state (
+                        id INTEGER PRIMARY KEY CHECK (id = 1),
+                        cursor TEXT NOT NULL,
+                        last_sync TEXT NOT NULL
+                    )
+                """)
+                
                 conn.commit()
                 logger.info("Database tables initialized successfully")
                 
@@ -75,75 +385,360 @@ class LocalCacheService:
             logger.error(f"Error initializing database: {e}")
             raise
     
-    def store_files(self, files: List[DropboxFile], is_full_sync: bool = False) -> int:
+    def _create_type_counts(self, conn: sqlite3.Connection):
+        """
+        Create the per-type file counts kept up to date by triggers on files
+        
+        get_cache_stats reads these instead of counting the whole table. A
+        cache that predates the table is counted once when it is created.
+        """
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'file_type_counts'"
+        ).fetchone()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS file_type_counts (
+                file_type_id INTEGER PRIMARY KEY,
+                cnt INTEGER NOT NULL
+            )
+        """)
+        if not exists:
+            conn.execute("""
+                INSERT INTO file_type_counts (file_type_id, cnt)
+                SELECT file_type_id, COUNT(*) FROM files
+                WHERE file_type_id IS NOT NULL
+                GROUP BY file_type_id
+            """)
+        
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS files_count_insert AFTER INSERT ON files
+            BEGIN
+                INSERT INTO file_type_counts (file_type_id, cnt) VALUES (NEW.file_type_id, 1)
+                ON CONFLICT(file_type_id) DO UPDATE SET cnt = cnt + 1;
+            END
+        """)
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS files_count_delete AFTER DELETE ON files
+            BEGIN
+                UPDATE file_type_counts SET cnt = cnt - 1 WHERE file_type_id = OLD.file_type_id;
+            END
+        """)
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS files_count_update AFTER UPDATE OF file_type_id ON files
+            WHEN OLD.file_type_id IS NOT NEW.file_type_id
+            BEGIN
+                UPDATE file_type_counts SET cnt = cnt - 1 WHERE file_type_id = OLD.file_type_id;
+                INSERT INTO file_type_counts (file_type_id, cnt) VALUES (NEW.file_type_id, 1)
+                ON CONFLICT(file_type_id) DO UPDATE SET cnt = cnt + 1;
+            END
+        """)
+    
+    def _enable_incremental_vacuum(self, conn: sqlite3.Connection):
+        """
+        Switch the database to incremental auto-vacuum
+        
+        Sync churn leaves free pages behind that SQLite otherwise never
+        returns to the filesystem. The mode can be set freely on a new
+        database; an existing one needs a VACUUM to convert, done once.
+        """
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            return
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        if conn.execute("PRAGMA page_count").fetchone()[0] > 0:
+            conn.execute("VACUUM")
+            logger.info("Converted cache database to incremental auto-vacuum")
+    
+    def _drop_is_folder(self, conn: sqlite3.Connection):
+        """
+        Drop the is_folder column from caches created before it was removed
+        
+        Only files are ever cached, so the column was always 0. The indexes
+        that mention it have to go first; they are recreated without it.
+        """
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(files)")]
+        if "is_folder" not in columns:
+            return
+        conn.execute("DROP INDEX IF EXISTS idx_folder_parent_pathdisp")
+        conn.execute("DROP INDEX IF EXISTS idx_type_pathdisp")
+        try:
+            conn.execute("ALTER TABLE files DROP COLUMN is_folder")
+            logger.info("Dropped unused is_folder column from cache")
+        except sqlite3.OperationalError as e:
+            # SQLite < 3.35; the column keeps its default and is ignored
+            logger.warning(f"Could not drop is_folder column: {e}")
+    
+    def _migrate_modified_date(self, conn: sqlite3.Connection):
+        """
+        Convert the ISO-8601 modified_date column of older caches to modified_ts
+        
+        Dropbox modification times have whole-second precision, so strftime
+        converts them exactly without a round trip through Python.
+        """
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(files)")]
+        if "modified_date" not in columns:
+            return
+        if "modified_ts" not in columns:
+            conn.execute("ALTER TABLE files ADD COLUMN modified_ts INTEGER NOT NULL DEFAULT 0")
+        conn.execute("""
+            UPDATE files
+            SET modified_ts = CAST(strftime('%s', modified_date) AS INTEGER) * 1000000
+            WHERE modified_date IS NOT NULL
+        """)
+        conn.execute("DROP INDEX IF EXISTS idx_modified_date")
+        try:
+            conn.execute("ALTER TABLE files DROP COLUMN modified_date")
+            logger.info("Converted cached modification times to integer timestamps")
+        except sqlite3.OperationalError as e:
+            # SQLite < 3.35; the old column is left behind and ignored
+            logger.warning(f"Could not drop modified_date column: {e}")
+    
+    def _encode_file_types(self, conn: sqlite3.Connection):
+        """
+        Move the file_type and file_extension strings of older caches into
+        the lookup tables, replacing them with ids
+        
+        The type counts and every index on the old columns are dropped here,
+        since SQLite refuses to drop an indexed column, and rebuilt on the
+        ids afterwards. Only rows without ids are backfilled, so a rerun
+        after a failed column drop leaves rows synced since then intact.
+        """
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(files)")]
+        if "file_type" not in columns:
+            return
+        for trigger in ("files_count_insert", "files_count_delete", "files_count_update"):
+            conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        conn.execute("DROP TABLE IF EXISTS file_type_counts")
+        self._drop_indexes_on(conn, ("file_type", "file_extension"))
+        
+        if "file_type_id" not in columns:
+            conn.execute("ALTER TABLE files ADD COLUMN file_type_id INTEGER REFERENCES file_types(id)")
+            conn.execute("ALTER TABLE files ADD COLUMN extension_id INTEGER REFERENCES extensions(id)")
+        conn.execute("""
+            INSERT OR IGNORE INTO file_types (name)
+            SELECT DISTINCT file_type FROM files WHERE file_type IS NOT NULL
+        """)
+        conn.execute("""
+            INSERT OR IGNORE INTO extensions (name)
+            SELECT DISTINCT file_extension FROM files WHERE file_extension IS NOT NULL
+        """)
+        conn.execute("""
+            UPDATE files SET
+                file_type_id = (SELECT id FROM file_types WHERE name = files.file_type),
+                extension_id = (SELECT id FROM extensions WHERE name = files.file_extension)
+            WHERE file_type_id IS NULL
+        """)
+        try:
+            conn.execute("ALTER TABLE files DROP COLUMN file_type")
+            conn.execute("ALTER TABLE files DROP COLUMN file_extension")
+            logger.info("Moved cached file types and extensions into lookup tables")
+        except sqlite3.OperationalError as e:
+            # SQLite < 3.35; the old columns are left behind and ignored
+            logger.warning(f"Could not drop file_type columns: {e}")
+    
+    def _add_server_modified(self, conn: sqlite3.Connection):
+        """
+        Add the server_modified_ts column to caches created before it existed
+        
+        Existing rows only get a value when a sync next rewrites them, so the
+        processing scan watermark is cleared: the next scan checks every file
+        against its stored content hash instead of trusting change times.
+        """
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(files)")]
+        if "server_modified_ts" in columns:
+            return
+        conn.execute("ALTER TABLE files ADD COLUMN server_modified_ts INTEGER")
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sync_metadata'").fetchone():
+            conn.execute("DELETE FROM sync_metadata WHERE key = 'last_scan'")
+        logger.info("Added server modification times to cache")
+    
+    def _drop_indexes_on(self, conn: sqlite3.Connection, columns: tuple):
+        """Drop every explicit index on files that covers any of the given columns"""
+        indexes = conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'files' AND sql IS NOT NULL"
+        ).fetchall()
+        for (name,) in indexes:
+            if any(row[2] in columns for row in conn.execute(f"PRAGMA index_info({name})")):
+                conn.execute(f"DROP INDEX {name}")
+    
+    def _create_indexes(self, conn: sqlite3.Connection):
+        """Create any missing secondary index on files"""
+        for name, columns in _SECONDARY_INDEXES.items():
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON files({columns})")
+    
+    def _lookup_id(self, cursor: sqlite3.Cursor, table: str, ids: Dict[str, int], name: str) -> int:
+        """Id of a name in a lookup table, adding it on first use"""
+        value_id = ids.get(name)
+        if value_id is None:
+            cursor.execute(f"INSERT OR IGNORE INTO {table} (name) VALUES (?)", (name,))
+            value_id = cursor.execute(f"SELECT id FROM {table} WHERE name = ?", (name,)).fetchone()[0]
+            ids[name] = value_id
+        return value_id
+    
+    def begin_full_sync(self) -> bool:
+        """
+        Start recording the paths of a full sync, forgetting any earlier unfinished one
+        
+        On an empty cache the secondary indexes are dropped for the bulk load;
+        the batch that saves the sync cursor rebuilds them. Otherwise any left
+        missing by an interrupted load are rebuilt here.
+        """
+        try:
+            with self._writer() as conn:
+                conn.execute(_SQL_CREATE_SEEN)
+                conn.execute("DELETE FROM temp.full_sync_seen")
+                if conn.execute("SELECT 1 FROM files LIMIT 1").fetchone() is None:
+                    for name in _SECONDARY_INDEXES:
+                        conn.execute(f"DROP INDEX IF EXISTS {name}")
+                    logger.info("Dropped secondary indexes for the initial bulk load")
+                else:
+                    self._create_indexes(conn)
+                conn.commit()
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error starting full sync: {e}")
+            return False
+    
+    def store_files(self, files: List[DropboxFile], is_full_sync: bool = False, sync_cursor: str = None,
+                    prune_unseen: bool = False) -> int:
         """
         Store/update files in local cache
         
         Args:
             files: List of DropboxFile objects
-            is_full_sync: If True, this is a complete sync (not incremental)
+            is_full_sync: If True, this is a complete sync (not incremental);
+                the stored paths are recorded as seen by it
+            sync_cursor: Optional Dropbox cursor to save in the same transaction, so
+                the cursor can never get ahead of the cached files
+            prune_unseen: With is_full_sync, also delete every cached file not
+                stored since begin_full_sync, in the same transaction
             
         Returns:
             Number of files stored/updated
         """
         try:
-            stored_count = 0
             current_time = datetime.now().isoformat()
             
-            with sqlite3.connect(self.db_path) as conn:
+            with self._writer() as conn:
                 cursor = conn.cursor()
                 
-                for file in files:
-                    # Determine parent path
-                    parent_path = str(Path(file.path_display).parent) if file.path_display != "/" else None
-                    if parent_path == "/":
-                        parent_path = None
-                    
-                    # Insert or update file
-                    cursor.execute("""
-                        INSERT OR REPLACE INTO files (
-                            id, path_lower, path_display, name, parent_path,
-                            is_folder, file_type, file_extension, size, 
-                            modified_date, content_hash, is_downloadable, last_synced
-                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    """, (
+                # Take the write lock up front rather than on the first insert
+                cursor.execute("BEGIN IMMEDIATE")
+                
+                # Bind every row up front so the inserts run as one executemany;
+                # unseen types and extensions are added in this transaction
+                lookup_id = self._lookup_id
+                rows = [
+                    (
                         file.id,
                         file.path_lower,
                         file.path_display,
                         file.name,
-                        parent_path,
-                        False,  # We only store files, not folders in this implementation
-                        file.file_type,
-                        file.extension,
+                        lookup_id(cursor, "file_types", self._type_ids, file.file_type),
+                        lookup_id(cursor, "extensions", self._extension_ids, file.extension),
                         file.size,
-                        file.modified.isoformat(),
+                        _to_micros(file.modified),
                         file.content_hash,
                         file.is_downloadable,
-                        current_time
-                    ))
-                    stored_count += 1
+                        current_time,
+                        _to_micros(file.server_modified) if file.server_modified else None
+                    )
+                    for file in files
+                ]
+                
+                # Insert or update files
+                cursor.executemany(_SQL_DELETE_MOVED, [(row[0], row[1]) for row in rows])
+                cursor.executemany(_SQL_UPSERT_FILE, rows)
+                stored_count = len(rows)
+                
+                if is_full_sync:
+                    cursor.execute(_SQL_CREATE_SEEN)
+                    cursor.executemany(_SQL_MARK_SEEN, [(row[1],) for row in rows])
+                    if prune_unseen:
+                        cursor.execute(_SQL_PRUNE_UNSEEN)
+                        pruned = cursor.rowcount
+                        cursor.execute(_SQL_PRUNE_LINKS)
+                        cursor.execute("DELETE FROM temp.full_sync_seen")
+                        logger.info(f"Pruned {pruned} files no longer in Dropbox")
+                    if sync_cursor is not None:
+                        self._create_indexes(conn)
                 
                 # Update sync metadata
-                cursor.execute("""
-                    INSERT OR REPLACE INTO sync_metadata (key, value, updated_at)
-                    VALUES (?, ?, ?)
-                """, ("last_sync", current_time, current_time))
+                cursor.execute(_SQL_SET_METADATA, ("last_sync", current_time, current_time))
                 
                 if is_full_sync:
-                    cursor.execute("""
-                        INSERT OR REPLACE INTO sync_metadata (key, value, updated_at)
-                        VALUES (?, ?, ?)
-                    """, ("last_full_sync", current_time, current_time))
+                    cursor.execute(_SQL_SET_METADATA, ("last_full_sync", current_time, current_time))
+                
+                if sync_cursor is not None:
+                    self._write_cursor(conn, sync_cursor, current_time)
                 
                 conn.commit()
                 
+                # Refresh planner statistics when the table has changed enough
+                # to matter; a no-op otherwise, unlike a plain ANALYZE
+                cursor.execute("PRAGMA optimize")
+                
             logger.info(f"Stored {stored_count} files in local cache")
             return stored_count
             
         except Exception as e:
+            # Ids added by the rolled-back transaction no longer exist
+            self._type_ids.clear()
+            self._extension_ids.clear()
             logger.error(f"Error storing files in cache: {e}")
             return 0
     
+    def iter_files(self, folder_path: str = None, file_types: List[str] = None) -> Iterator[DropboxFile]:
+        """
+        Stream files from local cache, FETCH_BATCH rows in memory at a time
+        
+        A pooled read connection is held until the iterator is exhausted or
+        closed. Errors propagate to the caller.
+        
+        Args:
+            folder_path: Optional folder to filter by
+            file_types: Optional list of file types to filter by
+            
+        Yields:
+            DropboxFile objects ordered by path
+        """
+        # Build query
+        query = _SQL_SELECT_FILES
+        conditions = []
+        params = []
+        
+        if folder_path:
+            if folder_path == "/":
+                conditions.append("(parent_path IS NULL OR parent_path = '')")
+            else:
+                # Prefix match as a range, so idx_parent_pathdisp is
+                # seeked instead of scanned (LIKE is case-insensitive
+                # and can't use the BINARY index)
+                conditions.append("parent_path >= ? AND parent_path < ?")
+                params.extend([folder_path, folder_path + _MAX_CHAR])
+        
+        with self._checkout() as conn:
+            if file_types:
+                # Resolve the names first so the planner sees plain ids and
+                # can seek idx_type_pathdisp
+                placeholders = ",".join("?" * len(file_types))
+                type_ids = [row[0] for row in conn.execute(
+                    f"SELECT id FROM file_types WHERE name IN ({placeholders})", file_types
+                )]
+                if not type_ids:
+                    return
+                conditions.append(f"file_type_id IN ({','.join('?' * len(type_ids))})")
+                params.extend(type_ids)
+            
+            if conditions:
+                query += " WHERE " + " AND ".join(conditions)
+            query += " ORDER BY path_display"
+            
+            cursor = conn.cursor()
+            cursor.row_factory = _row_to_file
+            cursor.execute(query, params)
+            while rows := cursor.fetchmany(FETCH_BATCH):
+                yield from rows
+    
     def get_files(self, folder_path: str = None, file_types: List[str] = None) -> List[DropboxFile]:
         """
         Get files from local cache (instant, no API calls)
@@ -156,55 +751,11 @@ class LocalCacheService:
             List of DropboxFile objects from cache
         """
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
-                cursor = conn.cursor()
-                
-                # Build query
-                query = "SELECT * FROM files WHERE is_folder = 0"
-                params = []
-                
-                if folder_path:
-                    if folder_path == "/":
-                        query += " AND (parent_path IS NULL OR parent_path = '')"
-                    else:
-                        query += " AND parent_path LIKE ?"
-                        params.append(f"{folder_path}%")
-                
-                if file_types:
-                    placeholders = ",".join("?" * len(file_types))
-                    query += f" AND file_type IN ({placeholders})"
-                    params.extend(file_types)
-                
-                query += " ORDER BY path_display"
-                
-                cursor.execute(query, params)
-                rows = cursor.fetchall()
-                
-                # Convert to DropboxFile objects
-                files = []
-                for row in rows:
-                    try:
-                        file = DropboxFile(
-                            id=row["id"],
-                            name=row["name"],
-                            path_lower=row["path_lower"],
-                            path_display=row["path_display"],
-                            size=row["size"],
-                            modified=datetime.fromisoformat(row["modified_date"]),
-                            content_hash=row["content_hash"],
-                            is_downloadable=bool(row["is_downloadable"]),
-                            file_type=row["file_type"],
-                            extension=row["file_extension"]
-                        )
-                        files.append(file)
-                    except Exception as e:
-                        logger.warning(f"Error converting cached row to DropboxFile: {e}")
-                        continue
-                
-                logger.info(f"Retrieved {len(files)} files from cache")
-                return files
-                
+            files = list(self.iter_files(folder_path, file_types))
+            
+            logger.info(f"Retrieved {len(files)} files from cache")
+            return files
+            
         except Exception as e:
             logger.error(f"Error getting files from cache: {e}")
             return []
@@ -212,32 +763,13 @@ class LocalCacheService:
     def get_file_by_path(self, path: str) -> Optional[DropboxFile]:
         """Get a specific file by path from cache"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
+            with self._checkout() as conn:
                 cursor = conn.cursor()
+                cursor.row_factory = _row_to_file
                 
-                cursor.execute("""
-                    SELECT * FROM files 
-                    WHERE path_lower = ? OR path_display = ?
-                    LIMIT 1
-                """, (path.lower(), path))
-                
-                row = cursor.fetchone()
-                if not row:
-                    return None
-                
-                return DropboxFile(
-                    id=row["id"],
-                    name=row["name"],
-                    path_lower=row["path_lower"],
-                    path_display=row["path_display"],
-                    size=row["size"],
-                    modified=datetime.fromisoformat(row["modified_date"]),
-                    content_hash=row["content_hash"],
-                    is_downloadable=bool(row["is_downloadable"]),
-                    file_type=row["file_type"],
-                    extension=row["file_extension"]
-                )
+                cursor.execute(_SQL_GET_BY_PATH, (path.lower(),))
+                
+                return cursor.fetchone()
                 
         except Exception as e:
             logger.error(f"Error getting file by path from cache: {e}")
@@ -246,37 +778,13 @@ class LocalCacheService:
     def get_files_modified_after(self, after_date: datetime) -> List[DropboxFile]:
         """Get files modified after a specific date from cache"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
+            with self._checkout() as conn:
                 cursor = conn.cursor()
+                cursor.row_factory = _row_to_file
                 
-                cursor.execute("""
-                    SELECT * FROM files 
-                    WHERE is_folder = 0 AND modified_date > ?
-                    ORDER BY modified_date DESC
-                """, (after_date.isoformat(),))
-                
-                rows = cursor.fetchall()
-                
-                files = []
-                for row in rows:
-                    try:
-                        file = DropboxFile(
-                            id=row["id"],
-                            name=row["name"],
-                            path_lower=row["path_lower"],
-                            path_display=row["path_display"],
-                            size=row["size"],
-                            modified=datetime.fromisoformat(row["modified_date"]),
-                            content_hash=row["content_hash"],
-                            is_downloadable=bool(row["is_downloadable"]),
-                            file_type=row["file_type"],
-                            extension=row["file_extension"]
-                        )
-                        files.append(file)
-                    except Exception as e:
-                        logger.warning(f"Error converting cached row: {e}")
-                        continue
+                cursor.execute(_SQL_MODIFIED_AFTER, (_to_micros(after_date),))
+                
+                files = cursor.fetchall()
                 
                 logger.info(f"Found {len(files)} files modified after {after_date}")
                 return files
@@ -285,44 +793,202 @@ class LocalCacheService:
             logger.error(f"Error getting modified files from cache: {e}")
             return []
     
+    def get_files_changed_after(self, after: datetime) -> Optional[List[DropboxFile]]:
+        """
+        Get files whose Dropbox server_modified time is after a point in time
+        
+        Returns:
+            Matching files, or None if the cache could not be read
+        """
+        try:
+            with self._checkout() as conn:
+                cursor = conn.cursor()
+                cursor.row_factory = _row_to_file
+                cursor.execute(_SQL_CHANGED_AFTER, (_to_micros(after),))
+                files = cursor.fetchall()
+            
+            logger.info(f"Found {len(files)} files changed after {after}")
+            return files
+            
+        except Exception as e:
+            logger.error(f"Error getting changed files from cache: {e}")
+            return None
+    
     def remove_file(self, path: str) -> bool:
         """Remove a file from cache (for deletions)"""
+        return self.remove_files([path]) > 0
+    
+    def remove_files(self, paths: List[str]) -> int:
+        """
+        Remove several files from cache in one transaction
+        
+        Args:
+            paths: Dropbox paths of the deleted files
+            
+        Returns:
+            Number of rows removed
+        """
+        if not paths:
+            return 0
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            params = [(path.lower(),) for path in paths]
+            
+            with self._writer() as conn:
                 cursor = conn.cursor()
-                cursor.execute("""
-                    DELETE FROM files 
-                    WHERE path_lower = ? OR path_display = ?
-                """, (path.lower(), path))
+                cursor.execute("BEGIN IMMEDIATE")
+                cursor.executemany(_SQL_DELETE_FILE, params)
+                removed = cursor.rowcount
+                cursor.executemany(_SQL_DELETE_LINK, params)
+                conn.commit()
                 
-                if cursor.rowcount > 0:
-                    conn.commit()
-                    logger.info(f"Removed file from cache: {path}")
-                    return True
-                return False
+            if removed > 0:
+                logger.info(f"Removed {removed} files from cache")
+            return removed
+            
+        except Exception as e:
+            logger.error(f"Error removing files from cache: {e}")
+            return 0
+    
+    def remove_trees(self, paths: List[str]) -> int:
+        """
+        Remove deleted paths from cache in one transaction
+        
+        Dropbox reports a deleted folder as a single entry, so each path also
+        removes every row below it. For a plain file only the equality
+        branch matches.
+        
+        Args:
+            paths: Dropbox paths of deleted files or folders
+            
+        Returns:
+            Number of rows removed
+        """
+        if not paths:
+            return 0
+        try:
+            # The range form uses the path_lower index and needs no LIKE escaping
+            params = [(p, p + "/", p + "0") for p in (path.lower() for path in paths)]
+            
+            with self._writer() as conn:
+                cursor = conn.cursor()
+                cursor.executemany(_SQL_DELETE_TREE, params)
+                removed = cursor.rowcount
+                cursor.executemany(_SQL_DELETE_LINK_TREE, params)
+                conn.commit()
                 
+            logger.info(f"Removed {removed} cached files under {len(paths)} deleted paths")
+            return removed
+            
+        except Exception as e:
+            logger.error(f"Error removing files from cache: {e}")
+            return 0
+    
+    def get_shared_link(self, path: str, max_age: float = None) -> Optional[str]:
+        """
+        Get a persisted shared link for a path
+        
+        Args:
+            path: Dropbox path of the file
+            max_age: Ignore links stored more than this many seconds ago
+            
+        Returns:
+            The direct link, or None if there is no usable one
+        """
+        try:
+            with self._checkout() as conn:
+                row = conn.execute(_SQL_GET_LINK, (path.lower(),)).fetchone()
+            if row is None:
+                return None
+            if max_age is not None and time.time() - row[1] > max_age:
+                return None
+            return row[0]
+            
+        except Exception as e:
+            logger.error(f"Error getting shared link from cache: {e}")
+            return None
+    
+    def set_shared_link(self, path: str, url: str) -> bool:
+        """Persist the shared link for a path"""
+        try:
+            with self._writer() as conn:
+                conn.execute(_SQL_SET_LINK, (path.lower(), url, time.time()))
+                conn.commit()
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error storing shared link in cache: {e}")
+            return False
+    
+    def _write_cursor(self, conn: sqlite3.Connection, cursor: str, last_sync: str):
+        """Upsert the single cursor row on an open connection"""
+        conn.execute(_SQL_SET_CURSOR, (cursor, last_sync))
+    
+    def set_cursor(self, cursor: str, last_sync: datetime = None) -> bool:
+        """Save the sync cursor for the next incremental sync"""
+        try:
+            with self._writer() as conn:
+                self._write_cursor(conn, cursor, (last_sync or datetime.now()).isoformat())
+                conn.commit()
+            return True
+            
         except Exception as e:
-            logger.error(f"Error removing file from cache: {e}")
+            logger.error(f"Error saving sync cursor: {e}")
+            return False
+    
+    def get_cursor(self) -> Optional[Dict[str, str]]:
+        """Get the saved sync cursor as {'cursor', 'last_sync'}, or None if there is none"""
+        try:
+            with self._checkout() as conn:
+                row = conn.execute(_SQL_GET_CURSOR).fetchone()
+            if row is None:
+                return None
+            return {"cursor": row[0], "last_sync": row[1]}
+            
+        except Exception as e:
+            logger.error(f"Error loading sync cursor: {e}")
+            return None
+    
+    def get_last_scan_timestamp(self) -> Optional[datetime]:
+        """Get when the last complete processing scan started (naive UTC), or None if there has been none"""
+        try:
+            with self._checkout() as conn:
+                row = conn.execute(_SQL_GET_METADATA, ("last_scan",)).fetchone()
+            return datetime.fromisoformat(row[0]) if row else None
+            
+        except Exception as e:
+            logger.error(f"Error loading last scan timestamp: {e}")
+            return None
+    
+    def set_last_scan_timestamp(self, ts: datetime) -> bool:
+        """Save the start time (naive UTC) of a complete processing scan"""
+        try:
+            with self._writer() as conn:
+                conn.execute(_SQL_SET_METADATA, ("last_scan", ts.isoformat(), datetime.now().isoformat()))
+                conn.commit()
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error saving last scan timestamp: {e}")
             return False
     
     def get_cache_stats(self) -> Dict[str, Any]:
         """Get statistics about the local cache"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._checkout() as conn:
                 cursor = conn.cursor()
                 
-                # Total files
-                cursor.execute("SELECT COUNT(*) FROM files WHERE is_folder = 0")
-                total_files = cursor.fetchone()[0]
+                # One read transaction, so counts, sync times and size all
+                # come from the same snapshot
+                cursor.execute("BEGIN")
                 
-                # Files by type
+                # Files by type, from the trigger-maintained counts
                 cursor.execute("""
-                    SELECT file_type, COUNT(*) 
-                    FROM files 
-                    WHERE is_folder = 0 
-                    GROUP BY file_type
+                    SELECT file_types.name, cnt FROM file_type_counts
+                    JOIN file_types ON file_types.id = file_type_id
+                    WHERE cnt > 0
                 """)
                 by_type = dict(cursor.fetchall())
+                total_files = sum(by_type.values())
                 
                 # Last sync info
                 cursor.execute("""
@@ -332,8 +998,10 @@ class LocalCacheService:
                 """)
                 sync_info = dict(cursor.fetchall())
                 
-                # Database size
-                db_size = os.path.getsize(self.db_path) if os.path.exists(self.db_path) else 0
+                # Database size as SQLite sees it, including pages still in
+                # the WAL, which the file size on disk would miss
+                cursor.execute("SELECT page_count * page_size FROM pragma_page_count(), pragma_page_size()")
+                db_size = cursor.fetchone()[0]
                 
                 return {
                     "total_files": total_files,
@@ -355,9 +1023,12 @@ class LocalCacheService:
     def clear_cache(self) -> bool:
         """Clear all cached data (use with caution)"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._writer() as conn:
                 conn.execute("DELETE FROM files")
+                conn.execute("DELETE FROM file_type_counts")
                 conn.execute("DELETE FROM sync_metadata")
+                conn.execute("DELETE FROM sync_state")
+                conn.execute("DELETE FROM shared_links")
                 conn.commit()
                 
             logger.info("Cache cleared successfully")
@@ -367,14 +1038,34 @@ class LocalCacheService:
             logger.error(f"Error clearing cache: {e}")
             return False
     
+    def maintenance(self) -> bool:
+        """
+        Reclaim free pages, truncate the WAL and refresh planner statistics
+        
+        Meant to run periodically, away from syncs; each step is cheap when
+        there is nothing to do.
+        """
+        try:
+            with self._writer() as conn:
+                # executescript steps the pragma to completion; execute() would
+                # stop after the first freed page
+                conn.executescript(f"PRAGMA incremental_vacuum({VACUUM_PAGES});")
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+                conn.execute("PRAGMA optimize")
+                
+            logger.info("Cache maintenance completed")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error during cache maintenance: {e}")
+            return False
+    
     def is_cache_empty(self) -> bool:
         """Check if cache is empty (needs initial sync)"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT COUNT(*) FROM files")
-                count = cursor.fetchone()[0]
-                return count == 0
+            # Stops at the first row instead of counting the table
+            with self._checkout() as conn:
+                return conn.execute("SELECT 1 FROM files LIMIT 1").fetchone() is None
                 
         except Exception as e:
             logger.error(f"Error checking if cache is empty: {e}")
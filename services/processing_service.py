@@ -1,9 +1,10 @@
 import asyncio
 import logging
-from typing import List, Optional, Dict, Any
-from datetime import datetime
+from typing import List, Optional, Dict, Any, Tuple, AsyncIterator
+from datetime import datetime, timezone
 import time
 import os
+import threading
 
 from models import DropboxFile, ProcessedFile, ProcessingStatus
 from services.dropbox_service import DropboxService
@@ -16,6 +17,25 @@ from config import config
 
 logger = logging.getLogger(__name__)
 
+# Bounded hand-off between pipeline stages; workers per stage come from
+# config.BATCH_SIZE
+PIPELINE_QUEUE_SIZE = 32
+
+# Files per Weaviate query when checking which files are already stored
+LOOKUP_BATCH_SIZE = 100
+
+# Most processed files written to Weaviate in one batch request
+STORE_BATCH_SIZE = PIPELINE_QUEUE_SIZE
+
+async def _as_pages(files: List[DropboxFile]) -> AsyncIterator[List[DropboxFile]]:
+    """Present an in-memory file list as pages for _process_pages"""
+    for start in range(0, len(files), LOOKUP_BATCH_SIZE):
+        yield files[start:start + LOOKUP_BATCH_SIZE]
+
+def _weaviate_date(dt: datetime) -> str:
+    """Format a datetime the way WeaviateService.store_file stores it"""
+    return dt.replace(microsecond=0).isoformat() + "Z"
+
 class ProcessingService:
     def __init__(self):
         self.dropbox_service = DropboxService()
@@ -34,7 +54,11 @@ class ProcessingService:
         self.weaviate_service = WeaviateService()
         self.video_service = VideoService()
         
-        # Processing state
+        # Processing state. Fields that change per file are plain attributes
+        # that writers only mark dirty; the ProcessingStatus snapshot is
+        # rebuilt when it is next read. Readers include get_stats in worker
+        # threads, so the rebuild is serialized by a lock
+        self._status_lock = threading.Lock()
         self.current_status = ProcessingStatus(
             status="idle",
             files_processed=0,
@@ -46,8 +70,116 @@ class ProcessingService:
         self.pause_event.set()  # Initially not paused
         self.stop_requested = False  # Add missing stop_requested attribute
         
+        # Each backend gets its own concurrency limit rather than sharing the
+        # pipeline's worker count; Replicate and Azure adapt theirs internally
+        self.dropbox_sem = asyncio.Semaphore(config.DROPBOX_CONCURRENCY)
+        self.clip_sem = asyncio.Semaphore(config.CLIP_CONCURRENCY)
+        self.weaviate_sem = asyncio.Semaphore(config.WEAVIATE_CONCURRENCY)
+        
+        # Stats blocks that are fixed for the life of the process, and the
+        # status summary cached against the snapshot it was built from
+        self._config_stats = {
+            "batch_size": config.BATCH_SIZE,
+            "supported_image_types": list(config.SUPPORTED_IMAGE_TYPES),
+            "supported_video_types": list(config.SUPPORTED_VIDEO_TYPES),
+            "use_thumbnails": config.USE_THUMBNAILS,
+            "thumbnail_size": config.THUMBNAIL_SIZE,
+            "video_frame_interval": config.VIDEO_FRAME_INTERVAL,
+            "max_frames_per_video": config.MAX_FRAMES_PER_VIDEO,
+            "video_analysis_enabled": config.VIDEO_ANALYSIS_ENABLED,
+            "extract_video_thumbnail": config.EXTRACT_VIDEO_THUMBNAIL
+        }
+        self._optimization_stats = {
+            "thumbnail_processing": config.USE_THUMBNAILS,
+            "video_preview": config.USE_VIDEO_PREVIEWS,
+            "duplicate_detection": config.SKIP_DUPLICATE_FILES,
+            "content_hash_tracking": config.TRACK_CONTENT_HASH,
+            "local_cache_enabled": True
+        }
+        self._last_processing: Tuple[Optional[ProcessingStatus], Dict[str, Any]] = (None, {})
+        
+        # How each file type picks the copy it is analyzed from, resolved
+        # once from config rather than re-checked for every file
+        self._processing_url_handlers = {}
+        if config.USE_THUMBNAILS:
+            self._processing_url_handlers["image"] = self._image_thumbnail_url
+        if config.USE_VIDEO_PREVIEWS:
+            self._processing_url_handlers["video"] = self._video_processing_url
+        
         logger.info("Processing service initialized")
     
+    @property
+    def current_status(self) -> ProcessingStatus:
+        """
+        Snapshot of the current run, assembled from the run state on read
+        
+        ProcessingStatus is immutable, so readers (status endpoints, the
+        dashboard) always get a consistent object. It is rebuilt only when
+        the state has changed since the last read, so per-file writes stay
+        O(1) and repeated polls share one snapshot. The dirty flag is
+        cleared before the rebuild, so a write that lands during it is
+        picked up by the next read.
+        """
+        with self._status_lock:
+            if self._status_dirty:
+                self._status_dirty = False
+                self._status_snapshot = self._status_base.model_copy(update={
+                    "files_processed": self._files_processed,
+                    "files_total": self._files_total,
+                    "current_file": self._current_file,
+                    "errors": list(self._errors)
+                })
+            return self._status_snapshot
+    
+    @current_status.setter
+    def current_status(self, status: ProcessingStatus):
+        self._status_base = status
+        self._files_processed = status.files_processed
+        self._files_total = status.files_total
+        self._current_file = status.current_file
+        self._errors = list(status.errors)
+        self._status_dirty = True
+    
+    def _update_status(self, **changes) -> ProcessingStatus:
+        """
+        Replace the run state with the given fields changed
+        
+        Used for run-level changes (status, start and end times); the
+        per-file counters have their own helpers below, which skip building
+        a snapshot. Writers run on the event loop, so updates never
+        interleave.
+        """
+        self.current_status = self.current_status.model_copy(update=changes)
+        return self.current_status
+    
+    def _add_processed(self, count: int):
+        """Advance files_processed"""
+        self._files_processed += count
+        self._status_dirty = True
+    
+    def _add_total(self, count: int):
+        """Advance files_total, for runs that discover files as they go"""
+        self._files_total += count
+        self._status_dirty = True
+    
+    def _set_current_file(self, name: str):
+        """Record the file being worked on"""
+        self._current_file = name
+        self._status_dirty = True
+    
+    def _record_error(self, error_msg: str):
+        """Append an error message to the current run"""
+        self._errors.append(error_msg)
+        self._status_dirty = True
+    
+    def mark_failed(self, error_msg: str) -> ProcessingStatus:
+        """Mark the current run as failed, recording the error"""
+        return self._update_status(
+            status="failed",
+            end_time=datetime.now(),
+            errors=self.current_status.errors + [error_msg]
+        )
+    
     async def smart_process(self) -> ProcessingStatus:
         """
         Smart processing - only processes changed files since last sync
@@ -69,50 +201,42 @@ class ProcessingService:
                 logger.info("Starting smart incremental processing...")
                 
                 # Get only changed files since last sync
-                dropbox_files, new_cursor = self.dropbox_service.get_incremental_changes()
+                dropbox_files, new_cursor = await asyncio.to_thread(self.dropbox_service.get_incremental_changes)
                 
                 if not dropbox_files:
                     logger.info("No changes found - processing complete")
-                    self.current_status.status = "completed"
-                    self.current_status.end_time = datetime.now()
+                    self._update_status(status="completed", end_time=datetime.now())
                     return self.current_status
                 
                 # Process only the changed files
                 logger.info(f"Processing {len(dropbox_files)} changed files")
-                self.current_status.files_total = len(dropbox_files)
-                
-                # Process files in batches
-                batch_size = config.BATCH_SIZE
-                for i in range(0, len(dropbox_files), batch_size):
-                    if self.stop_requested:
-                        logger.info("Processing stopped by user request")
-                        self.current_status.status = "stopped"
-                        break
-                        
-                    batch = dropbox_files[i:i + batch_size]
-                    batch_processed = await self._process_batch(batch)
-                    
-                    # Only count actually processed files (not skipped ones)
-                    self.current_status.files_processed += batch_processed
-                    logger.info(f"Smart processing progress: {self.current_status.files_processed}/{self.current_status.files_total}")
+                self._update_status(files_total=len(dropbox_files))
+                
+                # Only actually processed files are counted (not skipped ones)
+                await self._process_files(dropbox_files)
                 
                 # Mark as completed if not stopped
-                if not self.stop_requested:
-                    self.current_status.status = "completed"
+                if self.stop_requested:
+                    logger.info("Processing stopped by user request")
+                    self._update_status(status="stopped")
+                else:
+                    self._update_status(status="completed")
                     logger.info(f"Smart processing completed successfully: {self.current_status.files_processed} files processed")
                 
-                self.current_status.end_time = datetime.now()
+                self._update_status(end_time=datetime.now())
                 return self.current_status
                 
             except Exception as e:
                 logger.error(f"Error in smart processing: {e}", exc_info=True)
-                self.current_status.status = "failed"
-                self.current_status.errors.append(f"Smart processing failed: {str(e)}")
-                self.current_status.end_time = datetime.now()
-                return self.current_status
+                return self.mark_failed(f"Smart processing failed: {str(e)}")
     
     async def process_all_files(self) -> ProcessingStatus:
-        """Process all files in Dropbox - WARNING: This fetches ALL files and should be used sparingly"""
+        """
+        Process all files in Dropbox - WARNING: This fetches ALL files and should be used sparingly
+        
+        After a complete, error-free run only files modified since that run
+        started are fetched, so repeat runs cost O(changes) rather than O(files).
+        """
         async with self.processing_lock:
             try:
                 # Reset stop flag when starting new processing
@@ -126,30 +250,54 @@ class ProcessingService:
                     errors=[]
                 )
                 
-                logger.warning("Starting FULL file processing - this will fetch ALL files from Dropbox!")
-                
-                # Get all files from Dropbox (expensive operation)
-                dropbox_files = self.dropbox_service.list_files()
-                self.current_status.files_total = len(dropbox_files)
+                # Dropbox modified times are naive UTC
+                scan_started = datetime.now(timezone.utc).replace(tzinfo=None)
+                last_scan = self.dropbox_service.cache.get_last_scan_timestamp()
                 
-                logger.info(f"Found {len(dropbox_files)} files to process")
+                # Compared on server_modified, since a file uploaded or copied
+                # in can carry a client time from before the last scan. If
+                # the changes can't be read, every file is checked instead.
+                # The cache is synced first: a change it hasn't seen yet is
+                # older than scan_started and would be skipped for good once
+                # the watermark moves past it
+                dropbox_files = None
+                if last_scan:
+                    logger.info(f"Processing files changed since the last complete scan at {last_scan}")
+                    try:
+                        await asyncio.to_thread(self.dropbox_service.sync_changes)
+                        dropbox_files = await asyncio.to_thread(self.dropbox_service.get_files_changed_after, last_scan)
+                    except Exception as e:
+                        logger.warning(f"Could not sync the cache, falling back to a full scan: {e}")
                 
-                # Process files in batches
-                batch_size = config.BATCH_SIZE
-                for i in range(0, len(dropbox_files), batch_size):
-                    # Check for pause before each batch
-                    await self.pause_event.wait()
+                if dropbox_files is not None:
+                    self._update_status(files_total=len(dropbox_files))
                     
-                    # Check if processing was stopped
-                    if self.stop_requested or self.current_status.status == "stopped":
-                        logger.info("Processing stopped by user")
-                        break
-                        
-                    batch = dropbox_files[i:i + batch_size]
-                    await self._process_batch(batch)
+                    logger.info(f"Found {len(dropbox_files)} files to process")
+                    
+                    await self._process_files(dropbox_files)
+                else:
+                    logger.warning("Starting FULL file processing - this will fetch ALL files from Dropbox!")
+                    
+                    # A full scan checks every file, so pull every stored hash in
+                    # a few paged reads rather than one lookup per chunk of files
+                    existing_records = None
+                    if config.SKIP_DUPLICATE_FILES:
+                        async with self.weaviate_sem:
+                            existing_records = await asyncio.to_thread(self.weaviate_service.get_all_path_hash_map)
+                    
+                    # Files are processed as listing pages arrive rather than
+                    # after the whole folder tree has been listed
+                    await self._process_pages(self.dropbox_service.iter_file_pages(), existing_records, count_total=True)
+                    
+                    logger.info(f"Listed {self.current_status.files_total} files in the full scan")
+                if self.stop_requested:
+                    logger.info("Processing stopped by user")
+                elif not self._errors:
+                    # Failed files must be retried, so only a clean run moves
+                    # the watermark
+                    self.dropbox_service.cache.set_last_scan_timestamp(scan_started)
                 
-                self.current_status.status = "completed"
-                self.current_status.end_time = datetime.now()
+                self._update_status(status="completed", end_time=datetime.now())
                 
                 logger.info(f"Processing completed. Processed {self.current_status.files_processed}/{self.current_status.files_total} files")
                 
@@ -157,10 +305,7 @@ class ProcessingService:
                 
             except Exception as e:
                 logger.error(f"Error in process_all_files: {e}")
-                self.current_status.status = "failed"
-                self.current_status.end_time = datetime.now()
-                self.current_status.errors.append(str(e))
-                return self.current_status
+                return self.mark_failed(str(e))
     
     async def process_new_files(self, after_date: datetime) -> ProcessingStatus:
         """Process files modified after a specific date - DEPRECATED: Use smart_process instead"""
@@ -181,27 +326,16 @@ class ProcessingService:
                 logger.info(f"Processing files modified after {after_date}")
                 
                 # Get files modified after the specified date
-                dropbox_files = self.dropbox_service.get_files_modified_after(after_date)
-                self.current_status.files_total = len(dropbox_files)
+                dropbox_files = await asyncio.to_thread(self.dropbox_service.get_files_modified_after, after_date)
+                self._update_status(files_total=len(dropbox_files))
                 
                 logger.info(f"Found {len(dropbox_files)} new/modified files to process")
                 
-                # Process files in batches
-                batch_size = config.BATCH_SIZE
-                for i in range(0, len(dropbox_files), batch_size):
-                    # Check for pause before each batch
-                    await self.pause_event.wait()
-                    
-                    # Check if processing was stopped
-                    if self.stop_requested or self.current_status.status == "stopped":
-                        logger.info("Processing stopped by user")
-                        break
-                        
-                    batch = dropbox_files[i:i + batch_size]
-                    await self._process_batch(batch)
+                await self._process_files(dropbox_files)
+                if self.stop_requested:
+                    logger.info("Processing stopped by user")
                 
-                self.current_status.status = "completed"
-                self.current_status.end_time = datetime.now()
+                self._update_status(status="completed", end_time=datetime.now())
                 
                 logger.info(f"New file processing completed. Processed {self.current_status.files_processed}/{self.current_status.files_total} files")
                 
@@ -209,10 +343,7 @@ class ProcessingService:
                 
             except Exception as e:
                 logger.error(f"Error in process_new_files: {e}")
-                self.current_status.status = "failed"
-                self.current_status.end_time = datetime.now()
-                self.current_status.errors.append(str(e))
-                return self.current_status
+                return self.mark_failed(str(e))
     
     async def process_images_only(self) -> ProcessingStatus:
         """Process only image files from cache"""
@@ -232,28 +363,16 @@ class ProcessingService:
                 logger.info("Starting image-only processing from cache")
                 
                 # Get only image files from cache
-                cached_files = self.dropbox_service.cache.get_files()
-                image_files = [f for f in cached_files if f.file_type == "image"]
-                self.current_status.files_total = len(image_files)
+                image_files = self.dropbox_service.cache.get_files(file_types=["image"])
+                self._update_status(files_total=len(image_files))
                 
                 logger.info(f"Found {len(image_files)} image files to process")
                 
-                # Process files in batches
-                batch_size = config.BATCH_SIZE
-                for i in range(0, len(image_files), batch_size):
-                    # Check for pause before each batch
-                    await self.pause_event.wait()
-                    
-                    # Check if processing was stopped
-                    if self.stop_requested or self.current_status.status == "stopped":
-                        logger.info("Processing stopped by user")
-                        break
-                        
-                    batch = image_files[i:i + batch_size]
-                    await self._process_batch(batch)
+                await self._process_files(image_files)
+                if self.stop_requested:
+                    logger.info("Processing stopped by user")
                 
-                self.current_status.status = "completed"
-                self.current_status.end_time = datetime.now()
+                self._update_status(status="completed", end_time=datetime.now())
                 
                 logger.info(f"Image processing completed. Processed {self.current_status.files_processed}/{self.current_status.files_total} images")
                 
@@ -261,10 +380,7 @@ class ProcessingService:
                 
             except Exception as e:
                 logger.error(f"Error in process_images_only: {e}")
-                self.current_status.status = "failed"
-                self.current_status.end_time = datetime.now()
-                self.current_status.errors.append(str(e))
-                return self.current_status
+                return self.mark_failed(str(e))
 
     async def process_videos_only(self) -> ProcessingStatus:
         """Process only video files from cache"""
@@ -284,28 +400,16 @@ class ProcessingService:
                 logger.info("Starting video-only processing from cache")
                 
                 # Get only video files from cache
-                cached_files = self.dropbox_service.cache.get_files()
-                video_files = [f for f in cached_files if f.file_type == "video"]
-                self.current_status.files_total = len(video_files)
+                video_files = self.dropbox_service.cache.get_files(file_types=["video"])
+                self._update_status(files_total=len(video_files))
                 
                 logger.info(f"Found {len(video_files)} video files to process")
                 
-                # Process files in batches
-                batch_size = config.BATCH_SIZE
-                for i in range(0, len(video_files), batch_size):
-                    # Check for pause before each batch
-                    await self.pause_event.wait()
-                    
-                    # Check if processing was stopped
-                    if self.stop_requested or self.current_status.status == "stopped":
-                        logger.info("Processing stopped by user")
-                        break
-                        
-                    batch = video_files[i:i + batch_size]
-                    await self._process_batch(batch)
+                await self._process_files(video_files)
+                if self.stop_requested:
+                    logger.info("Processing stopped by user")
                 
-                self.current_status.status = "completed"
-                self.current_status.end_time = datetime.now()
+                self._update_status(status="completed", end_time=datetime.now())
                 
                 logger.info(f"Video processing completed. Processed {self.current_status.files_processed}/{self.current_status.files_total} videos")
                 
@@ -313,257 +417,457 @@ class ProcessingService:
                 
             except Exception as e:
                 logger.error(f"Error in process_videos_only: {e}")
-                self.current_status.status = "failed"
-                self.current_status.end_time = datetime.now()
-                self.current_status.errors.append(str(e))
-                return self.current_status
+                return self.mark_failed(str(e))
     
-    async def _process_batch(self, files: List[DropboxFile]) -> int:
-        """Process a batch of files and return count of successfully processed files"""
-        tasks = [self._process_single_file(file) for file in files]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+    async def _process_files(self, files: List[DropboxFile],
+                             existing_records: Optional[Dict[str, Dict[str, Any]]] = None) -> int:
+        """Process a list of files and return count of successfully processed files"""
+        workers = min(config.BATCH_SIZE, len(files)) or 1
+        return await self._process_pages(_as_pages(files), existing_records, workers=workers)
+    
+    async def _process_pages(self, pages: AsyncIterator[List[DropboxFile]],
+                             existing_records: Optional[Dict[str, Dict[str, Any]]] = None,
+                             count_total: bool = False, workers: Optional[int] = None) -> int:
+        """
+        Process files arriving page by page and return count of successfully processed files
         
+        Files flow through three stages - prepare (duplicate check and
+        download), analyze (caption and CLIP embedding) and store (Weaviate) -
+        each with its own pool of config.BATCH_SIZE workers, linked by
+        bounded queues. Downloads of
+        later files overlap with AI calls and writes for earlier ones, and
+        the queue bounds keep a fast stage from running far ahead. Existing
+        Weaviate records are fetched ahead of the prepare stage, one query
+        per LOOKUP_BATCH_SIZE files, instead of a lookup per file, and the
+        store stage is a single writer sending batch requests. Callers that
+        already hold every stored record (existing_records, keyed by path)
+        skip those lookups entirely.
+        
+        The whole run is one continuous pipeline rather than fixed batches,
+        so a slow file only holds up its own worker, and files_processed is
+        advanced as each file is stored. Pause and stop take effect before
+        the next file is started. Work starts on the first page while later
+        ones are still being listed; with count_total, files_total grows as
+        pages arrive.
+        """
+        workers = workers or max(config.BATCH_SIZE, 1)
+        lookup_queue: asyncio.Queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        prepared_queue: asyncio.Queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        analyzed_queue: asyncio.Queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
         processed_count = 0
-        for i, result in enumerate(results):
-            if isinstance(result, Exception):
-                error_msg = f"Error processing {files[i].name}: {result}"
-                logger.error(error_msg)
-                self.current_status.errors.append(error_msg)
-                # Don't count failed files
-            elif result is not None:
-                # File was successfully processed (not skipped)
-                processed_count += 1
-            else:
-                # File was skipped (duplicate, etc.) - don't count
-                logger.debug(f"File {files[i].name} was skipped")
-                
-        logger.info(f"Batch completed. Processed {processed_count}/{len(files)} files in batch")
+        total_count = 0
+        preparers_left = workers
+        analyzers_left = workers
+        # With records looked up for every file, a missing record means the
+        # file is new, so the store stage needs no second lookup for ids.
+        # Paths whose lookup failed are unresolved and looked up at store time
+        records_known = existing_records is not None or config.SKIP_DUPLICATE_FILES
+        unresolved = set()
+        
+        async def lookup_pages():
+            nonlocal total_count
+            try:
+                async for page in pages:
+                    total_count += len(page)
+                    if count_total:
+                        self._add_total(len(page))
+                    for start in range(0, len(page), LOOKUP_BATCH_SIZE):
+                        await self.pause_event.wait()
+                        if self.stop_requested:
+                            return
+                        chunk = page[start:start + LOOKUP_BATCH_SIZE]
+                        if existing_records is not None:
+                            existing = existing_records
+                        else:
+                            existing = await self._get_existing_records(chunk)
+                            if existing is None:
+                                existing = await self._get_existing_records(chunk)
+                            if existing is None:
+                                logger.warning(f"Stored records unavailable for {len(chunk)} files; they are processed and matched again at store time")
+                                unresolved.update(dropbox_file.path_display for dropbox_file in chunk)
+                                existing = {}
+                        for dropbox_file in chunk:
+                            await lookup_queue.put((dropbox_file, existing.get(dropbox_file.path_display)))
+            finally:
+                await pages.aclose()
+        
+        # Shutdown flows down the pipeline as sentinels: the last worker of
+        # each stage to finish signals the next stage
+        async def lookup_worker():
+            await lookup_pages()
+            for _ in range(workers):
+                await lookup_queue.put(None)
+        
+        async def prepare_worker():
+            nonlocal preparers_left
+            while (item := await lookup_queue.get()) is not None:
+                await self.pause_event.wait()
+                if self.stop_requested:
+                    # Keep draining so the lookup worker is never left blocked
+                    continue
+                dropbox_file, existing_file = item
+                prepared = await self._run_stage(self._prepare_file, dropbox_file, existing_file)
+                if prepared is not None:
+                    await prepared_queue.put((dropbox_file, existing_file, prepared))
+            preparers_left -= 1
+            if preparers_left == 0:
+                for _ in range(workers):
+                    await prepared_queue.put(None)
+        
+        async def analyze_worker():
+            nonlocal analyzers_left
+            while (item := await prepared_queue.get()) is not None:
+                dropbox_file, existing_file, prepared = item
+                processed_file = await self._run_stage(self._analyze_file, dropbox_file, prepared)
+                if processed_file is not None:
+                    await analyzed_queue.put((dropbox_file, existing_file, processed_file))
+            analyzers_left -= 1
+            if analyzers_left == 0:
+                await analyzed_queue.put(None)
+        
+        async def store_worker():
+            # A single writer takes everything already waiting, up to a full
+            # batch, so writes batch up under load without delaying a lone file
+            nonlocal processed_count
+            while True:
+                batch = []
+                item = await analyzed_queue.get()
+                while item is not None:
+                    batch.append(item)
+                    if len(batch) >= STORE_BATCH_SIZE or analyzed_queue.empty():
+                        break
+                    item = analyzed_queue.get_nowait()
+                if batch:
+                    existing_ids = None
+                    if records_known:
+                        existing_ids = {}
+                        for _, existing_file, processed_file in batch:
+                            if processed_file.dropbox_path in unresolved:
+                                unresolved.discard(processed_file.dropbox_path)
+                            else:
+                                existing_ids[processed_file.dropbox_path] = existing_file["id"] if existing_file else None
+                    stored = await self._store_files([(dropbox_file, processed_file) for dropbox_file, _, processed_file in batch], existing_ids)
+                    processed_count += stored
+                    self._add_processed(stored)
+                if item is None:
+                    return
+        
+        # The task group cancels every stage if any of them fails and does
+        # not return until all of them have finished
+        try:
+            async with asyncio.TaskGroup() as tg:
+                tg.create_task(lookup_worker())
+                for _ in range(workers):
+                    tg.create_task(prepare_worker())
+                    tg.create_task(analyze_worker())
+                tg.create_task(store_worker())
+        except ExceptionGroup as eg:
+            # Callers handle one exception; log the others rather than lose them
+            for error in eg.exceptions[1:]:
+                logger.error(f"Pipeline stage also failed: {error!r}", exc_info=error)
+            raise eg.exceptions[0]
+        
+        logger.info(f"Processed {processed_count}/{total_count} files")
         return processed_count
     
-    async def _process_single_file(self, dropbox_file: DropboxFile) -> Optional[ProcessedFile]:
-        """Process a single file"""
+    async def _run_stage(self, stage, dropbox_file: DropboxFile, *args):
+        """Run one pipeline stage for a file, recording any failure; None means skipped or failed"""
         try:
-            self.current_status.current_file = dropbox_file.name
-            logger.info(f"Processing file: {dropbox_file.name}")
-            
-
-            
-            # Check if file already exists and hasn't changed
-            existing_file = self.weaviate_service.get_file_by_path(dropbox_file.path_display)
-            if existing_file and config.SKIP_DUPLICATE_FILES:
-                # Check if content hash is the same (file hasn't changed)
-                stored_hash = existing_file.get("content_hash")
-                if config.TRACK_CONTENT_HASH and stored_hash == dropbox_file.content_hash:
-                    logger.info(f"Skipping {dropbox_file.name} - already processed and unchanged")
-                    return None
-                else:
-                    logger.info(f"File {dropbox_file.name} has changed, reprocessing...")
-            
-            # Skip shared link creation - we serve files directly through our API
-            # This removes the Dropbox permission error and speeds up processing
-            public_url = None  # We use direct file serving instead
-            
-            # Get local file for processing (AI analysis needs local access)
-            local_processing_url = self.dropbox_service.get_local_file_url(dropbox_file.path_display)
-            if not local_processing_url:
-                logger.error(f"Could not download file for processing: {dropbox_file.name}")
+            return await stage(dropbox_file, *args)
+        except Exception as e:
+            error_msg = f"Error processing {dropbox_file.name}: {e}"
+            logger.error(error_msg, exc_info=True)
+            self._record_error(error_msg)
+            return None
+    
+    async def _get_existing_records(self, files: List[DropboxFile]) -> Optional[Dict[str, Dict[str, Any]]]:
+        """Fetch the stored Weaviate records for a chunk of files, keyed by path; None if the lookup failed"""
+        if not config.SKIP_DUPLICATE_FILES:
+            return {}
+        async with self.weaviate_sem:
+            return await asyncio.to_thread(
+                self.weaviate_service.get_files_by_paths,
+                [dropbox_file.path_display for dropbox_file in files]
+            )
+    
+    async def _process_single_file(self, dropbox_file: DropboxFile) -> Optional[ProcessedFile]:
+        """Process a single file through all three pipeline stages"""
+        existing = await self._get_existing_records([dropbox_file])
+        existing_file = existing.get(dropbox_file.path_display) if existing else None
+        prepared = await self._run_stage(self._prepare_file, dropbox_file, existing_file)
+        if prepared is None:
+            return None
+        processed_file = await self._run_stage(self._analyze_file, dropbox_file, prepared)
+        if processed_file is None:
+            return None
+        existing_ids = None
+        if config.SKIP_DUPLICATE_FILES and existing is not None:
+            existing_ids = {processed_file.dropbox_path: existing_file["id"] if existing_file else None}
+        if not await self._store_files([(dropbox_file, processed_file)], existing_ids):
+            return None
+        return processed_file
+    
+    async def _prepare_file(self, dropbox_file: DropboxFile, existing_file: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Pipeline stage 1: skip unchanged files and fetch the local copy used for AI processing"""
+        self._set_current_file(dropbox_file.name)
+        logger.info(f"Processing file: {dropbox_file.name}")
+        
+        # Check if file already exists and hasn't changed
+        if existing_file and config.SKIP_DUPLICATE_FILES:
+            # Check if content hash is the same (file hasn't changed)
+            stored_hash = existing_file.get("content_hash")
+            if config.TRACK_CONTENT_HASH and stored_hash == dropbox_file.content_hash:
+                logger.info(f"Skipping {dropbox_file.name} - already processed and unchanged")
+                return None
+            elif not dropbox_file.content_hash and existing_file.get("modified_date") == _weaviate_date(dropbox_file.modified):
+                # Without a hash to compare, an unchanged modified time is the
+                # next best signal
+                logger.info(f"Skipping {dropbox_file.name} - already processed and not modified")
                 return None
-            
-            # Get optimized URLs based on file type and configuration
-            thumbnail_url = None  # We generate thumbnails on-demand through our API
-            processing_url = local_processing_url  # Use local URL for AI processing
-            
-            if dropbox_file.file_type == "image" and config.USE_THUMBNAILS:
-                # Use local thumbnail for processing to reduce bandwidth and improve speed
-                local_thumbnail = self.dropbox_service.get_local_thumbnail(
-                    dropbox_file.path_display, 
-                    config.THUMBNAIL_SIZE
-                )
-                processing_url = local_thumbnail or local_processing_url
-                # Thumbnail URL set to None - generated on-demand via /api/thumbnail/{file_id}
-                logger.info(f"Using {config.THUMBNAIL_SIZE} thumbnail for processing: {dropbox_file.name}")
-            elif dropbox_file.file_type == "video" and config.USE_VIDEO_PREVIEWS:
-                # Process full video file - thumbnails generated on-demand
-                processing_url = local_processing_url
-                logger.info(f"Processing video: {dropbox_file.name}")
             else:
-                # Use full-size file for processing
-                processing_url = local_processing_url
-                logger.info(f"Using full-size file for processing: {dropbox_file.name}")
+                logger.info(f"File {dropbox_file.name} has changed, reprocessing...")
+        
+        # Skip shared link creation - we serve files directly through our API
+        # This removes the Dropbox permission error and speeds up processing
+        public_url = None  # We use direct file serving instead
+        
+        # Get local file for processing (AI analysis needs local access)
+        async with self.dropbox_sem:
+            local_processing_url = await asyncio.to_thread(self.dropbox_service.get_local_file_url, dropbox_file.path_display)
+        if not local_processing_url:
+            logger.error(f"Could not download file for processing: {dropbox_file.name}")
+            return None
+        
+        # Get optimized URLs based on file type and configuration
+        thumbnail_url = None  # We generate thumbnails on-demand through our API
+        handler = self._processing_url_handlers.get(dropbox_file.file_type, self._full_size_url)
+        processing_url = await handler(dropbox_file, local_processing_url)
+        
+        return {
+            "public_url": public_url,
+            "thumbnail_url": thumbnail_url,
+            "processing_url": processing_url
+        }
+    
+    async def _image_thumbnail_url(self, dropbox_file: DropboxFile, local_processing_url: str) -> str:
+        """Use a local thumbnail for processing to reduce bandwidth and improve speed"""
+        async with self.dropbox_sem:
+            local_thumbnail = await asyncio.to_thread(
+                self.dropbox_service.get_local_thumbnail,
+                dropbox_file.path_display, 
+                config.THUMBNAIL_SIZE
+            )
+        # Thumbnail URL set to None - generated on-demand via /api/thumbnail/{file_id}
+        logger.info(f"Using {config.THUMBNAIL_SIZE} thumbnail for processing: {dropbox_file.name}")
+        return local_thumbnail or local_processing_url
+    
+    async def _video_processing_url(self, dropbox_file: DropboxFile, local_processing_url: str) -> str:
+        """Process the full video file - thumbnails are generated on-demand"""
+        logger.info(f"Processing video: {dropbox_file.name}")
+        return local_processing_url
+    
+    async def _full_size_url(self, dropbox_file: DropboxFile, local_processing_url: str) -> str:
+        """Use the full-size file for processing"""
+        logger.info(f"Using full-size file for processing: {dropbox_file.name}")
+        return local_processing_url
+    
+    async def _analyze_file(self, dropbox_file: DropboxFile, prepared: Dict[str, Any]) -> Optional[ProcessedFile]:
+        """Pipeline stage 2: caption and embed a prepared file"""
+        public_url = prepared["public_url"]
+        thumbnail_url = prepared["thumbnail_url"]
+        processing_url = prepared["processing_url"]
+        
+        # Generate caption and embedding
+        caption = None
+        tags = []
+        embedding = None
+        
+        if dropbox_file.file_type == "image":
+            # Caption and embedding both read the same image and don't depend
+            # on each other, so they run concurrently
+            (caption, tags), embedding = await asyncio.gather(
+                self._caption_image(dropbox_file, processing_url),
+                self._image_embedding(dropbox_file, processing_url)
+            )
+        elif dropbox_file.file_type == "video":
+            # Advanced video processing with frame extraction
+            logger.info(f"Starting advanced video analysis for: {dropbox_file.name}")
             
-            # Generate caption
-            caption = None
-            tags = []
+            # Extract frames from video for analysis
+            extracted_frames = await self.video_service.extract_frames_async(processing_url, dropbox_file.id)
             
-            if dropbox_file.file_type == "image":
-                # Generate caption using Azure Computer Vision or Replicate as fallback
+            if extracted_frames:
+                # Analyze extracted frames to generate comprehensive caption
                 if self.use_azure_vision and self.azure_vision_service:
                     try:
-                        # Use Azure Vision service with enhanced functionality
-                        caption, azure_tags = await self.azure_vision_service.generate_caption_with_tags(processing_url)
-                        tags = azure_tags  # Azure already provides good tags
-                        logger.info(f"Azure Vision - Caption generated for {dropbox_file.name}")
-                    except Exception as e:
-                        logger.warning(f"Azure Vision failed for {dropbox_file.name}: {e}. Falling back to Replicate")
-                        try:
-                            caption = await self.replicate_service.generate_caption_async(processing_url)
-                            tags = self.replicate_service.extract_tags_from_caption(caption) if caption else []
-                            logger.info(f"Replicate fallback successful for {dropbox_file.name}")
-                        except Exception as e2:
-                            logger.error(f"Both Azure and Replicate failed for {dropbox_file.name}: {e2}")
-                            caption = f"Image: {dropbox_file.name}"
-                            tags = ["image"]
-                else:
-                    # Fallback to Replicate service
-                    try:
-                        caption = await self.replicate_service.generate_caption_async(processing_url)
-                        tags = self.replicate_service.extract_tags_from_caption(caption) if caption else []
-                        logger.info(f"Replicate caption generated for {dropbox_file.name}")
+                        # Use Azure Vision for video frame analysis; the frame
+                        # captions it already made feed the tags
+                        caption, frame_captions = await self.azure_vision_service.analyze_video_frames_with_captions(extracted_frames)
+                        
+                        # Extract tags from video analysis using Azure Vision
+                        tags = self.azure_vision_service.extract_video_tags(caption, frame_captions)
+                        logger.info(f"Azure Vision video analysis - Caption: {caption}, Tags: {tags}")
                     except Exception as e:
-                        logger.error(f"Replicate failed for {dropbox_file.name}: {e}")
-                        caption = f"Image: {dropbox_file.name}"
-                        tags = ["image"]
-            elif dropbox_file.file_type == "video":
-                # Advanced video processing with frame extraction
-                logger.info(f"Starting advanced video analysis for: {dropbox_file.name}")
-                
-                # Extract frames from video for analysis
-                extracted_frames = await self.video_service.extract_frames_async(processing_url, dropbox_file.id)
-                
-                if extracted_frames:
-                    # Analyze extracted frames to generate comprehensive caption
-                    if self.use_azure_vision and self.azure_vision_service:
-                        try:
-                            # Use Azure Vision for video frame analysis
-                            caption = await self.azure_vision_service.analyze_video_frames(extracted_frames)
-                            
-                            # Extract tags from video analysis using Azure Vision
-                            frame_captions = []
-                            for frame_path in extracted_frames:
-                                try:
-                                    frame_filename = os.path.basename(frame_path)
-                                    frame_url = f"{config.SERVER_URL}/files/{frame_filename}"
-                                    frame_caption = await self.azure_vision_service.generate_caption_async(frame_url)
-                                    if frame_caption:
-                                        frame_captions.append(frame_caption)
-                                except:
-                                    continue
-                            
-                            tags = self.azure_vision_service.extract_video_tags(caption, frame_captions)
-                            logger.info(f"Azure Vision video analysis - Caption: {caption}, Tags: {tags}")
-                        except Exception as e:
-                            logger.warning(f"Azure Vision video analysis failed: {e}. Falling back to Replicate")
-                            # Fallback to Replicate
-                            caption = await self.replicate_service.analyze_video_frames(extracted_frames)
-                            frame_captions = []
-                            for frame_path in extracted_frames:
-                                try:
-                                    frame_filename = os.path.basename(frame_path)
-                                    frame_url = f"{config.SERVER_URL}/files/{frame_filename}"
-                                    frame_caption = await self.replicate_service.generate_caption_async(frame_url)
-                                    if frame_caption:
-                                        frame_captions.append(frame_caption)
-                                except:
-                                    continue
-                            tags = self.replicate_service.extract_video_tags(caption, frame_captions)
-                    else:
-                        # Use Replicate service as fallback
+                        logger.warning(f"Azure Vision video analysis failed: {e}. Falling back to Replicate")
+                        # Fallback to Replicate
                         caption = await self.replicate_service.analyze_video_frames(extracted_frames)
-                        frame_captions = []
-                        for frame_path in extracted_frames:
-                            try:
-                                frame_filename = os.path.basename(frame_path)
-                                frame_url = f"{config.SERVER_URL}/files/{frame_filename}"
-                                frame_caption = await self.replicate_service.generate_caption_async(frame_url)
-                                if frame_caption:
-                                    frame_captions.append(frame_caption)
-                            except:
-                                continue
+                        frame_captions = await self._caption_frames(extracted_frames)
                         tags = self.replicate_service.extract_video_tags(caption, frame_captions)
-                    
-                    # Clean up extracted frames after analysis
-                    self.video_service.cleanup_frames(extracted_frames)
-                    
-                    logger.info(f"Video analysis complete: {len(extracted_frames)} frames analyzed")
                 else:
-                    # Fallback to basic video processing if frame extraction fails
-                    logger.warning(f"Frame extraction failed for {dropbox_file.name}, using basic processing")
-                    caption = f"Video file: {dropbox_file.name}"
-                    tags = ["video"]
-                
-                # Extract video thumbnail if enabled
-                if config.EXTRACT_VIDEO_THUMBNAIL and not thumbnail_url:
-                    video_thumbnail = await self.video_service.extract_thumbnail_async(processing_url, dropbox_file.id)
-                    if video_thumbnail:
-                        # Convert to URL for serving
-                        thumbnail_filename = os.path.basename(video_thumbnail)
-                        thumbnail_url = f"{config.SERVER_URL}/files/{thumbnail_filename}"
-                        logger.info(f"Created video thumbnail: {thumbnail_filename}")
+                    # Use Replicate service as fallback
+                    caption = await self.replicate_service.analyze_video_frames(extracted_frames)
+                    frame_captions = await self._caption_frames(extracted_frames)
+                    tags = self.replicate_service.extract_video_tags(caption, frame_captions)
+                
+                # Clean up extracted frames after analysis
+                self.video_service.cleanup_frames(extracted_frames)
+                
+                logger.info(f"Video analysis complete: {len(extracted_frames)} frames analyzed")
+            else:
+                # Fallback to basic video processing if frame extraction fails
+                logger.warning(f"Frame extraction failed for {dropbox_file.name}, using basic processing")
+                caption = f"Video file: {dropbox_file.name}"
+                tags = ["video"]
             
-            # Generate embedding
-            embedding = None
-            if dropbox_file.file_type == "image":
-                # Get image embedding using CLIP with optimized image
-                embedding = await self.clip_service.get_image_embedding(processing_url)
-            elif caption:
-                # Get text embedding from caption (for videos, this uses the combined frame analysis)
+            # Extract video thumbnail if enabled
+            if config.EXTRACT_VIDEO_THUMBNAIL and not thumbnail_url:
+                video_thumbnail = await self.video_service.extract_thumbnail_async(processing_url, dropbox_file.id)
+                if video_thumbnail:
+                    # Convert to URL for serving
+                    thumbnail_filename = os.path.basename(video_thumbnail)
+                    thumbnail_url = f"{config.SERVER_URL}/files/{thumbnail_filename}"
+                    logger.info(f"Created video thumbnail: {thumbnail_filename}")
+        
+        # Generate embedding (images already have theirs)
+        if dropbox_file.file_type != "image" and caption:
+            # Get text embedding from caption (for videos, this uses the combined frame analysis)
+            async with self.clip_sem:
                 embedding = await self.clip_service.get_text_embedding(caption)
-            
-            if not embedding:
-                logger.warning(f"Could not generate embedding for {dropbox_file.name}")
-                # Use a default embedding or skip
-                return None
-            
-            # Create processed file object
-            processed_file = ProcessedFile(
-                id=dropbox_file.id,
-                dropbox_path=dropbox_file.path_display,
-                file_name=dropbox_file.name,
-                file_type=dropbox_file.file_type,
-                file_extension=dropbox_file.extension,
-                file_size=dropbox_file.size,
-                modified_date=dropbox_file.modified,
-                processed_date=datetime.now(),
-                embedding=embedding,
-                caption=caption,
-                tags=tags,
-                metadata={
-                    "content_hash": dropbox_file.content_hash,
-                    "path_lower": dropbox_file.path_lower,
-                    "processing_url": processing_url,  # Track what URL was used for processing
-                    "optimized": dropbox_file.file_type == "image"  # Track if we used optimization
-                },
-                public_url=public_url,
-                thumbnail_url=thumbnail_url
+        
+        if not embedding:
+            logger.warning(f"Could not generate embedding for {dropbox_file.name}")
+            # Use a default embedding or skip
+            return None
+        
+        # Create processed file object
+        processed_file = ProcessedFile(
+            id=dropbox_file.id,
+            dropbox_path=dropbox_file.path_display,
+            file_name=dropbox_file.name,
+            file_type=dropbox_file.file_type,
+            file_extension=dropbox_file.extension,
+            file_size=dropbox_file.size,
+            modified_date=dropbox_file.modified,
+            processed_date=datetime.now(),
+            embedding=embedding,
+            caption=caption,
+            tags=tags,
+            metadata={
+                "content_hash": dropbox_file.content_hash,
+                "path_lower": dropbox_file.path_lower,
+                "processing_url": processing_url,  # Track what URL was used for processing
+                "optimized": dropbox_file.file_type == "image"  # Track if we used optimization
+            },
+            public_url=public_url,
+            thumbnail_url=thumbnail_url
+        )
+        
+        return processed_file
+    
+    async def _caption_frames(self, frame_paths: List[str]) -> List[str]:
+        """Caption video frames with Replicate concurrently, under its adaptive limit, in frame order"""
+        frame_urls = [f"{config.SERVER_URL}/files/{os.path.basename(frame_path)}" for frame_path in frame_paths]
+        results = await asyncio.gather(
+            *(self.replicate_service.generate_caption_async(frame_url) for frame_url in frame_urls),
+            return_exceptions=True
+        )
+        return [result for result in results if result and not isinstance(result, BaseException)]
+    
+    async def _caption_image(self, dropbox_file: DropboxFile, processing_url: str) -> Tuple[Optional[str], List[str]]:
+        """Caption and tag an image using Azure Computer Vision, or Replicate as fallback"""
+        caption = None
+        tags = []
+        
+        if self.use_azure_vision and self.azure_vision_service:
+            try:
+                # Use Azure Vision service with enhanced functionality
+                # Single images keep the caption-derived tags; only per-frame
+                # video captions skip them
+                caption, azure_tags = await self.azure_vision_service.generate_caption_with_tags(processing_url, include_caption_tags=True)
+                tags = azure_tags  # Azure already provides good tags
+                logger.info(f"Azure Vision - Caption generated for {dropbox_file.name}")
+            except Exception as e:
+                logger.warning(f"Azure Vision failed for {dropbox_file.name}: {e}. Falling back to Replicate")
+                try:
+                    caption = await self.replicate_service.generate_caption_async(processing_url)
+                    tags = self.replicate_service.extract_tags_from_caption(caption) if caption else []
+                    logger.info(f"Replicate fallback successful for {dropbox_file.name}")
+                except Exception as e2:
+                    logger.error(f"Both Azure and Replicate failed for {dropbox_file.name}: {e2}")
+                    caption = f"Image: {dropbox_file.name}"
+                    tags = ["image"]
+        else:
+            # Fallback to Replicate service
+            try:
+                caption = await self.replicate_service.generate_caption_async(processing_url)
+                tags = self.replicate_service.extract_tags_from_caption(caption) if caption else []
+                logger.info(f"Replicate caption generated for {dropbox_file.name}")
+            except Exception as e:
+                logger.error(f"Replicate failed for {dropbox_file.name}: {e}")
+                caption = f"Image: {dropbox_file.name}"
+                tags = ["image"]
+        
+        return caption, tags
+    
+    async def _image_embedding(self, dropbox_file: DropboxFile, processing_url: str) -> Optional[List[float]]:
+        """Get an image embedding using CLIP with the optimized image"""
+        async with self.clip_sem:
+            return await self.clip_service.get_image_embedding_for_content(dropbox_file.content_hash, processing_url)
+    
+    async def _store_files(self, batch: List[Tuple[DropboxFile, ProcessedFile]],
+                           existing_ids: Optional[Dict[str, Optional[str]]] = None) -> int:
+        """
+        Pipeline stage 3: write processed files to Weaviate in one batch, returning how many were stored
+        
+        existing_ids maps paths the duplicate check already looked up to
+        their stored object id (None if new); Weaviate is queried for the
+        rest.
+        """
+        async with self.weaviate_sem:
+            outcome = await asyncio.to_thread(
+                self.weaviate_service.store_files,
+                [processed_file for _, processed_file in batch],
+                existing_ids
             )
-            
-            # Store in Weaviate
-            success = self.weaviate_service.store_file(processed_file)
-            
-            if success:
+        
+        stored = 0
+        for dropbox_file, processed_file in batch:
+            error = outcome.get(processed_file.dropbox_path)
+            if error is None:
                 logger.info(f"Successfully processed and stored: {dropbox_file.name}")
-                return processed_file
+                stored += 1
             else:
-                logger.error(f"Failed to store processed file: {dropbox_file.name}")
-                return None
-                
-        except Exception as e:
-            logger.error(f"Error processing file {dropbox_file.name}: {e}", exc_info=True)
-            # Add the error to the status for tracking
-            if hasattr(self, 'current_status') and self.current_status:
-                error_msg = f"Error processing {dropbox_file.name}: {str(e)}"
-                self.current_status.errors.append(error_msg)
-            return None
+                error_msg = f"Failed to store processed file {dropbox_file.name}: {error}"
+                logger.error(error_msg)
+                self._record_error(error_msg)
+        return stored
     
     async def search_files(self, query: str, limit: int = 10, file_types: Optional[List[str]] = None) -> List[Dict[str, Any]]:
         """Search files using both vector similarity and text search"""
         try:
             results = []
             
-            # Try vector search first (if query can be embedded)
-            query_embedding = await self.clip_service.get_text_embedding(query)
+            # Text search doesn't need the embedding, so it runs alongside
+            # the embedding and vector search
+            text_task = asyncio.create_task(asyncio.to_thread(self.weaviate_service.search_by_text, query, limit=limit))
+            
+            # Vector search (if query can be embedded). CLIP's tokenizer
+            # lowercases and collapses whitespace, so normalizing first lets
+            # case and spacing variants share a cached embedding
+            query_embedding = await self.clip_service.get_text_embedding(" ".join(query.lower().split()))
             if query_embedding:
-                vector_results = self.weaviate_service.search_similar(
+                vector_results = await asyncio.to_thread(
+                    self.weaviate_service.search_similar,
                     query_embedding, 
                     limit=limit, 
                     file_types=file_types
@@ -573,27 +877,23 @@ class ProcessingService:
                     "result": result
                 } for result in vector_results])
             
-            # Also try text search
-            text_results = self.weaviate_service.search_by_text(query, limit=limit)
+            text_results = await text_task
             results.extend([{
                 "source": "text",
                 "result": result
             } for result in text_results])
             
-            # Remove duplicates and sort by similarity score
-            seen_paths = set()
-            unique_results = []
+            # Keep the best-scoring hit per path, whichever search found it
+            best: Dict[str, Dict[str, Any]] = {}
             
             for item in results:
-                result = item["result"]
-                if result.dropbox_path not in seen_paths:
-                    seen_paths.add(result.dropbox_path)
-                    unique_results.append(item)
+                path = item["result"].dropbox_path
+                current = best.get(path)
+                if current is None or item["result"].similarity_score > current["result"].similarity_score:
+                    best[path] = item
             
             # Sort by similarity score (higher first)
-            unique_results.sort(key=lambda x: x["result"].similarity_score, reverse=True)
-            
-            return unique_results[:limit]
+            return sorted(best.values(), key=lambda x: x["result"].similarity_score, reverse=True)[:limit]
             
         except Exception as e:
             logger.error(f"Error searching files: {e}")
@@ -601,17 +901,18 @@ class ProcessingService:
     
     def get_processing_status(self) -> ProcessingStatus:
         """Get current processing status"""
+        status = self.current_status
         # Add pause state to status
-        if self.is_paused and self.current_status.status == "running":
-            self.current_status.status = "paused"
-        return self.current_status
+        if self.is_paused and status.status == "running":
+            return status.model_copy(update={"status": "paused"})
+        return status
     
     async def pause_processing(self) -> bool:
         """Pause the current processing"""
         if self.current_status.status in ["running", "paused"]:
             self.is_paused = True
             self.pause_event.clear()
-            self.current_status.status = "paused"
+            self._update_status(status="paused")
             logger.info("Processing paused")
             return True
         return False
@@ -621,7 +922,7 @@ class ProcessingService:
         if self.is_paused and self.current_status.status == "paused":
             self.is_paused = False
             self.pause_event.set()
-            self.current_status.status = "running"
+            self._update_status(status="running")
             logger.info("Processing resumed")
             return True
         return False
@@ -632,12 +933,36 @@ class ProcessingService:
             self.is_paused = False
             self.stop_requested = True  # Set the stop flag
             self.pause_event.set()
-            self.current_status.status = "stopped"
-            self.current_status.end_time = datetime.now()
+            self._update_status(status="stopped", end_time=datetime.now())
             logger.info("Processing stopped")
             return True
         return False
     
+    def _last_processing_stats(self) -> Dict[str, Any]:
+        """
+        Summary of the current status for get_stats
+        
+        Every status change publishes a new ProcessingStatus snapshot, so the
+        summary is rebuilt only when the snapshot has been swapped since the
+        last call; a polling dashboard otherwise gets the cached dict. The
+        pair is swapped in one assignment, since get_stats runs in worker
+        threads.
+        """
+        status = self.current_status
+        cached_for, summary = self._last_processing
+        if cached_for is not status:
+            summary = {
+                "status": status.status,
+                "files_processed": status.files_processed,
+                "files_total": status.files_total,
+                "start_time": status.start_time.isoformat() if status.start_time else None,
+                "end_time": status.end_time.isoformat() if status.end_time else None,
+                "errors": len(status.errors),
+                "current_file": status.current_file
+            }
+            self._last_processing = (status, summary)
+        return summary
+    
     def get_stats(self) -> Dict[str, Any]:
         """Get processing statistics - now includes local cache stats"""
         try:
@@ -667,33 +992,9 @@ class ProcessingService:
                 },
                 "local_cache": cache_stats,
                 "weaviate": weaviate_stats,
-                "config": {
-                    "batch_size": config.BATCH_SIZE,
-                    "supported_image_types": list(config.SUPPORTED_IMAGE_TYPES),
-                    "supported_video_types": list(config.SUPPORTED_VIDEO_TYPES),
-                    "use_thumbnails": config.USE_THUMBNAILS,
-                    "thumbnail_size": config.THUMBNAIL_SIZE,
-                    "video_frame_interval": config.VIDEO_FRAME_INTERVAL,
-                    "max_frames_per_video": config.MAX_FRAMES_PER_VIDEO,
-                    "video_analysis_enabled": config.VIDEO_ANALYSIS_ENABLED,
-                    "extract_video_thumbnail": config.EXTRACT_VIDEO_THUMBNAIL
-                },
-                "optimization": {
-                    "thumbnail_processing": config.USE_THUMBNAILS,
-                    "video_preview": config.USE_VIDEO_PREVIEWS,
-                    "duplicate_detection": config.SKIP_DUPLICATE_FILES,
-                    "content_hash_tracking": config.TRACK_CONTENT_HASH,
-                    "local_cache_enabled": True
-                },
-                "last_processing": {
-                    "status": self.current_status.status,
-                    "files_processed": self.current_status.files_processed,
-                    "files_total": self.current_status.files_total,
-                    "start_time": self.current_status.start_time.isoformat() if self.current_status.start_time else None,
-                    "end_time": self.current_status.end_time.isoformat() if self.current_status.end_time else None,
-                    "errors": len(self.current_status.errors),
-                    "current_file": self.current_status.current_file
-                }
+                "config": self._config_stats,
+                "optimization": self._optimization_stats,
+                "last_processing": self._last_processing_stats()
             }
             
             return stats
@@ -723,6 +1024,7 @@ class ProcessingService:
             await self.clip_service.close()
             if hasattr(self, 'azure_vision_service') and self.azure_vision_service:
                 await self.azure_vision_service.close()
+            await self.dropbox_service.close()
             logger.info("Processing service cleanup completed")
         except Exception as e:
             logger.error(f"Error during cleanup: {e}") 
\ No newline at end of file
@@ -1,4 +1,5 @@
 import replicate
+import httpx
 import logging
 from typing import Optional, List
 import asyncio
@@ -7,9 +8,21 @@ import os
 
 from config import config
 from models import CaptionRequest, CaptionResponse
+from services._concurrency import AdaptiveSemaphore
 
 logger = logging.getLogger(__name__)
 
+# Ceiling for the adaptive limit on concurrent predictions; it starts at
+# config.REPLICATE_CONCURRENCY
+REPLICATE_MAX_CONCURRENCY = 32
+REPLICATE_SUCCESSES_PER_INCREASE = 20
+
+def _limiter_status(error: Exception) -> Optional[int]:
+    """Status reported to the adaptive limiter for a failed prediction; timeouts count as throttling"""
+    if isinstance(error, (TimeoutError, httpx.TimeoutException)):
+        return 429
+    return getattr(error, "status", None)
+
 class ReplicateService:
     def __init__(self):
         if not config.REPLICATE_API_TOKEN:
@@ -21,6 +34,12 @@ class ReplicateService:
         # BLIP model for image captioning
         self.blip_model = "salesforce/blip:2e1dddc8621f72155f24cf2e0adbde548458d3cab9f00c0139eea840d0ac4746"
         
+        # Halves on rate limiting and creeps back up on success, so caption
+        # throughput tracks what the account is allowed instead of a fixed guess
+        self._limiter = AdaptiveSemaphore(
+            "Replicate", config.REPLICATE_CONCURRENCY, REPLICATE_MAX_CONCURRENCY, REPLICATE_SUCCESSES_PER_INCREASE
+        )
+        
         logger.info("Replicate service initialized successfully")
     
     def generate_caption(self, image_url: str, task: str = "image_captioning") -> Optional[str]:
@@ -35,45 +54,54 @@ class ReplicateService:
             Generated caption or None if failed
         """
         try:
-            logger.info(f"Generating caption for image: {image_url}")
-            
-            input_data = {
-                "image": image_url,
-                "task": task
-            }
-            
-            # Run the model
-            output = replicate.run(self.blip_model, input=input_data)
-            
-            if output and isinstance(output, str):
-                caption = output.strip()
-                logger.info(f"Generated caption: {caption}")
-                return caption
-            else:
-                logger.warning(f"Unexpected output format from BLIP model: {output}")
-                return None
-                
+            return self._predict_caption(image_url, task)
         except Exception as e:
             logger.error(f"Error generating caption for {image_url}: {e}")
             return None
     
+    def _predict_caption(self, image_url: str, task: str) -> Optional[str]:
+        """Run the BLIP model, letting API errors propagate"""
+        logger.info(f"Generating caption for image: {image_url}")
+        
+        input_data = {
+            "image": image_url,
+            "task": task
+        }
+        
+        # Run the model
+        output = replicate.run(self.blip_model, input=input_data)
+        
+        if output and isinstance(output, str):
+            caption = output.strip()
+            logger.info(f"Generated caption: {caption}")
+            return caption
+        else:
+            logger.warning(f"Unexpected output format from BLIP model: {output}")
+            return None
+    
     async def generate_caption_async(self, image_url: str, task: str = "image_captioning") -> Optional[str]:
         """
-        Async version of generate_caption
+        Async version of generate_caption, under the adaptive concurrency limit
         """
+        await self._limiter.acquire()
+        status_code = None
         try:
             # Run in thread pool to avoid blocking
             loop = asyncio.get_event_loop()
             result = await loop.run_in_executor(
                 None,
-                self.generate_caption,
+                self._predict_caption,
                 image_url,
                 task
             )
+            status_code = 200
             return result
         except Exception as e:
-            logger.error(f"Error in async caption generation: {e}")
+            status_code = _limiter_status(e)
+            logger.error(f"Error in async caption generation for {image_url}: {e}")
             return None
+        finally:
+            await self._limiter.release(status_code)
     
     def generate_video_caption(self, video_url: str) -> Optional[str]:
         """
@@ -1,5 +1,6 @@
 import weaviate
 import logging
+import threading
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 import json
@@ -9,8 +10,15 @@ from models import ProcessedFile, SearchRequest, SearchResult, SearchResponse
 
 logger = logging.getLogger(__name__)
 
+# Objects per page when scrolling through the whole collection
+SCROLL_PAGE_SIZE = 1000
+
 class WeaviateService:
     def __init__(self):
+        # The client's batch is a single shared buffer, so bulk writes from
+        # different threads must not interleave
+        self._batch_lock = threading.Lock()
+        
         try:
             # Initialize Weaviate client
             if config.WEAVIATE_API_KEY and config.WEAVIATE_API_KEY.strip():
@@ -165,23 +173,7 @@ class WeaviateService:
             True if successful, False otherwise
         """
         try:
-            # Prepare data object
-            data_object = {
-                "dropbox_id": processed_file.id,
-                "dropbox_path": processed_file.dropbox_path,
-                "file_name": processed_file.file_name,
-                "file_type": processed_file.file_type,
-                "file_extension": processed_file.file_extension,
-                "file_size": processed_file.file_size,
-                "modified_date": processed_file.modified_date.replace(microsecond=0).isoformat() + "Z",
-                "processed_date": processed_file.processed_date.replace(microsecond=0).isoformat() + "Z",
-                "caption": processed_file.caption,
-                "tags": processed_file.tags,
-                "public_url": processed_file.public_url,
-                "thumbnail_url": processed_file.thumbnail_url,
-                "content_hash": processed_file.metadata.get("content_hash", processed_file.id),  # Store actual content hash
-                "metadata": processed_file.metadata
-            }
+            data_object = self._to_data_object(processed_file)
             
             # Check if file already exists by path
             existing = self.get_file_by_path(processed_file.dropbox_path)
@@ -210,6 +202,85 @@ class WeaviateService:
             logger.error(f"Error storing file {processed_file.file_name}: {e}")
             return False
     
+    def store_files(self, processed_files: List[ProcessedFile],
+                    existing_ids: Optional[Dict[str, Optional[str]]] = None) -> Dict[str, Optional[str]]:
+        """
+        Store several processed files in one Weaviate batch request
+        
+        Files already stored under the same path keep their object id and
+        are replaced; the rest are created.
+        
+        Args:
+            processed_files: ProcessedFile objects with all metadata and embeddings
+            existing_ids: Stored object id (or None if new) for paths the
+                caller already looked up; the rest are fetched here
+            
+        Returns:
+            Dictionary of dropbox_path to None if stored, or the error message
+        """
+        if not processed_files:
+            return {}
+        
+        try:
+            existing_ids = dict(existing_ids or {})
+            unknown = [f.dropbox_path for f in processed_files if f.dropbox_path not in existing_ids]
+            if unknown:
+                existing = self.get_files_by_paths(unknown)
+                if existing is None:
+                    # Writing without the ids would duplicate stored files
+                    raise RuntimeError("could not look up existing objects")
+                for path in unknown:
+                    existing_ids[path] = existing[path]["id"] if path in existing else None
+            outcome = {}
+            paths_by_id = {}
+            
+            with self._batch_lock:
+                for processed_file in processed_files:
+                    object_id = self.client.batch.add_data_object(
+                        self._to_data_object(processed_file),
+                        "DropboxFile",
+                        uuid=existing_ids.get(processed_file.dropbox_path) or None,
+                        vector=processed_file.embedding
+                    )
+                    paths_by_id[object_id] = processed_file.dropbox_path
+                    outcome[processed_file.dropbox_path] = None
+                results = self.client.batch.create_objects()
+            
+            # Map per-object failures back to their paths
+            for result in results or []:
+                errors = result.get("result", {}).get("errors")
+                if errors:
+                    path = paths_by_id.get(result.get("id"))
+                    messages = [error.get("message", "") for error in errors.get("error", [])]
+                    outcome[path] = "; ".join(messages) or str(errors)
+            
+            stored = sum(1 for error in outcome.values() if error is None)
+            logger.info(f"Stored {stored}/{len(processed_files)} files in one batch")
+            return outcome
+            
+        except Exception as e:
+            logger.error(f"Error storing batch of {len(processed_files)} files: {e}")
+            return {processed_file.dropbox_path: str(e) for processed_file in processed_files}
+    
+    def _to_data_object(self, processed_file: ProcessedFile) -> Dict[str, Any]:
+        """Build the Weaviate properties for a processed file"""
+        return {
+            "dropbox_id": processed_file.id,
+            "dropbox_path": processed_file.dropbox_path,
+            "file_name": processed_file.file_name,
+            "file_type": processed_file.file_type,
+            "file_extension": processed_file.file_extension,
+            "file_size": processed_file.file_size,
+            "modified_date": processed_file.modified_date.replace(microsecond=0).isoformat() + "Z",
+            "processed_date": processed_file.processed_date.replace(microsecond=0).isoformat() + "Z",
+            "caption": processed_file.caption,
+            "tags": processed_file.tags,
+            "public_url": processed_file.public_url,
+            "thumbnail_url": processed_file.thumbnail_url,
+            "content_hash": processed_file.metadata.get("content_hash", processed_file.id),  # Store actual content hash
+            "metadata": processed_file.metadata
+        }
+    
     def get_file_by_path(self, path: str) -> Optional[Dict[str, Any]]:
         """Get file by Dropbox path"""
         try:
@@ -238,6 +309,114 @@ class WeaviateService:
             logger.error(f"Error getting file by path {path}: {e}")
             return None
 
+    def get_files_by_paths(self, paths: List[str]) -> Optional[Dict[str, Dict[str, Any]]]:
+        """
+        Get stored files for many Dropbox paths, one query per page of matches
+        
+        Equal matches on tokens, and a path may already have duplicate
+        objects, so a query can match more objects than paths; results are
+        paged until exhausted and only exact matches are kept.
+        
+        Args:
+            paths: Dropbox display paths to look up
+            
+        Returns:
+            Dictionary of path to file data (same shape as get_file_by_path),
+            where paths with no stored file are absent, or None if the lookup
+            failed
+        """
+        if not paths:
+            return {}
+        
+        try:
+            where = {
+                "operator": "Or",
+                "operands": [{
+                    "path": ["dropbox_path"],
+                    "operator": "Equal",
+                    "valueText": path
+                } for path in paths]
+            }
+            page_size = len(paths) * 2
+            wanted = set(paths)
+            found = {}
+            offset = 0
+            while True:
+                result = (
+                    self.client.query
+                    .get("DropboxFile", ["dropbox_path", "file_name", "file_type", "caption", "tags", "metadata", "public_url", "thumbnail_url", "content_hash", "processed_date", "file_size", "modified_date"])
+                    .with_where(where)
+                    .with_additional(["id"])
+                    .with_limit(page_size)
+                    .with_offset(offset)
+                    .do()
+                )
+                # GraphQL errors come back in the body rather than raising
+                if result.get("errors"):
+                    raise RuntimeError(result["errors"])
+                
+                page = result.get("data", {}).get("Get", {}).get("DropboxFile", [])
+                for file_data in page:
+                    path = file_data.get("dropbox_path")
+                    if path in wanted and path not in found:
+                        file_data["id"] = file_data.get("_additional", {}).get("id", "")
+                        found[path] = file_data
+                
+                if len(page) < page_size:
+                    return found
+                offset += page_size
+            
+        except Exception as e:
+            logger.error(f"Error getting files by path ({len(paths)} paths): {e}")
+            return None
+    
+    def get_all_path_hash_map(self, page_size: int = SCROLL_PAGE_SIZE) -> Optional[Dict[str, Dict[str, Any]]]:
+        """
+        Get the stored content hash and modified date of every file, keyed by path
+        
+        Pages through the collection with Weaviate's cursor API, fetching
+        only the fields duplicate checks need, so a full scan costs one
+        query per page_size files.
+        
+        Returns:
+            Dictionary of dropbox_path to {dropbox_path, content_hash,
+            modified_date, id}, or None if the scan failed
+        """
+        records = {}
+        after = None
+        try:
+            while True:
+                query = (
+                    self.client.query
+                    .get("DropboxFile", ["dropbox_path", "content_hash", "modified_date"])
+                    .with_additional(["id"])
+                    .with_limit(page_size)
+                )
+                if after:
+                    query = query.with_after(after)
+                
+                result = query.do()
+                # A failed page must not pass for the end of the collection,
+                # since callers treat the map as a complete record
+                if result.get("errors"):
+                    raise RuntimeError(result["errors"])
+                
+                page = result.get("data", {}).get("Get", {}).get("DropboxFile", [])
+                for file_data in page:
+                    file_data["id"] = file_data.get("_additional", {}).get("id", "")
+                    records[file_data.get("dropbox_path")] = file_data
+                
+                if len(page) < page_size:
+                    break
+                after = page[-1]["id"]
+            
+            logger.info(f"Loaded {len(records)} stored file hashes")
+            return records
+            
+        except Exception as e:
+            logger.error(f"Error loading stored file hashes: {e}")
+            return None
+    
     def get_file_by_id(self, file_id: str) -> Optional[Dict[str, Any]]:
         """Get file by ID using direct UUID access"""
         try:
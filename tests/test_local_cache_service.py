@@ -0,0 +1,70 @@
+import sqlite3
+from datetime import datetime
+
+from models import DropboxFile
+from services.local_cache_service import LocalCacheService
+
+# Schema and indexes of the cache before file types moved into lookup tables
+BASELINE_SCHEMA = (
+    """
+    CREATE TABLE files (
+        id TEXT PRIMARY KEY,
+        path_lower TEXT UNIQUE NOT NULL,
+        path_display TEXT NOT NULL,
+        name TEXT NOT NULL,
+        parent_path TEXT,
+        is_folder BOOLEAN NOT NULL DEFAULT 0,
+        file_type TEXT,
+        file_extension TEXT,
+        size INTEGER DEFAULT 0,
+        modified_date TEXT,
+        content_hash TEXT,
+        is_downloadable BOOLEAN DEFAULT 1,
+        last_synced TEXT NOT NULL,
+        created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    "CREATE INDEX idx_path_lower ON files(path_lower)",
+    "CREATE INDEX idx_parent_path ON files(parent_path)",
+    "CREATE INDEX idx_file_type ON files(file_type)",
+    "CREATE INDEX idx_modified_date ON files(modified_date)",
+)
+
+
+def _baseline_db(path):
+    conn = sqlite3.connect(path)
+    for statement in BASELINE_SCHEMA:
+        conn.execute(statement)
+    conn.execute("""
+        INSERT INTO files (id, path_lower, path_display, name, parent_path, file_type,
+                           file_extension, size, modified_date, last_synced)
+        VALUES ('id:old', '/old.mp4', '/old.mp4', 'old.mp4', '', 'video', '.mp4', 1,
+                '2024-01-01T00:00:00', '2024-01-01T00:00:00')
+    """)
+    conn.commit()
+    conn.close()
+
+
+def test_baseline_cache_upgrades_once(tmp_path):
+    db_path = str(tmp_path / "cache.db")
+    _baseline_db(db_path)
+
+    cache = LocalCacheService(db_path)
+    columns = [row[1] for row in cache._write_conn.execute("PRAGMA table_info(files)")]
+    assert "file_type" not in columns and "file_extension" not in columns
+    cache.store_files([DropboxFile(
+        id="id:new", name="new.jpg", path_lower="/new.jpg", path_display="/new.jpg",
+        size=1, modified=datetime(2024, 5, 1), file_type="image", extension=".jpg"
+    )])
+    cache.close()
+
+    # A second start must not touch rows synced after the upgrade
+    cache = LocalCacheService(db_path)
+    try:
+        new_file = cache.get_file_by_path("/new.jpg")
+        old_file = cache.get_file_by_path("/old.mp4")
+        assert (new_file.file_type, new_file.extension) == ("image", ".jpg")
+        assert (old_file.file_type, old_file.extension) == ("video", ".mp4")
+        assert cache.get_cache_stats()["by_type"] == {"image": 1, "video": 1}
+    finally:
+        cache.close()